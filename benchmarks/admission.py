@@ -0,0 +1,190 @@
+"""
+Simulate many agent loops sharing one API key, with and without admission control.
+
+    python -m benchmarks.admission --long 4 --burst 24
+
+Long sessions run for the whole simulation with a large context; a burst of
+short sessions arrives part way through. The fake API enforces the same
+token buckets as the real one and answers 429 when they run dry.
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+
+import backoff
+
+from computer_use_modal.server.admission import (
+    AdmissionScheduler,
+    Priority,
+    RateLimits,
+)
+
+
+@dataclass(kw_only=True)
+class RateLimitedAPI:
+    limits: RateLimits
+    latency: float
+    responses: Counter[str] = field(default_factory=Counter)
+
+    def __post_init__(self):
+        self.buckets = self.limits.buckets(time.monotonic())
+
+    async def call(self, input_tokens: int, output_tokens: int) -> float | None:
+        """Returns None on success, or the retry-after of a 429."""
+
+        now = time.monotonic()
+        cost = {
+            "requests": 1,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+        }
+        for bucket in self.buckets.values():
+            bucket.refill(now)
+        if wait := max(self.buckets[n].wait_time(a) for n, a in cost.items()):
+            self.responses["429"] += 1
+            return wait
+        for name, amount in cost.items():
+            self.buckets[name].take(amount)
+        self.responses["200"] += 1
+        await asyncio.sleep(self.latency * random.uniform(0.8, 1.2))
+        return None
+
+
+@dataclass(kw_only=True)
+class Session:
+    request_id: str
+    kind: str
+    priority: Priority
+    steps: int
+    input_tokens: int
+    output_tokens: int = 500
+
+
+async def run_session(
+    session: Session,
+    api: RateLimitedAPI,
+    scheduler: AdmissionScheduler | None,
+    tool_time: float,
+    latencies: dict[str, list[float]],
+):
+    for _ in range(session.steps):
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            if scheduler:
+                await scheduler.acquire(
+                    session.request_id,
+                    input_tokens=session.input_tokens,
+                    output_tokens=session.output_tokens,
+                    priority=session.priority,
+                )
+            retry_after = await api.call(session.input_tokens, session.output_tokens)
+            if retry_after is None:
+                break
+            attempt += 1
+            if scheduler:
+                scheduler.throttle(retry_after)
+            await asyncio.sleep(
+                max(retry_after, backoff.full_jitter(min(2.0, 0.1 * 2**attempt)))
+            )
+        if scheduler:
+            # The fake always uses exactly what was reserved
+            scheduler.settle(
+                reserved_input=session.input_tokens,
+                reserved_output=session.output_tokens,
+                input_tokens=session.input_tokens,
+                output_tokens=session.output_tokens,
+            )
+        latencies[session.kind].append(time.monotonic() - start)
+        await asyncio.sleep(tool_time)
+
+
+async def simulate(args: argparse.Namespace, admission: bool):
+    random.seed(0)
+    limits = RateLimits(
+        requests=args.rpw,
+        input_tokens=args.itpw,
+        output_tokens=args.otpw,
+        window=args.window,
+    )
+    api = RateLimitedAPI(limits=limits, latency=args.latency)
+    scheduler = AdmissionScheduler(limits=limits) if admission else None
+    latencies: dict[str, list[float]] = defaultdict(list)
+
+    long = [
+        Session(
+            request_id=f"long-{i}",
+            kind="long",
+            priority="default",
+            steps=args.long_steps,
+            input_tokens=args.long_tokens,
+        )
+        for i in range(args.long)
+    ]
+    burst = [
+        Session(
+            request_id=f"burst-{i}",
+            kind="burst",
+            priority="interactive" if i % 4 == 0 else "batch",
+            steps=args.burst_steps,
+            input_tokens=args.burst_tokens,
+        )
+        for i in range(args.burst)
+    ]
+
+    async def delayed(session: Session):
+        await asyncio.sleep(args.burst_at)
+        await run_session(session, api, scheduler, args.tool_time, latencies)
+
+    start = time.monotonic()
+    await asyncio.gather(
+        *(run_session(s, api, scheduler, args.tool_time, latencies) for s in long),
+        *(delayed(s) for s in burst),
+    )
+    elapsed = time.monotonic() - start
+
+    print(f"{'admission' if admission else 'no admission'} ({elapsed:.1f}s)")
+    for kind, values in sorted(latencies.items()):
+        values.sort()
+        print(
+            f"  {kind:>6} steps: {len(values):4d}"
+            f"  p50 {statistics.median(values) * 1e3:8.1f}ms"
+            f"  p99 {values[int(len(values) * 0.99) - 1] * 1e3:8.1f}ms"
+            f"  max {values[-1] * 1e3:8.1f}ms"
+        )
+    print(f"  api {dict(api.responses)}")
+    if scheduler:
+        for priority, waits in sorted(scheduler.report()["waits"].items()):
+            print(
+                f"  {priority:>11} waits: p50 {waits['p50'] * 1e3:8.1f}ms"
+                f"  p99 {waits['p99'] * 1e3:8.1f}ms"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--window", type=float, default=1.0)
+    parser.add_argument("--rpw", type=int, default=50)
+    parser.add_argument("--itpw", type=int, default=200_000)
+    parser.add_argument("--otpw", type=int, default=20_000)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--tool-time", type=float, default=0.05)
+    parser.add_argument("--long", type=int, default=4)
+    parser.add_argument("--long-steps", type=int, default=30)
+    parser.add_argument("--long-tokens", type=int, default=30_000)
+    parser.add_argument("--burst", type=int, default=24)
+    parser.add_argument("--burst-steps", type=int, default=5)
+    parser.add_argument("--burst-tokens", type=int, default=8_000)
+    parser.add_argument("--burst-at", type=float, default=2.0)
+    args = parser.parse_args()
+    for admission in (False, True):
+        asyncio.run(simulate(args, admission))
+
+
+if __name__ == "__main__":
+    main()
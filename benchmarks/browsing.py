@@ -0,0 +1,98 @@
+"""
+Compare browsing with screenshots alone against the browser tool.
+
+    modal deploy computer_use_modal
+    python -m benchmarks.browsing --runs 2
+    python -m benchmarks.browsing --task "What is on https://example.com?"
+
+Runs each task as a fresh request against the deployed server twice: with
+the visual tools only, and with `browser=True`. Counts the agent's steps
+(model calls), its tool calls by tool, the screenshots it was sent, and the
+wall time until the final answer.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+from modal import Cls
+
+from computer_use_modal import ComputerUseServer
+from computer_use_modal.app import app
+from computer_use_modal.tools.base import ToolResult
+
+TASKS = (
+    "Open https://news.ycombinator.com and tell me the title of the top story.",
+    "On https://www.python.org/downloads/, what is the latest Python release?",
+    "Summarize the first paragraph of https://en.wikipedia.org/wiki/Modal_logic.",
+    "Open https://github.com/trending and list the first three repositories.",
+)
+
+
+async def measure(task: str, browser: bool) -> dict[str, Any]:
+    server = Cls.lookup(app.name, ComputerUseServer.__name__)()
+    tools: Counter[str] = Counter()
+    run: dict[str, Any] = {"steps": 0, "screenshots": 0}
+    started = time.monotonic()
+    async for msg in server.messages_create_gen.remote_gen.aio(
+        request_id=f"browsing-{uuid4().hex[:8]}",
+        user_messages=[{"role": "user", "content": task}],
+        prewarm="browser",
+        browser=browser,
+    ):
+        if isinstance(msg, ToolResult):
+            run["screenshots"] += bool(msg.base64_image)
+        elif msg["role"] == "assistant":
+            run["steps"] += 1
+            blocks = [
+                block if isinstance(block, dict) else block.model_dump()
+                for block in msg["content"]
+            ]
+            tools.update(b["name"] for b in blocks if b["type"] == "tool_use")
+            text = [b["text"] for b in blocks if b["type"] == "text"]
+            if text:
+                run["answer"] = text[-1]
+    run["seconds"] = time.monotonic() - started
+    run["tool_calls"] = dict(tools)
+    return run
+
+
+async def run(args: argparse.Namespace) -> dict[str, dict[str, list[dict[str, Any]]]]:
+    results: dict[str, dict[str, list[dict[str, Any]]]] = {}
+    for task in args.task or TASKS:
+        results[task] = {"screenshots": [], "browser": []}
+        for _ in range(args.runs):
+            for mode, runs in results[task].items():
+                runs.append(await measure(task, browser=mode == "browser"))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--task", action="append", help="Replaces the default tasks")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--json", type=Path, help="Write every run here")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(f"{'task':<40}{'mode':<14}{'steps':>8}{'screenshots':>14}{'seconds':>10}")
+    for task, modes in results.items():
+        for mode, runs in modes.items():
+            print(
+                f"{task[:38]:<40}{mode:<14}"
+                f"{statistics.median(r['steps'] for r in runs):>8}"
+                f"{statistics.median(r['screenshots'] for r in runs):>14}"
+                f"{statistics.median(r['seconds'] for r in runs):>10.1f}"
+            )
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
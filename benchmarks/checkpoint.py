@@ -0,0 +1,80 @@
+"""
+Time restoring a checkpoint against redoing the setup it captured.
+
+    modal deploy computer_use_modal
+    python -m benchmarks.checkpoint --setup "pip install pandas scikit-learn"
+
+Runs `--setup` in a fresh sandbox, checkpoints it, then replaces the sandbox
+with a new one restored from that checkpoint (`SandboxManager.restart_sandbox`)
+and checks that `--check` still succeeds there. Reports the setup time, the
+checkpoint's size and duration, and the restore time.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+from modal import Cls
+
+from computer_use_modal import SandboxManager
+from computer_use_modal.app import app
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    manager = Cls.lookup(app.name, SandboxManager.__name__)(
+        request_id=f"checkpoint-{uuid4().hex[:8]}", headless=1
+    )
+    await manager.get_slot.remote.aio()
+
+    started = time.monotonic()
+    res = await manager.run_command.remote.aio("sh", "-c", args.setup)
+    result: dict[str, Any] = {"setup": time.monotonic() - started}
+    if res.error:
+        print(res.error)
+
+    checkpoint = await manager.checkpoint.remote.aio()
+    result.update(
+        checkpoint=checkpoint["seconds"],
+        files=checkpoint["files"],
+        bytes=checkpoint["bytes"],
+        stored_bytes=checkpoint["stored_bytes"],
+    )
+
+    started = time.monotonic()
+    startup = await manager.restart_sandbox.remote.aio()
+    result.update(
+        restart=time.monotonic() - started,
+        restore=startup.get("restored"),
+        restored_files=startup.get("restored_files"),
+    )
+    check = await manager.run_command.remote.aio("sh", "-c", args.check)
+    result["check"] = check.error or "ok"
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--setup", default="pip install pandas scikit-learn")
+    parser.add_argument(
+        "--check", default="python3 -c 'import pandas, sklearn' && echo ok"
+    )
+    parser.add_argument("--json", type=Path, help="Write the result here")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    for key, value in result.items():
+        print(
+            f"{key:<16} {value:.2f}"
+            if isinstance(value, float)
+            else f"{key:<16} {value}"
+        )
+    if args.json:
+        args.json.write_text(json.dumps(result, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark the `codec` record format against the pickles it replaces.
+
+    python -m benchmarks.codec --turns 200
+    python -m benchmarks.codec --request-id <id>  # a real session from MESSAGES
+"""
+
+import argparse
+import asyncio
+import base64
+import pickle
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable
+
+from benchmarks.messages import png, tool_result
+from computer_use_modal import codec
+from computer_use_modal.sandbox.edit_manager import EditSession
+from computer_use_modal.server.message_store import MessageLog, image_sources
+
+REPEAT = 5
+
+
+def synthetic(turns: int) -> list[dict]:
+    messages: list[dict] = [{"role": "user", "content": "go"}]
+    for turn in range(turns):
+        messages.append(
+            {
+                "role": "assistant",
+                "content": [
+                    {"type": "text", "text": f"Step {turn}: checking the output."},
+                    {
+                        "type": "tool_use",
+                        "id": f"toolu_{turn}",
+                        "name": "bash",
+                        "input": {"command": f"ls -la /tmp/{turn}"},
+                    },
+                ],
+            }
+        )
+        result = tool_result(turn)
+        # Distinct frames, as successive screenshots would be
+        result["content"][1]["source"]["data"] = png(1024, 704 + turn % 64)
+        result["content"][0]["text"] = "\n".join(
+            f"-rw-r--r-- 1 root root {i * 37} Oct 19 12:00 file_{i}.py"
+            for i in range(60)
+        )
+        messages.append({"role": "user", "content": [result]})
+    return messages
+
+
+async def capture(request_id: str) -> list[dict]:
+    log = MessageLog(request_id=request_id)
+    messages, _ = await log.load()
+    await log.hydrate(messages)
+    return messages
+
+
+def timed(fn: Callable[[], Any]) -> tuple[float, Any]:
+    best, result = float("inf"), None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def report(label: str, values: list, encode: Callable, decode: Callable):
+    enc, blobs = timed(lambda: [encode(v) for v in values])
+    dec, _ = timed(lambda: [decode(b) for b in blobs])
+    size = sum(map(len, blobs))
+    print(
+        f"{label:>24}: {size / 1024:10.1f} KiB"
+        f"  encode {enc * 1e3:8.2f}ms  decode {dec * 1e3:8.2f}ms"
+    )
+
+
+def run(messages: list[dict]):
+    log = MessageLog(request_id="bench")
+    records, images = [], {}
+    for message in messages:
+        record, blobs = log._encode(message)
+        records.append(record)
+        images.update(blobs)
+    sessions = [
+        EditSession(
+            file_versions=defaultdict(
+                list,
+                {
+                    Path(f"src/module_{f}.py"): [
+                        f"def f{v}():\n    return {v}\n" * 200 for v in range(5)
+                    ]
+                    for f in range(10)
+                },
+            )
+        )
+    ]
+    print(
+        f"{len(messages)} turns, {sum(1 for m in messages for _ in image_sources(m))} images"
+    )
+
+    print("turns")
+    report("pickle (inline base64)", messages, pickle.dumps, pickle.loads)
+    report("pickle (image refs)", records, pickle.dumps, pickle.loads)
+    report("codec", records, lambda r: codec.encode(r, compress=False), codec.decode)
+    report("codec+zstd", records, codec.encode, codec.decode)
+
+    print("images")
+    report("pickle (base64)", list(images.values()), pickle.dumps, pickle.loads)
+    report(
+        "pickle (raw bytes)",
+        [base64.b64decode(v) for v in images.values()],
+        pickle.dumps,
+        pickle.loads,
+    )
+
+    print("edit sessions")
+    report("pickle", sessions, pickle.dumps, pickle.loads)
+    report("codec+zstd", sessions, EditSession.encode, EditSession.decode)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--request-id", help="Benchmark a stored session instead")
+    args = parser.parse_args()
+    if args.request_id:
+        messages = asyncio.run(capture(args.request_id))
+    else:
+        messages = synthetic(args.turns)
+    run(messages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+A local stand-in for the Messages API, with configurable latency and failures.
+
+    async with FakeAPI(median=0.2, stall_rate=0.05) as api:
+        client = AsyncAnthropic(base_url=api.base_url, api_key="fake", max_retries=0)
+
+`ScriptedAPI` answers with scripted tool calls instead, to drive whole agent
+turns through the local backend.
+"""
+
+import asyncio
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+
+@dataclass(kw_only=True)
+class FakeAPI:
+    median: float = 0.5
+    sigma: float = 0.3
+    # Fraction of requests that hang for `stall` seconds (the tail to hedge)
+    stall_rate: float = 0.0
+    stall: float = 10.0
+    rate_limit_rate: float = 0.0
+    overload_rate: float = 0.0
+    retry_after: float | None = None
+    seed: int = 0
+
+    requests: Counter[str] = field(default_factory=Counter)
+    _rng: random.Random = field(init=False)
+    _runner: web.AppRunner | None = None
+    base_url: str = ""
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+
+    def latency(self) -> float:
+        if self._rng.random() < self.stall_rate:
+            return self.stall
+        return self._rng.lognormvariate(0, self.sigma) * self.median
+
+    def reply(self, body: dict) -> dict:
+        return {
+            "id": f"msg_fake_{self.requests['total']}",
+            "type": "message",
+            "role": "assistant",
+            "model": body["model"],
+            "content": [{"type": "text", "text": "Done."}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": 1000, "output_tokens": 10},
+        }
+
+    def error(self, status: int, kind: str) -> web.Response:
+        headers = {"retry-after": str(self.retry_after)} if self.retry_after else {}
+        return web.json_response(
+            {"type": "error", "error": {"type": kind, "message": kind}},
+            status=status,
+            headers=headers,
+        )
+
+    async def handle(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.requests["total"] += 1
+        roll = self._rng.random()
+        if roll < self.rate_limit_rate:
+            self.requests["429"] += 1
+            return self.error(429, "rate_limit_error")
+        if roll < self.rate_limit_rate + self.overload_rate:
+            self.requests["529"] += 1
+            return self.error(529, "overloaded_error")
+        try:
+            await asyncio.sleep(self.latency())
+        except asyncio.CancelledError:
+            self.requests["cancelled"] += 1
+            raise
+        self.requests["200"] += 1
+        return web.json_response(self.reply(body))
+
+    async def __aenter__(self) -> "FakeAPI":
+        app = web.Application()
+        app.router.add_post("/v1/messages", self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def __aexit__(self, *exc):
+        assert self._runner is not None
+        await self._runner.cleanup()
+
+
+@dataclass(kw_only=True)
+class ScriptedAPI(FakeAPI):
+    """Replays `script`, the assistant content of each step of a turn; the last step should end it."""
+
+    script: list[list[dict]] = field(default_factory=list)
+
+    @staticmethod
+    def step(body: dict) -> int:
+        """Assistant replies since the last message from the user (not a tool result)."""
+
+        steps = 0
+        for message in reversed(body["messages"]):
+            if message["role"] == "assistant":
+                steps += 1
+            elif isinstance(message["content"], str) or any(
+                block["type"] != "tool_result" for block in message["content"]
+            ):
+                break
+        return steps
+
+    def reply(self, body: dict) -> dict:
+        content = [
+            {**block, "id": f"toolu_{self.requests['total']}_{i}"}
+            if block["type"] == "tool_use"
+            else block
+            for i, block in enumerate(
+                self.script[min(self.step(body), len(self.script) - 1)]
+            )
+        ]
+        return {
+            **super().reply(body),
+            "content": content,
+            "stop_reason": "tool_use"
+            if any(block["type"] == "tool_use" for block in content)
+            else "end_turn",
+        }
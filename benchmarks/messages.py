@@ -0,0 +1,101 @@
+"""
+Benchmark `Messages` bookkeeping over long histories.
+
+    python -m benchmarks.messages --turns 1000
+"""
+
+import argparse
+import asyncio
+import base64
+import statistics
+import struct
+import time
+import zlib
+from dataclasses import dataclass
+from functools import cache
+
+from computer_use_modal.server.image_policy import ImagePolicy
+from computer_use_modal.server.message_store import MessageLog
+from computer_use_modal.server.messages import Messages
+
+
+@cache
+def png(width: int = 1024, height: int = 768) -> str:
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        crc = struct.pack(">I", zlib.crc32(kind + data))
+        return struct.pack(">I", len(data)) + kind + data + crc
+
+    raw = b"".join(b"\x00" + b"\x80" * width * 3 for _ in range(height))
+    return base64.b64encode(
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    ).decode()
+
+
+@dataclass(kw_only=True)
+class NullLog(MessageLog):
+    async def write(self, messages, indices, cache_stats=None):
+        pass
+
+    async def hydrate(self, messages):
+        pass
+
+
+def tool_result(turn: int):
+    return {
+        "type": "tool_result",
+        "tool_use_id": f"toolu_{turn}",
+        "content": [
+            {"type": "text", "text": f"output {turn}"},
+            {
+                "type": "image",
+                "source": {"type": "base64", "media_type": "image/png", "data": png()},
+            },
+        ],
+    }
+
+
+async def run(turns: int, image_budget: int):
+    messages = Messages(
+        request_id="bench",
+        _messages=[],
+        _log=NullLog(request_id="bench"),
+        image_policy=ImagePolicy(token_budget=image_budget),
+    )
+    await messages.add_user_messages([{"role": "user", "content": "go"}])
+    timings = []
+    for turn in range(turns):
+        start = time.perf_counter()
+        await messages.add_assistant_content(
+            [
+                {
+                    "type": "tool_use",
+                    "id": f"toolu_{turn}",
+                    "name": "computer",
+                    "input": {},
+                }
+            ]
+        )
+        await messages.add_tool_result([tool_result(turn)])
+        timings.append(time.perf_counter() - start)
+
+    for label, window in (("first 100", timings[:100]), ("last 100", timings[-100:])):
+        print(
+            f"{label:>10}: mean {statistics.mean(window) * 1e6:8.1f}us"
+            f"  p99 {sorted(window)[int(len(window) * 0.99) - 1] * 1e6:8.1f}us"
+        )
+    print(f"{'total':>10}: {sum(timings):.3f}s for {turns} turns")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--image-budget", type=int, default=ImagePolicy.token_budget)
+    args = parser.parse_args()
+    asyncio.run(run(args.turns, args.image_budget))
+
+
+if __name__ == "__main__":
+    main()
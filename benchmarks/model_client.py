@@ -0,0 +1,80 @@
+"""
+Exercise `ModelClient` retries, deadlines and hedging against `FakeAPI`.
+
+    python -m benchmarks.model_client --calls 200 --stall-rate 0.05
+"""
+
+import argparse
+import asyncio
+import time
+
+from anthropic import AsyncAnthropic
+
+from benchmarks.fake_api import FakeAPI
+from computer_use_modal.server.model_client import ModelClient
+
+MODEL = "claude-3-5-sonnet-20241022"
+
+
+async def run(args: argparse.Namespace, hedge: bool):
+    api = FakeAPI(
+        median=args.median,
+        stall_rate=args.stall_rate,
+        stall=args.stall,
+        rate_limit_rate=args.error_rate / 2,
+        overload_rate=args.error_rate / 2,
+        retry_after=args.retry_after,
+    )
+    async with (
+        api,
+        AsyncAnthropic(
+            base_url=api.base_url, api_key="fake", max_retries=0
+        ) as anthropic,
+    ):
+        client = ModelClient(
+            client=anthropic,
+            attempt_timeout=args.attempt_timeout,
+            backoff_base=args.median / 2,
+            hedge_min_delay=args.median,
+        )
+        timings = []
+        for _ in range(args.calls):
+            start = time.perf_counter()
+            await client.create(
+                hedge=hedge,
+                model=MODEL,
+                max_tokens=16,
+                messages=[{"role": "user", "content": "go"}],
+            )
+            timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    pct = {
+        q: timings[min(len(timings) - 1, int(len(timings) * q / 100))]
+        for q in (50, 95, 99)
+    }
+    print(
+        f"{'hedged' if hedge else 'plain':>8}: "
+        + "  ".join(f"p{q} {v * 1e3:8.1f}ms" for q, v in pct.items())
+        + f"  max {timings[-1] * 1e3:8.1f}ms"
+    )
+    print(f"{'':>8}  client {dict(client.stats)}")
+    print(f"{'':>8}  server {dict(api.requests)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--median", type=float, default=0.05)
+    parser.add_argument("--stall-rate", type=float, default=0.05)
+    parser.add_argument("--stall", type=float, default=2.0)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--retry-after", type=float, default=None)
+    parser.add_argument("--attempt-timeout", type=float, default=5.0)
+    args = parser.parse_args()
+    for hedge in (False, True):
+        asyncio.run(run(args, hedge))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Replay a recorded session through `ToolCollection` and `Messages` on the local backend.
+
+    modal nfs get anthropic-computer-use-<request_id> .recordings/<file>.rec .
+    python -m benchmarks.replay <file>.rec --json after.json --compare before.json
+
+Model responses and tool results come from the recording, so a replay is
+deterministic. What it measures is what this version of the code does with
+them: the payload each request would carry, its estimated tokens and images,
+and the time spent in `Messages` bookkeeping. Latency is the recorded model
+and tool time (slept through with `--timing real`, only added up otherwise)
+plus that bookkeeping.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import time
+from collections import defaultdict, deque
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, cast
+
+from computer_use_modal import codec
+from computer_use_modal.local import LocalBackend
+from computer_use_modal.server.message_store import image_sources
+from computer_use_modal.server.messages import Messages
+from computer_use_modal.server.recording import Recording
+from computer_use_modal.tools.base import BaseTool, ToolCollection, ToolResult
+
+
+@dataclass(kw_only=True)
+class Clock:
+    real: bool = False
+    now: float = 0.0
+
+    async def sleep(self, seconds: float):
+        if self.real:
+            await asyncio.sleep(seconds)
+        self.now += seconds
+
+
+@dataclass(kw_only=True)
+class ReplayTool(BaseTool):
+    """Answers with the recorded results of one tool, in order."""
+
+    params: dict
+    recording: Recording
+    clock: Clock
+    calls: deque[dict] = field(default_factory=deque)
+
+    @property
+    def options(self) -> dict:
+        return self.params
+
+    async def __call__(self, /, **kwargs) -> ToolResult:
+        event = self.calls.popleft()
+        await self.clock.sleep(event["duration"])
+        return ToolResult(
+            output=event["output"],
+            error=event["error"],
+            system=event["system"],
+            is_error=event["is_error"],
+            base64_image=event["image"]
+            and base64.b64encode(self.recording.blobs[event["image"]]).decode(),
+        )
+
+
+@dataclass(kw_only=True)
+class Step:
+    recorded_bytes: int
+    bytes: int
+    recorded_estimate: int
+    estimated_tokens: int
+    images: int
+    input_tokens: int = 0
+    model_time: float = 0.0
+    overhead: float = 0.0
+
+
+@dataclass(kw_only=True)
+class Replay:
+    recording: Recording
+    clock: Clock
+    steps: list[Step] = field(default_factory=list)
+
+    def tools(self) -> tuple[ReplayTool, ...]:
+        params = next(
+            codec.decode(self.recording.blobs[e["params"]])
+            for e in self.recording.events
+            if e["type"] == "request"
+        )
+        calls = defaultdict(deque)
+        for event in self.recording.events:
+            if event["type"] == "tool":
+                calls[event["name"]].append(event)
+        return tuple(
+            ReplayTool(
+                manager=cast(Any, None),
+                params=p,
+                recording=self.recording,
+                clock=self.clock,
+                calls=calls[p["name"]],
+            )
+            for p in params["tools"]
+        )
+
+    def payload(self, messages: Messages, request: dict) -> Step:
+        """The request this version would send, next to the recorded one."""
+
+        params = codec.decode(self.recording.blobs[request["params"]])
+        return Step(
+            recorded_bytes=request["bytes"],
+            recorded_estimate=request["estimated_tokens"],
+            bytes=len(
+                json.dumps({**params, "messages": messages.messages}, default=str)
+            ),
+            estimated_tokens=messages.estimated_tokens,
+            images=sum(
+                source.get("type") == "base64"
+                for message in messages.messages
+                for source in image_sources(message)
+            ),
+        )
+
+    async def run(self):
+        messages = await Messages.from_request_id(f"replay-{self.recording.request_id}")
+        tools = self.tools()
+        runner, step = ToolCollection(tools=tools), None
+
+        async def bookkeeping(coro):
+            start = time.perf_counter()
+            await coro
+            if step:
+                step.overhead += time.perf_counter() - start
+
+        async def end_step():
+            if runner.results:
+                await bookkeeping(
+                    messages.add_tool_result([r.to_api() for r in runner.results])
+                )
+
+        for event in self.recording.events:
+            match event["type"]:
+                case "history":
+                    messages = Messages(
+                        request_id=messages.request_id,
+                        _messages=[
+                            self.recording.get_message(d) for d in event["messages"]
+                        ],
+                    )
+                case "user":
+                    await end_step()
+                    await bookkeeping(
+                        messages.add_user_messages(
+                            [self.recording.get_message(d) for d in event["messages"]]
+                        )
+                    )
+                case "request":
+                    await end_step()
+                    runner = ToolCollection(tools=tools)
+                    step = self.payload(messages, event)
+                    self.steps.append(step)
+                case "response":
+                    assert step is not None
+                    usage = event["usage"]
+                    step.input_tokens = (
+                        usage["input_tokens"]
+                        + usage.get("cache_read_input_tokens", 0)
+                        + usage.get("cache_creation_input_tokens", 0)
+                    )
+                    step.model_time = event["duration"]
+                    await self.clock.sleep(event["duration"])
+                    await bookkeeping(messages.add_assistant_content(event["content"]))
+                case "tool":
+                    await runner.run(
+                        name=event["name"],
+                        tool_input=event["input"],
+                        tool_use_id=event["tool_use_id"],
+                    )
+        await end_step()
+
+    def summary(self) -> dict[str, Any]:
+        overhead = sum(s.overhead for s in self.steps)
+        return {
+            "steps": len(self.steps),
+            "bytes": sum(s.bytes for s in self.steps),
+            "recorded_bytes": sum(s.recorded_bytes for s in self.steps),
+            "estimated_tokens": sum(s.estimated_tokens for s in self.steps),
+            "recorded_input_tokens": sum(s.input_tokens for s in self.steps),
+            "images": sum(s.images for s in self.steps),
+            "overhead": overhead,
+            "latency": self.clock.now + overhead,
+        }
+
+
+def report(replay: Replay) -> str:
+    lines = [
+        f"{'step':>4} {'bytes':>10} {'recorded':>10} {'est tokens':>10}"
+        f" {'recorded':>9} {'used':>9} {'images':>6} {'model':>8} {'overhead':>9}"
+    ]
+    for i, s in enumerate(replay.steps):
+        lines.append(
+            f"{i:4d} {s.bytes:10d} {s.recorded_bytes:10d} {s.estimated_tokens:10d}"
+            f" {s.recorded_estimate:9d} {s.input_tokens:9d} {s.images:6d}"
+            f" {s.model_time:7.2f}s {s.overhead * 1e3:7.1f}ms"
+        )
+    return "\n".join(lines)
+
+
+def compare(summary: dict, before: dict) -> str:
+    lines = [f"\n{'':<22} {'before':>12} {'after':>12} {'change':>8}"]
+    for key, value in summary.items():
+        if (old := before.get(key)) is None:
+            continue
+        change = f"{value / old - 1:+8.1%}" if old else ""
+        lines.append(f"{key:<22} {old:12.6g} {value:12.6g} {change}")
+    return "\n".join(lines)
+
+
+async def main_async(args: argparse.Namespace) -> Replay:
+    replay = Replay(
+        recording=Recording.decode(args.recording.read_bytes()),
+        clock=Clock(real=args.timing == "real"),
+    )
+    async with LocalBackend():
+        await replay.run()
+    return replay
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recording", type=Path)
+    parser.add_argument("--timing", choices=("virtual", "real"), default="virtual")
+    parser.add_argument("--json", type=Path, help="Write the summary and steps here")
+    parser.add_argument("--compare", type=Path, help="A --json file from a prior run")
+    args = parser.parse_args()
+
+    replay = asyncio.run(main_async(args))
+    summary = replay.summary()
+    print(report(replay))
+    print("\n" + "\n".join(f"{k:<22} {v:12.6g}" for k, v in summary.items()))
+    if args.compare:
+        print(compare(summary, json.loads(args.compare.read_text())["summary"]))
+    if args.json:
+        args.json.write_text(
+            json.dumps(
+                {"summary": summary, "steps": [asdict(s) for s in replay.steps]},
+                indent=2,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Compare sandboxes that start with the full desktop against headless ones.
+
+    modal deploy computer_use_modal
+    python -m benchmarks.startup --runs 3 --idle 30
+    python -m benchmarks.startup --local        # a smoke test, no Modal account
+
+Each run creates a fresh sandbox, times the first bash command from the
+caller's side, then leaves it idle for `--idle` seconds and reads back what
+the manager sampled: CPU and memory while idle, and its own startup timings
+(`shell_ready`, `first_command`, and `desktop_ready` once a display is up).
+A headless run then takes one screenshot, to show what the lazy start costs
+the first computer action.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+from modal import Cls
+
+from computer_use_modal import SandboxManager
+from computer_use_modal.app import app
+from computer_use_modal.local import LocalBackend
+from computer_use_modal.sandbox.sandbox_manager import manager_for
+
+
+def _manager(request_id: str, headless: bool, local: bool) -> SandboxManager:
+    if local:
+        return manager_for(request_id, headless=headless)
+    params = {"headless": 1} if headless else {}
+    return Cls.lookup(app.name, SandboxManager.__name__)(
+        request_id=request_id, **params
+    )
+
+
+async def measure(headless: bool, idle: float, local: bool = False) -> dict[str, Any]:
+    manager = _manager(f"startup-{uuid4().hex[:8]}", headless, local)
+    started = time.monotonic()
+    session = await manager.start_bash_session.remote.aio()
+    await manager.execute_bash_command.remote.aio(session, "true")
+    run: dict[str, Any] = {"first_bash": time.monotonic() - started}
+
+    await asyncio.sleep(idle)
+    usage = await manager.resource_usage.remote.aio()
+    run.update(
+        idle_cpu=usage["idle_cpu_mean"],
+        idle_memory=usage["idle_memory_mean"],
+        **{k: v for k, v in usage["startup"].items() if k != "mode"},
+    )
+    # Locally there is no display to bring up or capture
+    if headless and not local:
+        started = time.monotonic()
+        await manager.take_screenshot.remote.aio(1, (1024, 768))
+        run["first_screenshot"] = time.monotonic() - started
+    await manager.end_bash_session.remote.aio(session)
+    return run
+
+
+async def run(args: argparse.Namespace) -> dict[str, list[dict[str, Any]]]:
+    results: dict[str, list[dict[str, Any]]] = {"desktop": [], "headless": []}
+    for _ in range(args.runs):
+        for mode in results:
+            results[mode].append(
+                await measure(mode == "headless", args.idle, args.local)
+            )
+    return results
+
+
+async def run_local(args: argparse.Namespace) -> dict[str, list[dict[str, Any]]]:
+    async with LocalBackend():
+        return await run(args)
+
+
+def summarize(results: dict[str, list[dict[str, Any]]]) -> dict[str, dict]:
+    return {
+        mode: {
+            key: round(statistics.median(r[key] for r in runs if key in r), 3)
+            for key in dict.fromkeys(k for r in runs for k in r)
+        }
+        for mode, runs in results.items()
+        if runs
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--idle", type=float, default=30.0)
+    parser.add_argument("--local", action="store_true", help="Use the local backend")
+    parser.add_argument("--json", type=Path, help="Write every run here")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_local(args) if args.local else run(args))
+    summary = summarize(results)
+    keys = list(dict.fromkeys(k for s in summary.values() for k in s))
+    print(f"{'':<10}" + "".join(f"{k:>16}" for k in keys))
+    for mode, medians in summary.items():
+        print(f"{mode:<10}" + "".join(f"{medians.get(k, ''):>16}" for k in keys))
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Benchmark the whole stack on the local backend, against stored baselines.
+
+    python -m benchmarks.suite                  # compare with baselines.json
+    python -m benchmarks.suite --update         # record new baselines
+    python -m benchmarks.suite -k bash -k edit  # a subset
+
+Sandbox commands run as local subprocesses (see `computer_use_modal.local`)
+and the model is a `ScriptedAPI` with no latency, so the timings are the
+stack's own overhead. A benchmark regresses when its median is more than
+`--tolerance` (relative) plus `--slack` (absolute, for the millisecond-scale
+ones) slower than its baseline; the exit status is then non-zero.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from benchmarks.fake_api import ScriptedAPI
+from computer_use_modal import ComputerUseServer, SandboxManager, backend, tracing
+from computer_use_modal.local import LocalBackend
+from computer_use_modal.tools.bash import BashTool
+from computer_use_modal.tools.computer.computer import ComputerTool
+from computer_use_modal.tools.edit.edit import EditTool
+
+BASELINES = Path(__file__).with_name("baselines.json")
+
+SCRIPT = [
+    [
+        {"type": "text", "text": "Checking the environment."},
+        {
+            "type": "tool_use",
+            "name": "bash",
+            "input": {"command": "uname -a && seq 50 > /mnt/nfs/turn.txt"},
+        },
+    ],
+    [
+        {
+            "type": "tool_use",
+            "name": "str_replace_editor",
+            "input": {
+                "command": "str_replace",
+                "path": "/mnt/nfs/turn.txt",
+                "old_str": "25",
+                "new_str": "twenty-five",
+            },
+        },
+        {
+            "type": "tool_use",
+            "name": "str_replace_editor",
+            "input": {"command": "view", "path": "/mnt/nfs/turn.txt"},
+        },
+    ],
+    [
+        {
+            "type": "tool_use",
+            "name": "computer",
+            "input": {"action": "mouse_move", "coordinate": [100, 100]},
+        }
+    ],
+    [{"type": "text", "text": "Done."}],
+]
+
+
+@dataclass(kw_only=True)
+class Context:
+    request_id: str
+    manager: Any
+    server: Any
+    bash: BashTool
+    edit: dict[str, EditTool]
+
+
+Benchmark = Callable[[Context, int], Awaitable[Any]]
+BENCHMARKS: dict[str, Benchmark] = {}
+
+
+def benchmark(name: str):
+    def decorator(fn: Benchmark) -> Benchmark:
+        BENCHMARKS[name] = fn
+        return fn
+
+    return decorator
+
+
+@benchmark("screenshot")
+async def screenshot(ctx: Context, i: int):
+    await ComputerTool(manager=ctx.manager)(action="screenshot")
+
+
+@benchmark("bash")
+async def bash(ctx: Context, i: int):
+    await ctx.bash(command=f"seq {i + 1000} | tail -n 1")
+
+
+async def edit(ctx: Context, i: int, backend: str):
+    tool, path = ctx.edit[backend], f"/mnt/nfs/edit_{backend}.py"
+    if i == 0:
+        await tool(
+            command="create",
+            path=path,
+            file_text="".join(f"line_{n} = {n}\n" for n in range(2_000)),
+        )
+    await tool(
+        command="str_replace",
+        path=path,
+        old_str=f"line_1000 = {i + 1000}",
+        new_str=f"line_1000 = {i + 1001}",
+    )
+    await tool(command="view", path=path, view_range=[990, 1010])
+
+
+@benchmark("edit_nfs")
+async def edit_nfs(ctx: Context, i: int):
+    await edit(ctx, i, "nfs")
+
+
+@benchmark("edit_agent")
+async def edit_agent(ctx: Context, i: int):
+    await edit(ctx, i, "agent")
+
+
+@benchmark("agent_turn")
+async def agent_turn(ctx: Context, i: int):
+    # A fresh session each time, so the history does not grow across iterations
+    await ctx.server.messages_create.remote.aio(
+        request_id=f"{ctx.request_id}-{i}",
+        user_messages=[{"role": "user", "content": f"Run the checks ({i})."}],
+    )
+
+
+async def measure(
+    fn: Benchmark, ctx: Context, warmup: int, iterations: int
+) -> dict[str, float]:
+    for i in range(warmup):
+        await fn(ctx, i)
+    timings = []
+    for i in range(warmup, warmup + iterations):
+        start = time.perf_counter()
+        await fn(ctx, i)
+        timings.append(time.perf_counter() - start)
+    return {
+        "p50": round(statistics.median(timings), 6),
+        "p95": round(statistics.quantiles(timings, n=20, method="inclusive")[18], 6),
+        "iterations": iterations,
+    }
+
+
+async def run(args: argparse.Namespace) -> dict[str, dict | str]:
+    results: dict[str, dict | str] = {}
+    async with (
+        ScriptedAPI(median=args.model_latency, script=SCRIPT) as api,
+        LocalBackend(base_url=api.base_url) as local,
+    ):
+        manager = backend.instance(SandboxManager, request_id="bench")
+        ctx = Context(
+            request_id="bench",
+            manager=manager,
+            server=backend.instance(ComputerUseServer),
+            bash=BashTool(manager=manager),
+            edit={b: EditTool(manager=manager, backend=b) for b in ("nfs", "agent")},
+        )
+        for name, fn in BENCHMARKS.items():
+            if args.k and not any(k in name for k in args.k):
+                continue
+            try:
+                results[name] = await measure(fn, ctx, args.warmup, args.iterations)
+            except ImportError as e:
+                results[name] = f"skipped: {str(e).splitlines()[0]}"
+    if args.trace:
+        print(tracing.report(local.spans), end="\n\n")
+    return results
+
+
+def compare(
+    results: dict[str, dict | str],
+    baselines: dict[str, dict],
+    tolerance: float,
+    slack: float,
+) -> bool:
+    regressed = False
+    print(f"{'benchmark':<12} {'p50':>9} {'p95':>9} {'baseline':>9} {'change':>8}")
+    for name, result in results.items():
+        if isinstance(result, str):
+            print(f"{name:<12} {result}")
+            continue
+        line = f"{name:<12} {result['p50'] * 1e3:7.1f}ms {result['p95'] * 1e3:7.1f}ms"
+        if (baseline := baselines.get(name)) is None:
+            print(f"{line} {'new':>9}")
+            continue
+        change = result["p50"] / baseline["p50"] - 1
+        limit = baseline["p50"] * (1 + tolerance) + slack
+        status = "REGRESSION" if result["p50"] > limit else ""
+        regressed |= bool(status)
+        print(f"{line} {baseline['p50'] * 1e3:7.1f}ms {change:+8.1%} {status}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-k", action="append", help="Only run matching benchmarks")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--model-latency", type=float, default=0.0)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--slack", type=float, default=0.002)
+    parser.add_argument("--baselines", type=Path, default=BASELINES)
+    parser.add_argument("--update", action="store_true", help="Record new baselines")
+    parser.add_argument("--trace", action="store_true", help="Print a span report")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    stored = (
+        json.loads(args.baselines.read_text())
+        if args.baselines.exists()
+        else {"benchmarks": {}}
+    )
+    if stored.get("machine") not in (None, platform.platform()):
+        print(f"Baselines were recorded on {stored['machine']}\n")
+    regressed = compare(results, stored["benchmarks"], args.tolerance, args.slack)
+
+    if args.update:
+        stored["machine"] = platform.platform()
+        stored["benchmarks"].update(
+            {name: r for name, r in results.items() if isinstance(r, dict)}
+        )
+        args.baselines.write_text(json.dumps(stored, indent=2, sort_keys=True) + "\n")
+        print(f"\nWrote {args.baselines}")
+    elif regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
 from .app import app
 from .sandbox.sandbox_manager import SandboxManager
 from .server.server import ComputerUseServer
+from .server.admission import AdmissionController
+from .sandbox.placement import Placement
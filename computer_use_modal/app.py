@@ -3,6 +3,13 @@ import base64
 from modal import App, Image, Secret
 
 MOUNT_PATH = "/mnt/nfs"
+# The package cache shared by every sandbox, and its proxy (see
+# `sandbox.package_cache`)
+CACHE_PATH = "/mnt/cache"
+PACKAGE_PROXY = "http://127.0.0.1:3142"
+# Firefox's WebDriver BiDi port on display :1, for the browser tool; other
+# displays count up from it (see `Slot.debug_port`)
+BROWSER_DEBUG_PORT = 9222
 
 app = App("anthropic-computer-use-modal")
 
@@ -39,7 +46,7 @@ sandbox_image = (
     )
     .workdir("/home/computeruse")
     .run_commands(
-        "sed -i 's|Exec=firefox-esr -new-window|Exec=sudo firefox-esr -new-window|' /home/computeruse/.config/tint2/applications/firefox-custom.desktop",
+        f"sed -i 's|Exec=firefox-esr -new-window|Exec=sudo firefox-esr --remote-debugging-port {BROWSER_DEBUG_PORT} -new-window|' /home/computeruse/.config/tint2/applications/firefox-custom.desktop",
         "add-apt-repository ppa:mozillateam/ppa",
         "add-apt-repository ppa:apt-fast/stable",
         f"echo '{FIREFOX_PIN}' | base64 --decode | tee /etc/apt/preferences.d/mozilla-firefox",
@@ -47,5 +54,13 @@ sandbox_image = (
         "apt remove -y xdg-desktop-portal",
     )
     .run_commands("timeout 30 sudo firefox-esr -headless -new-window || true")
+    # Accessibility trees for `ComputerTool(observation="accessibility")`
+    .apt_install("at-spi2-core", "python3-gi", "gir1.2-atspi-2.0")
+    .env({"GTK_MODULES": "gail:atk-bridge", "GNOME_ACCESSIBILITY": "1"})
+    .run_commands(
+        f"echo 'Acquire::http::Proxy \"{PACKAGE_PROXY}\";' > /etc/apt/apt.conf.d/01package-cache",
+        f"printf '[global]\\nindex-url = {PACKAGE_PROXY}/pypi/simple\\ntrusted-host = 127.0.0.1\\n' > /etc/pip.conf",
+        f"mkdir -p /usr/etc /usr/local/etc && echo 'registry={PACKAGE_PROXY}/npm/' | tee /usr/etc/npmrc /usr/local/etc/npmrc",
+    )
 )
 secrets = Secret.from_local_environ(["ANTHROPIC_API_KEY"])
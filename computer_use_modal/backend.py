@@ -0,0 +1,116 @@
+"""
+The infrastructure the app runs on, behind one swappable object.
+
+Everything that would otherwise reach for Modal directly (sandboxes, network
+file systems, named dicts, class instances, and the model API client) goes
+through `current()`. In deployment that is `ModalBackend`; benchmarks swap in
+`computer_use_modal.local.LocalBackend` with `set_backend`, which runs the
+same code in-process on a plain Linux box.
+"""
+
+import asyncio
+import logging
+from typing import Any, Protocol, TypeVar
+
+import modal
+from anthropic import AsyncAnthropic
+from modal import NetworkFileSystem, Sandbox
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Backend(Protocol):
+    async def network_file_system(self, name: str) -> NetworkFileSystem: ...
+
+    async def sandbox(
+        self, name: str, *, headless: bool = False, **options: Any
+    ) -> Sandbox: ...
+
+    def dict(self, name: str) -> modal.Dict: ...
+
+    def instance(self, cls: T, **params: Any) -> T: ...
+
+    def anthropic(self) -> AsyncAnthropic: ...
+
+
+class ModalBackend:
+    def __init__(self):
+        self._dicts: dict[str, modal.Dict] = {}
+
+    async def network_file_system(self, name: str) -> NetworkFileSystem:
+        return await NetworkFileSystem.lookup.aio(name, create_if_missing=True)
+
+    async def sandbox(
+        self, name: str, *, headless: bool = False, **options: Any
+    ) -> Sandbox:
+        """
+        The sandbox tagged `name`, or a new one. A desktop sandbox runs the image's
+        entrypoint and is given time to bring it up; a headless one only runs
+        `sleep` and is ready as soon as it takes a command.
+        """
+
+        if sandbox := await anext(Sandbox.list.aio(tags={"name": name}), None):
+            return sandbox
+        if headless:
+            sandbox = await Sandbox.create.aio("sleep", "infinity", **options)
+        else:
+            sandbox = await Sandbox.create.aio(**options)
+        await sandbox.set_tags.aio({"name": name})
+        logger.info("Waiting for sandbox to start...")
+        if headless:
+            await self._wait_for_shell(sandbox)
+        else:
+            await asyncio.sleep(30)
+        logger.info("Sandbox started")
+        return sandbox
+
+    async def _wait_for_shell(self, sandbox: Sandbox, timeout: float = 60):
+        async with asyncio.timeout(timeout):
+            while True:
+                try:
+                    proc = await sandbox.exec.aio("true")
+                    if await proc.wait.aio() == 0:
+                        return
+                except Exception as e:
+                    logger.debug(f"Sandbox not ready: {e}")
+                await asyncio.sleep(0.5)
+
+    def dict(self, name: str) -> modal.Dict:
+        if name not in self._dicts:
+            self._dicts[name] = modal.Dict.from_name(name, create_if_missing=True)
+        return self._dicts[name]
+
+    def instance(self, cls: T, **params: Any) -> T:
+        return cls(**params)  # type: ignore[operator]
+
+    def anthropic(self) -> AsyncAnthropic:
+        # Retries, deadlines and hedging are handled by `ModelClient`
+        return AsyncAnthropic(max_retries=0)
+
+
+_backend: Backend = ModalBackend()
+
+
+def current() -> Backend:
+    return _backend
+
+
+def set_backend(new: Backend):
+    global _backend
+    _backend = new
+
+
+def instance(cls: T, **params: Any) -> T:
+    return _backend.instance(cls, **params)
+
+
+class named_dict:
+    """A module-level handle on a named dict, resolved against the backend at call time."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __getattr__(self, attr: str):
+        return getattr(_backend.dict(self.name), attr)
@@ -0,0 +1,61 @@
+"""
+Versioned binary encoding for values kept in `modal.Dict`.
+
+A record is `MAGIC + version + flags + msgpack`, with the msgpack body zstd
+compressed when that pays off. Anything else read back from a Dict is a
+value pickled before this format existed, and is returned as-is so callers
+can migrate it.
+"""
+
+from pathlib import PurePath
+from typing import Any
+
+import msgpack
+import zstandard
+from pydantic import BaseModel
+
+MAGIC = b"CU"
+VERSION = 1
+FLAG_ZSTD = 0x01
+
+COMPRESS_MIN = 1024
+COMPRESS_LEVEL = 3
+
+
+def _default(obj: Any) -> Any:
+    match obj:
+        case BaseModel():
+            # The SDK's content block models, e.g. assistant `tool_use` blocks
+            return obj.model_dump(mode="json", exclude_none=True)
+        case PurePath():
+            return obj.as_posix()
+        case set() | frozenset() | tuple():
+            return list(obj)
+    raise TypeError(f"cannot encode {type(obj).__name__}")
+
+
+def encode(value: Any, *, compress: bool = True) -> bytes:
+    body, flags = msgpack.packb(value, default=_default), 0
+    if compress and len(body) >= COMPRESS_MIN:
+        packed = zstandard.ZstdCompressor(level=COMPRESS_LEVEL).compress(body)
+        if len(packed) < len(body):
+            body, flags = packed, flags | FLAG_ZSTD
+    return MAGIC + bytes((VERSION, flags)) + body
+
+
+def is_encoded(value: Any) -> bool:
+    return isinstance(value, bytes) and value[: len(MAGIC)] == MAGIC
+
+
+def decode(value: Any) -> Any:
+    """Decode an `encode`d record; legacy (already unpickled) values pass through."""
+
+    if not is_encoded(value):
+        return value
+    version, flags = value[len(MAGIC)], value[len(MAGIC) + 1]
+    if version > VERSION:
+        raise ValueError(f"record version {version} is newer than {VERSION}")
+    body = value[len(MAGIC) + 2 :]
+    if flags & FLAG_ZSTD:
+        body = zstandard.ZstdDecompressor().decompress(body)
+    return msgpack.unpackb(body)
@@ -0,0 +1,415 @@
+"""
+An in-process stand-in for Modal, for benchmarks and local development.
+
+    async with LocalBackend(base_url=api.base_url) as local:
+        server = backend.instance(ComputerUseServer)
+        async for msg in server.messages_create_gen.remote_gen.aio(...): ...
+
+Sandbox commands run as local subprocesses, each network file system is a
+temp directory (mount paths in commands are rewritten to it), named dicts
+live in memory, and `@app.cls` classes are instantiated once per parameter
+set with their `@modal.enter` / `@modal.exit` hooks, the way a warm container
+would be. Arguments and return values are pickled across `.remote` calls so
+nothing is shared by reference that would not be in production. The model
+API is whatever `base_url` points at, e.g. `benchmarks.fake_api.ScriptedAPI`.
+
+Programs a plain box lacks (a display, slot users) are replaced by `stubs`:
+shell snippets installed under their name at the front of the sandbox's
+`PATH`, so they apply inside scripts too.
+"""
+
+import asyncio
+import codecs
+import os
+import pickle
+import shutil
+import tempfile
+from dataclasses import dataclass, field
+from io import BytesIO
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable
+
+from anthropic import AsyncAnthropic
+from grpclib import GRPCError, Status
+from modal._utils.async_utils import synchronizer
+from modal.cls import _get_class_constructor_signature
+from modal.partial_function import (
+    _find_partial_methods_for_user_cls,
+    _PartialFunctionFlags,
+)
+from modal.volume import FileEntry, FileEntryType
+
+from computer_use_modal import backend, tracing
+
+SCREENSHOT = Path(__file__).parent.parent / "demo.png"
+
+DEFAULT_STUBS = {
+    # `scrot -p <path>`
+    "scrot": 'cp "$SCREENSHOT" "$2"',
+    "xdotool": """case "$1" in
+        getmouselocation) printf 'X=512\\nY=384\\nSCREEN=0\\nWINDOW=1\\n' ;;
+    esac""",
+    # Slot users do not exist locally: run the command as ourselves
+    "sudo": """while [ $# -gt 0 ]; do case "$1" in
+        --) shift; break ;; -u) shift 2 ;; -*) shift ;; *) break ;;
+    esac; done
+    exec "$@"
+    """,
+    **dict.fromkeys(("useradd", "chown", "chmod", "pkill", "xdpyinfo"), ":"),
+}
+
+
+def _copy(value: Any) -> Any:
+    return pickle.loads(pickle.dumps(value))
+
+
+class _aio:
+    """Expose an async method with Modal's `obj.method.aio(...)` calling convention."""
+
+    def __init__(self, fn: Callable):
+        self.fn = fn
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        return SimpleNamespace(aio=self.fn.__get__(obj, owner))
+
+
+@dataclass(kw_only=True)
+class LocalDict:
+    data: dict[Any, bytes] = field(default_factory=dict)
+
+    @_aio
+    async def get(self, key: Any, default: Any = None) -> Any:
+        return pickle.loads(self.data[key]) if key in self.data else default
+
+    @_aio
+    async def put(self, key: Any, value: Any):
+        self.data[key] = pickle.dumps(value)
+
+    @_aio
+    async def update(self, **kwargs: Any):
+        self.data.update({k: pickle.dumps(v) for k, v in kwargs.items()})
+
+    @_aio
+    async def pop(self, key: Any) -> Any:
+        return pickle.loads(self.data.pop(key))
+
+    @_aio
+    async def contains(self, key: Any) -> bool:
+        return key in self.data
+
+
+@dataclass(kw_only=True)
+class LocalNetworkFileSystem:
+    root: Path
+
+    def _path(self, path: str) -> Path:
+        return self.root / path.lstrip("/")
+
+    def _entry(self, path: Path) -> FileEntry:
+        stat = path.stat()
+        return FileEntry(
+            path=path.relative_to(self.root).as_posix(),
+            type=FileEntryType.DIRECTORY if path.is_dir() else FileEntryType.FILE,
+            mtime=int(stat.st_mtime),
+            size=stat.st_size,
+        )
+
+    @_aio
+    async def read_file(self, path: str) -> AsyncIterator[bytes]:
+        try:
+            f = self._path(path).open("rb")
+        except OSError:
+            raise GRPCError(Status.NOT_FOUND, f"No such file: {path}")
+        with f:
+            while chunk := f.read(1024 * 1024):
+                yield chunk
+
+    @_aio
+    async def write_file(self, path: str, data: BytesIO) -> int:
+        target = self._path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        return target.write_bytes(data.read())
+
+    @_aio
+    async def remove_file(self, path: str, recursive: bool = False):
+        target = self._path(path)
+        if not target.exists():
+            raise GRPCError(Status.NOT_FOUND, f"No such file: {path}")
+        if target.is_dir():
+            shutil.rmtree(target) if recursive else target.rmdir()
+        else:
+            target.unlink()
+
+    @_aio
+    async def listdir(self, path: str) -> list[FileEntry]:
+        target = self._path(path)
+        if not target.exists():
+            raise GRPCError(Status.NOT_FOUND, f"No such file: {path}")
+        if not target.is_dir():
+            return [self._entry(target)]
+        return [self._entry(child) for child in sorted(target.iterdir())]
+
+
+class _LocalStream:
+    """Pumped in the background, as Modal buffers output, so pipes never fill up."""
+
+    def __init__(self, reader: asyncio.StreamReader):
+        self._chunks: asyncio.Queue[str | None] = asyncio.Queue()
+        self._pump = asyncio.create_task(self._read(reader))
+
+    async def _read(self, reader: asyncio.StreamReader):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        while chunk := await reader.read(64 * 1024):
+            if text := decoder.decode(chunk):
+                self._chunks.put_nowait(text)
+        self._chunks.put_nowait(None)
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        while (chunk := await self._chunks.get()) is not None:
+            yield chunk
+        # Leave EOF visible to later readers
+        self._chunks.put_nowait(None)
+
+    @_aio
+    async def read(self) -> str:
+        return "".join([chunk async for chunk in self])
+
+
+class _LocalStdin:
+    def __init__(self, writer: asyncio.StreamWriter, rewrite: Callable[[str], str]):
+        self._writer = writer
+        self._rewrite = rewrite
+
+    def write(self, data: str | bytes):
+        if isinstance(data, str):
+            data = self._rewrite(data).encode()
+        self._writer.write(data)
+
+    def write_eof(self):
+        self._writer.write_eof()
+
+    @_aio
+    async def drain(self):
+        await self._writer.drain()
+
+
+class LocalProcess:
+    def __init__(self, proc: asyncio.subprocess.Process, rewrite: Callable[[str], str]):
+        assert proc.stdin and proc.stdout and proc.stderr
+        self._proc = proc
+        self._process_id = str(proc.pid)
+        self.stdin = _LocalStdin(proc.stdin, rewrite)
+        self.stdout = _LocalStream(proc.stdout)
+        self.stderr = _LocalStream(proc.stderr)
+
+    @_aio
+    async def wait(self) -> int:
+        return await self._proc.wait()
+
+    def kill(self):
+        if self._proc.returncode is None:
+            self._proc.kill()
+
+
+@dataclass(kw_only=True)
+class LocalSandbox:
+    mounts: dict[str, Path]
+    env: dict[str, str] = field(default_factory=dict)
+    procs: list[LocalProcess] = field(default_factory=list)
+
+    def rewrite(self, text: str) -> str:
+        for mount, root in self.mounts.items():
+            text = text.replace(mount, root.as_posix())
+        return text
+
+    @_aio
+    async def exec(self, *argv: str) -> LocalProcess:
+        proc = LocalProcess(
+            await asyncio.create_subprocess_exec(
+                *(self.rewrite(a) for a in argv),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=next(iter(self.mounts.values()), None),
+                env={**os.environ, **self.env},
+                start_new_session=True,
+            ),
+            self.rewrite,
+        )
+        self.procs.append(proc)
+        return proc
+
+    @_aio
+    async def tunnels(self) -> dict[int, SimpleNamespace]:
+        return {}
+
+    @_aio
+    async def terminate(self):
+        for proc in self.procs:
+            proc.kill()
+        self.procs.clear()
+
+
+class LocalMethod:
+    def __init__(self, owner: "LocalInstance", fn: Callable):
+        self._owner = owner
+        self._fn = fn
+        self.local = fn
+
+    async def _call(self, *args, **kwargs) -> Any:
+        await self._owner.enter()
+        return _copy(await self._fn(*_copy(args), **_copy(kwargs)))
+
+    async def _call_gen(self, *args, **kwargs) -> AsyncIterator[Any]:
+        await self._owner.enter()
+        async for item in self._fn(*_copy(args), **_copy(kwargs)):
+            yield _copy(item)
+
+    async def _spawn(self, *args, **kwargs) -> SimpleNamespace:
+        task = asyncio.create_task(self._call(*args, **kwargs))
+        self._owner.backend.tasks.add(task)
+        task.add_done_callback(self._owner.backend.tasks.discard)
+        return SimpleNamespace(get=SimpleNamespace(aio=lambda: asyncio.shield(task)))
+
+    @property
+    def remote(self):
+        return SimpleNamespace(aio=self._call)
+
+    @property
+    def remote_gen(self):
+        return SimpleNamespace(aio=self._call_gen)
+
+    @property
+    def spawn(self):
+        return SimpleNamespace(aio=self._spawn)
+
+
+class LocalInstance:
+    """One warm "container" of an `@app.cls` class."""
+
+    def __init__(self, backend: "LocalBackend", cls: Any, params: dict[str, Any]):
+        self.backend = backend
+        user_cls = synchronizer._translate_in(cls)._user_cls
+        bound = _get_class_constructor_signature(user_cls).bind(**params)
+        bound.apply_defaults()
+        self.obj = user_cls.__new__(user_cls)
+        self.obj.__dict__.update(bound.arguments)
+        for name, partial in _find_partial_methods_for_user_cls(
+            user_cls, _PartialFunctionFlags.FUNCTION
+        ).items():
+            method = LocalMethod(self, partial.raw_f.__get__(self.obj))
+            setattr(self.obj, name, method)
+        self._hooks = {
+            flag: [
+                partial.raw_f.__get__(self.obj)
+                for partial in _find_partial_methods_for_user_cls(
+                    user_cls, flag
+                ).values()
+            ]
+            for flag in (
+                _PartialFunctionFlags.ENTER_PRE_SNAPSHOT
+                | _PartialFunctionFlags.ENTER_POST_SNAPSHOT,
+                _PartialFunctionFlags.EXIT,
+            )
+        }
+        self._entered: asyncio.Task | None = None
+
+    async def _run_hooks(self, flag: int):
+        for hook in self._hooks[flag]:
+            if asyncio.iscoroutine(result := hook()):
+                await result
+
+    async def enter(self):
+        if self._entered is None:
+            self._entered = asyncio.create_task(
+                self._run_hooks(
+                    _PartialFunctionFlags.ENTER_PRE_SNAPSHOT
+                    | _PartialFunctionFlags.ENTER_POST_SNAPSHOT
+                )
+            )
+        await asyncio.shield(self._entered)
+
+    async def exit(self):
+        if self._entered is not None:
+            await self._run_hooks(_PartialFunctionFlags.EXIT)
+
+
+@dataclass(kw_only=True)
+class LocalBackend:
+    base_url: str | None = None
+    stubs: dict[str, str] = field(default_factory=lambda: dict(DEFAULT_STUBS))
+    root: Path | None = None
+
+    dicts: dict[str, LocalDict] = field(default_factory=dict)
+    instances: dict[tuple, LocalInstance] = field(default_factory=dict)
+    sandboxes: dict[str, LocalSandbox] = field(default_factory=dict)
+    spans: list[dict] = field(default_factory=list)
+    tasks: set[asyncio.Task] = field(default_factory=set)
+    _previous: backend.Backend | None = None
+    _tempdir: tempfile.TemporaryDirectory | None = None
+
+    async def network_file_system(self, name: str) -> LocalNetworkFileSystem:
+        assert self.root is not None
+        (root := self.root / "nfs" / name).mkdir(parents=True, exist_ok=True)
+        return LocalNetworkFileSystem(root=root)
+
+    async def sandbox(
+        self, name: str, *, headless: bool = False, **options: Any
+    ) -> LocalSandbox:
+        if name not in self.sandboxes:
+            self.sandboxes[name] = LocalSandbox(
+                mounts={
+                    mount: nfs.root
+                    for mount, nfs in options.get("network_file_systems", {}).items()
+                },
+                env={
+                    "SCREENSHOT": SCREENSHOT.as_posix(),
+                    "PATH": f"{self.root / 'bin'}:{os.environ['PATH']}",
+                },
+            )
+        return self.sandboxes[name]
+
+    def dict(self, name: str) -> LocalDict:
+        return self.dicts.setdefault(name, LocalDict())
+
+    def instance(self, cls: Any, **params: Any) -> Any:
+        key = (cls, tuple(sorted(params.items())))
+        if key not in self.instances:
+            self.instances[key] = LocalInstance(self, cls, params)
+        return self.instances[key].obj
+
+    def anthropic(self) -> AsyncAnthropic:
+        return AsyncAnthropic(base_url=self.base_url, api_key="local", max_retries=0)
+
+    async def _export(self, trace_id: str, spans: list[dict]):
+        self.spans.extend(spans)
+
+    async def __aenter__(self) -> "LocalBackend":
+        if self.root is None:
+            self._tempdir = tempfile.TemporaryDirectory(prefix="computer-use-")
+            self.root = Path(self._tempdir.name)
+        (self.root / "bin").mkdir(exist_ok=True)
+        for name, stub in self.stubs.items():
+            (path := self.root / "bin" / name).write_text(f"#!/bin/sh\n{stub}\n")
+            path.chmod(0o755)
+        self._previous = backend.current()
+        backend.set_backend(self)
+        tracing.set_exporter(self._export)
+        return self
+
+    async def __aexit__(self, *exc):
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        for instance in reversed(list(self.instances.values())):
+            await instance.exit()
+        for sandbox in self.sandboxes.values():
+            await sandbox.terminate.aio()
+        await tracing.flush()
+        tracing.set_exporter(tracing.queue_exporter)
+        assert self._previous is not None
+        backend.set_backend(self._previous)
+        if self._tempdir:
+            self._tempdir.cleanup()
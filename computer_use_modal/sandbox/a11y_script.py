@@ -0,0 +1,85 @@
+"""
+Dump the accessibility tree of the active window, run inside the sandbox.
+
+Walks AT-SPI from the desktop to the window in the ACTIVE state, and prints
+one JSON object: the window's name and its showing nodes, as
+`[depth, role, name, x, y, width, height, states]` in screen pixels. Unnamed
+containers are skipped but their children kept. Prints no nodes if AT-SPI is
+not available or no window is active, so the caller can fall back to a
+screenshot.
+"""
+
+import json
+import sys
+
+MAX_NODES = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+MAX_DEPTH = 40
+INTERACTIVE = {
+    "push button",
+    "toggle button",
+    "check box",
+    "radio button",
+    "combo box",
+    "entry",
+    "password text",
+    "text",
+    "link",
+    "menu item",
+    "page tab",
+    "list item",
+    "slider",
+    "spin button",
+}
+STATES = ("focused", "checked", "selected", "expanded", "pressed")
+
+
+def active_window(Atspi):
+    desktop = Atspi.get_desktop(0)
+    for i in range(desktop.get_child_count()):
+        app = desktop.get_child_at_index(i)
+        for j in range(app.get_child_count() if app else 0):
+            window = app.get_child_at_index(j)
+            if window and window.get_state_set().contains(Atspi.StateType.ACTIVE):
+                return window
+    return None
+
+
+def walk(Atspi, node, depth, out):
+    if len(out) >= MAX_NODES or depth > MAX_DEPTH or node is None:
+        return
+    state = node.get_state_set()
+    if not state.contains(Atspi.StateType.SHOWING):
+        return
+    role, name = node.get_role_name(), (node.get_name() or "").strip()
+    box = node.get_extents(Atspi.CoordType.SCREEN)
+    if (name or role in INTERACTIVE) and box.width > 0 and box.height > 0:
+        states = [
+            s for s in STATES if state.contains(getattr(Atspi.StateType, s.upper()))
+        ]
+        out.append(
+            [depth, role, name[:100], box.x, box.y, box.width, box.height, states]
+        )
+        depth += 1
+    for i in range(node.get_child_count()):
+        walk(Atspi, node.get_child_at_index(i), depth, out)
+
+
+def main():
+    try:
+        import gi
+
+        gi.require_version("Atspi", "2.0")
+        from gi.repository import Atspi
+    except (ImportError, ValueError):
+        return {"window": None, "nodes": []}
+    window = active_window(Atspi)
+    if window is None:
+        return {"window": None, "nodes": []}
+    nodes = []
+    for i in range(window.get_child_count()):
+        walk(Atspi, window.get_child_at_index(i), 0, nodes)
+    return {"window": window.get_name(), "nodes": nodes}
+
+
+if __name__ == "__main__":
+    print(json.dumps(main()))
@@ -0,0 +1,51 @@
+"""
+Text snapshots of the desktop from its accessibility tree.
+
+The sandbox image turns on AT-SPI for GTK and Firefox, so `a11y_script` can
+list the controls of the active window, with their roles, names and screen
+positions, in a few kilobytes of text. `ComputerTool(observation="accessibility")`
+sends that after each action instead of a screenshot, as long as it is
+cheaper; see `render`.
+"""
+
+from pathlib import Path
+from typing import Any, Callable
+
+SCRIPT = Path(__file__).with_name("a11y_script.py")
+
+MAX_NODES = 150
+# Deeper nesting is flattened, so indentation stays cheap
+MAX_INDENT = 8
+
+
+def tree_command(display: int, limit: int = MAX_NODES) -> tuple[str, ...]:
+    return (
+        "env",
+        f"DISPLAY=:{display}",
+        "python3",
+        "-c",
+        SCRIPT.read_text(),
+        str(limit),
+    )
+
+
+def render(tree: dict[str, Any], scale: Callable[[int, int], tuple[int, int]]) -> str:
+    """
+    One line per node, indented by depth, with its center and size scaled by
+    `scale` into the coordinates the model clicks in:
+
+        push button "Reload" at (112, 54) 24x24 [focused]
+    """
+
+    lines = [f"Window: {tree['window']!r}"] if tree.get("window") else []
+    for depth, role, name, x, y, width, height, states in tree["nodes"]:
+        cx, cy = scale(x + width // 2, y + height // 2)
+        w, h = scale(width, height)
+        line = f"{'  ' * min(depth, MAX_INDENT)}{role}"
+        if name:
+            line += f" {name!r}"
+        line += f" at ({cx}, {cy}) {w}x{h}"
+        if states:
+            line += f" [{', '.join(states)}]"
+        lines.append(line)
+    return "\n".join(lines)
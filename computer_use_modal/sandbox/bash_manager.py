@@ -8,10 +8,13 @@ from modal import Sandbox
 from modal.container_process import ContainerProcess
 
 from computer_use_modal.sandbox.io import IOChunk, IOTask
+from computer_use_modal.sandbox.slots import Slot
 from computer_use_modal.tools.base import ToolResult
+from computer_use_modal.tracing import span
 
 logger = logging.getLogger(__name__)
 
+
 @dataclass(frozen=True, kw_only=True, unsafe_hash=True)
 class BashSession:
     session_id: str
@@ -21,6 +24,7 @@ class BashSession:
 @dataclass(kw_only=True)
 class BashSessionManager:
     sandbox: Sandbox
+    slot: Slot = Slot()
     session: BashSession | None = None
     proc: ContainerProcess | None = None
     timeout: float = 30
@@ -36,7 +40,7 @@ class BashSessionManager:
         else:
             self.proc = cast(
                 ContainerProcess,
-                await self.sandbox.exec.aio("bash"),
+                await self.sandbox.exec.aio(*self.slot.command("bash")),
             )
             process_id = _gross_modal_hack(self.proc)._process_id
             assert process_id is not None
@@ -58,7 +62,9 @@ class BashSessionManager:
         if self._io_task:
             self._io_task.cancel()
         logger.info(f"killing bash with pid {self.session.pid}")
-        proc = await self.sandbox.exec.aio("kill", str(self.session.pid))
+        proc = await self.sandbox.exec.aio(
+            *self.slot.command("kill", str(self.session.pid))
+        )
         await proc.wait.aio()
         self.session = None
         self.proc = None
@@ -68,8 +74,10 @@ class BashSessionManager:
             await self.start()
         assert self.session is not None
         cmd = BashCommandManager(session=self)
-        await cmd.start(command)
-        res = await cmd.wait()
+        with span("bash.command") as s:
+            await cmd.start(command)
+            res = await cmd.wait()
+            s.attributes["exit_code"] = cmd.exit_code or 0
         if cmd.exit_code:
             await self.kill()
         return res
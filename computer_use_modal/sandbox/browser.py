@@ -0,0 +1,28 @@
+"""
+A fast path to the pages open in the sandbox's Firefox.
+
+Firefox listens for WebDriver BiDi on the slot's `debug_port`: the desktop's
+launcher, the `firefox` prewarm app and `browser_script` itself all start it
+with `--remote-debugging-port`. `BrowserTool` sends its requests through
+`SandboxManager.browse`, which runs `browser_script` in the sandbox, so the
+model can navigate, read a page's text and scroll it without a screenshot per
+step. It works on the same tab the computer tool sees.
+"""
+
+import json
+from pathlib import Path
+from typing import Any
+
+SCRIPT = Path(__file__).with_name("browser_script.py")
+
+
+def browse_command(display: int, port: int, request: dict[str, Any]) -> tuple[str, ...]:
+    return (
+        "env",
+        f"DISPLAY=:{display}",
+        "python3",
+        "-c",
+        SCRIPT.read_text(),
+        str(port),
+        json.dumps(request),
+    )
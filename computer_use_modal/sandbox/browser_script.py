@@ -0,0 +1,300 @@
+"""
+Drive the slot's Firefox over WebDriver BiDi, run inside the sandbox (stdlib only).
+
+    python3 -c ... <port> <request json>
+
+Connects to Firefox's remote debugging port, starting Firefox with it if
+nothing listens there, and runs one request from the browser tool against
+the tab the user can see: `navigate` (and wait for the page to load), `text`
+(readable text of the page or an element), `html` (markup of the elements
+matching a selector) or `scroll`. Prints the result, or `{"error": ...}`, as
+JSON.
+"""
+
+import base64
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import time
+
+PORT, REQUEST = int(sys.argv[1]), json.loads(sys.argv[2])
+LAUNCH_TIMEOUT = 30
+WAIT_TIMEOUT = 10
+
+# The page's main content, its text with runs of blank lines collapsed, and
+# where it is scrolled to. `%s` is the selector, as JSON.
+READ = """
+(() => {
+  const selector = %s;
+  const root = selector
+    ? document.querySelector(selector)
+    : document.querySelector("article, main, [role=main]") || document.body;
+  if (!root) return JSON.stringify({error: `No element matches ${selector}`});
+  return JSON.stringify({
+    url: location.href,
+    title: document.title,
+    text: (root.innerText || "").replace(/\\n\\s*\\n\\s*\\n+/g, "\\n\\n").trim(),
+    scroll: [Math.round(scrollY), document.documentElement.scrollHeight, innerHeight],
+  });
+})()
+"""
+HTML = """
+(() => {
+  const [selector, limit, chars] = %s;
+  const nodes = [...document.querySelectorAll(selector)];
+  return JSON.stringify({
+    url: location.href,
+    title: document.title,
+    matches: nodes.length,
+    html: nodes.slice(0, limit).map((node) => node.outerHTML.slice(0, chars)),
+  });
+})()
+"""
+SCROLL = """
+(() => {
+  const [selector, pages] = %s;
+  if (selector) {
+    const node = document.querySelector(selector);
+    if (!node) return JSON.stringify({error: `No element matches ${selector}`});
+    node.scrollIntoView({block: "center"});
+  } else {
+    scrollBy(0, pages * innerHeight);
+  }
+  return JSON.stringify({
+    url: location.href,
+    title: document.title,
+    scroll: [Math.round(scrollY), document.documentElement.scrollHeight, innerHeight],
+  });
+})()
+"""
+WAIT_FOR = """
+new Promise((resolve) => {
+  const [selector, timeout] = %s;
+  const started = Date.now();
+  const poll = () => {
+    if (document.querySelector(selector)) return resolve(true);
+    if (Date.now() - started > timeout) return resolve(false);
+    setTimeout(poll, 100);
+  };
+  poll();
+})
+"""
+
+
+class BrowserError(Exception):
+    pass
+
+
+class BiDi:
+    """A WebDriver BiDi session over a bare-bones WebSocket client."""
+
+    def __init__(self, sock: socket.socket, buffer: bytes):
+        self.sock = sock
+        self.buffer = buffer
+        self.last_id = 0
+
+    @classmethod
+    def connect(cls, port):
+        sock = socket.create_connection(("127.0.0.1", port), timeout=60)
+        key = base64.b64encode(os.urandom(16)).decode()
+        sock.sendall(
+            (
+                "GET /session HTTP/1.1\r\n"
+                f"Host: 127.0.0.1:{port}\r\n"
+                "Upgrade: websocket\r\n"
+                "Connection: Upgrade\r\n"
+                f"Sec-WebSocket-Key: {key}\r\n"
+                "Sec-WebSocket-Version: 13\r\n\r\n"
+            ).encode()
+        )
+        response = b""
+        while b"\r\n\r\n" not in response:
+            if not (chunk := sock.recv(4096)):
+                raise ConnectionError("closed during handshake")
+            response += chunk
+        head, rest = response.split(b"\r\n\r\n", 1)
+        if b" 101 " not in head.split(b"\r\n")[0]:
+            sock.close()
+            raise ConnectionError(head.split(b"\r\n")[0].decode())
+        return cls(sock, rest)
+
+    def read(self, n):
+        while len(self.buffer) < n:
+            if not (chunk := self.sock.recv(1 << 16)):
+                raise ConnectionError("closed")
+            self.buffer += chunk
+        data, self.buffer = self.buffer[:n], self.buffer[n:]
+        return data
+
+    def send(self, opcode, payload):
+        header = bytearray([0x80 | opcode])
+        if len(payload) < 126:
+            header.append(0x80 | len(payload))
+        elif len(payload) < 1 << 16:
+            header += bytes([0x80 | 126]) + struct.pack(">H", len(payload))
+        else:
+            header += bytes([0x80 | 127]) + struct.pack(">Q", len(payload))
+        mask = os.urandom(4)
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        self.sock.sendall(bytes(header) + mask + masked)
+
+    def message(self):
+        data = b""
+        while True:
+            first, second = self.read(2)
+            length = second & 0x7F
+            if length == 126:
+                (length,) = struct.unpack(">H", self.read(2))
+            elif length == 127:
+                (length,) = struct.unpack(">Q", self.read(8))
+            mask = self.read(4) if second & 0x80 else None
+            payload = self.read(length)
+            if mask:
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+            match first & 0x0F:
+                case 0x8:
+                    raise ConnectionError("closed")
+                case 0x9:
+                    self.send(0xA, payload)
+                    continue
+                case 0xA:
+                    continue
+            data += payload
+            if first & 0x80:
+                return json.loads(data)
+
+    def call(self, method, **params):
+        self.last_id += 1
+        self.send(
+            0x1,
+            json.dumps(
+                {"id": self.last_id, "method": method, "params": params}
+            ).encode(),
+        )
+        while True:
+            # Skip events, which have no id
+            if (message := self.message()).get("id") != self.last_id:
+                continue
+            if message.get("type") == "error":
+                raise BrowserError(
+                    f"{method}: {message['error']}: {message['message']}"
+                )
+            return message["result"]
+
+    def evaluate(self, context, expression):
+        result = self.call(
+            "script.evaluate",
+            expression=expression,
+            target={"context": context},
+            awaitPromise=True,
+            resultOwnership="none",
+        )
+        if result["type"] == "exception":
+            raise BrowserError(result["exceptionDetails"]["text"])
+        return result["result"].get("value")
+
+
+def connect():
+    try:
+        return BiDi.connect(PORT)
+    except OSError:
+        pass
+    subprocess.Popen(
+        ["firefox-esr", "--remote-debugging-port", str(PORT), "-new-window"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    deadline = time.monotonic() + LAUNCH_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.25)
+        try:
+            return BiDi.connect(PORT)
+        except OSError:
+            continue
+    raise BrowserError(
+        f"Firefox is not listening on port {PORT}. If it is already open, close "
+        "it, and the browser tool will start it with remote debugging."
+    )
+
+
+def visible_tab(bidi):
+    """The tab in the foreground, falling back to the most recent one."""
+
+    contexts = bidi.call("browsingContext.getTree", maxDepth=0)["contexts"]
+    if not contexts:
+        return bidi.call("browsingContext.create", type="tab")["context"]
+    for context in contexts:
+        try:
+            state = bidi.evaluate(context["context"], "document.visibilityState")
+        except BrowserError:
+            continue
+        if state == "visible":
+            return context["context"]
+    return contexts[-1]["context"]
+
+
+def paged(result, offset, max_chars):
+    text = result.pop("text")
+    return {
+        **result,
+        "text": text[offset : offset + max_chars],
+        "offset": offset,
+        "total": len(text),
+    }
+
+
+def run(bidi, request):
+    context = visible_tab(bidi)
+    offset, max_chars = request.get("offset", 0), request.get("max_chars", 8000)
+    match request["action"]:
+        case "navigate":
+            bidi.call(
+                "browsingContext.navigate",
+                context=context,
+                url=request["url"],
+                wait="complete",
+            )
+            if selector := request.get("wait_for"):
+                found = bidi.evaluate(
+                    context, WAIT_FOR % json.dumps([selector, WAIT_TIMEOUT * 1000])
+                )
+                if not found:
+                    raise BrowserError(
+                        f"No element matched {selector} in {WAIT_TIMEOUT}s"
+                    )
+            return paged(
+                json.loads(bidi.evaluate(context, READ % "null")), 0, max_chars
+            )
+        case "text":
+            result = json.loads(
+                bidi.evaluate(context, READ % json.dumps(request.get("selector")))
+            )
+            return result if "error" in result else paged(result, offset, max_chars)
+        case "html":
+            args = [request["selector"], request.get("limit", 5), max_chars]
+            return json.loads(bidi.evaluate(context, HTML % json.dumps(args)))
+        case "scroll":
+            args = [request.get("selector"), request.get("pages", 1)]
+            return json.loads(bidi.evaluate(context, SCROLL % json.dumps(args)))
+    raise BrowserError(f"Unknown action {request['action']}")
+
+
+def main():
+    try:
+        bidi = connect()
+        bidi.call("session.new", capabilities={})
+        try:
+            return run(bidi, REQUEST)
+        finally:
+            bidi.call("session.end")
+    except (BrowserError, OSError) as e:
+        return {"error": str(e)}
+
+
+if __name__ == "__main__":
+    print(json.dumps(main()))
@@ -0,0 +1,210 @@
+"""
+Filesystem checkpoints, taken and restored inside the sandbox (stdlib only).
+
+    python3 -c ... save <store> <epoch> <name> <keep> <path>...
+    python3 -c ... restore <store> <epoch> [<name>]
+
+A checkpoint holds what changed under each path since the sandbox started
+(anything with a ctime after `epoch`'s mtime), since the image provides the
+rest. File contents go into `<store>/objects`, gzipped and named by the
+sha256 of their content, so a file shared by several checkpoints (or several
+paths) is stored once. `<store>/manifests/<name>.json` lists every entry with
+its metadata; `<store>/LATEST` names the newest. Only the newest `keep`
+manifests are kept, with the objects they reference.
+
+Prints one JSON object with what was done.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import stat
+import sys
+import time
+
+CHUNK = 1 << 20
+
+
+def object_path(store, digest):
+    return os.path.join(store, "objects", digest[:2], digest[2:])
+
+
+def manifest_path(store, name):
+    return os.path.join(store, "manifests", f"{name}.json")
+
+
+def write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "wb") as f:
+        f.write(data)
+    os.replace(f"{path}.tmp", path)
+
+
+def load(store, name=None):
+    try:
+        if name is None:
+            with open(os.path.join(store, "LATEST")) as f:
+                name = f.read().strip()
+        with open(manifest_path(store, name)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def age(epoch):
+    """Seconds of setup the sandbox holds: its own, plus any it was restored from."""
+    try:
+        with open(f"{epoch}.age") as f:
+            base = float(f.read())
+    except (FileNotFoundError, ValueError):
+        base = 0.0
+    return base + time.time() - os.stat(epoch).st_mtime
+
+
+def store_file(store, path, stats):
+    digest, size = hashlib.sha256(), 0
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK):
+            digest.update(chunk)
+    target = object_path(store, digest := digest.hexdigest())
+    if not os.path.exists(target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(path, "rb") as src, gzip.open(f"{target}.tmp", "wb", 6) as dst:
+            shutil.copyfileobj(src, dst, CHUNK)
+        os.replace(f"{target}.tmp", target)
+        size = os.stat(target).st_size
+        stats["new_objects"] += 1
+    stats["stored_bytes"] += size
+    return digest
+
+
+def scan(store, since, root, previous, stats):
+    for dirpath, dirnames, filenames in os.walk(root):
+        if os.path.commonpath([dirpath, store]) == store:
+            dirnames[:] = []
+            continue
+        for name in dirnames + filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.lstat(path)
+            except OSError:
+                continue
+            if st.st_ctime <= since or path == store:
+                continue
+            entry = {
+                "mode": stat.S_IMODE(st.st_mode),
+                "uid": st.st_uid,
+                "gid": st.st_gid,
+                "mtime": st.st_mtime_ns,
+            }
+            if stat.S_ISDIR(st.st_mode):
+                entry["type"] = "dir"
+            elif stat.S_ISLNK(st.st_mode):
+                entry.update(type="link", target=os.readlink(path))
+            elif stat.S_ISREG(st.st_mode):
+                entry.update(type="file", size=st.st_size)
+                old = previous.get(path, {})
+                if (old.get("size"), old.get("mtime")) == (st.st_size, st.st_mtime_ns):
+                    entry["sha256"] = old["sha256"]
+                else:
+                    try:
+                        entry["sha256"] = store_file(store, path, stats)
+                    except OSError:
+                        continue
+                stats["files"] += 1
+                stats["bytes"] += st.st_size
+            else:
+                continue
+            yield path, entry
+
+
+def collect(store, keep):
+    names = sorted(n[:-5] for n in os.listdir(os.path.join(store, "manifests")))
+    for name in names[:-keep]:
+        os.remove(manifest_path(store, name))
+    live = {
+        e["sha256"]
+        for name in names[-keep:]
+        for e in load(store, name)["entries"].values()
+        if "sha256" in e
+    }
+    removed = 0
+    for dirpath, _, filenames in os.walk(os.path.join(store, "objects")):
+        for name in filenames:
+            if os.path.basename(dirpath) + name not in live:
+                os.remove(os.path.join(dirpath, name))
+                removed += 1
+    return removed
+
+
+def save(store, epoch, name, keep, *paths):
+    started = time.time()
+    since = os.stat(epoch).st_mtime
+    previous = (load(store) or {}).get("entries", {})
+    stats = {"files": 0, "bytes": 0, "new_objects": 0, "stored_bytes": 0}
+    entries = {}
+    for root in paths:
+        entries.update(scan(store, since, root, previous, stats))
+    manifest = {"name": name, "paths": list(paths), "age": age(epoch)}
+    write_atomic(
+        manifest_path(store, name),
+        json.dumps({**manifest, "entries": entries}).encode(),
+    )
+    write_atomic(os.path.join(store, "LATEST"), name.encode())
+    removed = collect(store, int(keep))
+    return {**manifest, **stats, "removed_objects": removed}, started
+
+
+def restore(store, epoch, name=None):
+    started = time.time()
+    if (manifest := load(store, name)) is None:
+        return {"name": None}, started
+    stats = {"files": 0, "restored": 0, "bytes": 0}
+    # Sorted, so each directory comes before what it holds
+    for path, entry in sorted(manifest["entries"].items()):
+        try:
+            st = os.lstat(path)
+        except FileNotFoundError:
+            st = None
+        if st is not None and stat.S_ISDIR(st.st_mode) != (entry["type"] == "dir"):
+            if stat.S_ISDIR(st.st_mode):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            st = None
+        if entry["type"] == "dir":
+            os.makedirs(path, exist_ok=True)
+        elif entry["type"] == "link":
+            if st is not None:
+                os.remove(path)
+            os.symlink(entry["target"], path)
+        else:
+            stats["files"] += 1
+            if st is not None and (st.st_size, st.st_mtime_ns) == (
+                entry["size"],
+                entry["mtime"],
+            ):
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with gzip.open(object_path(store, entry["sha256"])) as src:
+                with open(f"{path}.restore", "wb") as dst:
+                    shutil.copyfileobj(src, dst, CHUNK)
+            os.replace(f"{path}.restore", path)
+            stats["restored"] += 1
+            stats["bytes"] += entry["size"]
+        os.lchown(path, entry["uid"], entry["gid"])
+        if entry["type"] != "link":
+            os.chmod(path, entry["mode"])
+            os.utime(path, ns=(entry["mtime"], entry["mtime"]))
+    with open(f"{epoch}.age", "w") as f:
+        f.write(str(manifest["age"]))
+    return {"name": manifest["name"], "age": manifest["age"], **stats}, started
+
+
+if __name__ == "__main__":
+    command, store, *args = sys.argv[1:]
+    store = os.path.abspath(store)
+    result, started = {"save": save, "restore": restore}[command](store, *args)
+    print(json.dumps({**result, "seconds": time.time() - started}))
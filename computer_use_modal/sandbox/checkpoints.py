@@ -0,0 +1,65 @@
+"""
+Checkpoints of what an agent installed and wrote outside the NFS.
+
+A sandbox lives for at most an hour, and anything outside the NFS (packages,
+the browser profile, the home directory) goes with it. `SandboxManager`
+checkpoints `CHECKPOINT_PATHS` onto the request's NFS on demand, every
+`checkpoint_interval` seconds, and before it terminates the sandbox, and a
+new sandbox for the same request_id is restored from the latest checkpoint
+before it takes any commands. See `checkpoint_script` for the format.
+"""
+
+from pathlib import Path, PurePosixPath
+
+from uuid6 import uuid7
+
+from computer_use_modal.app import MOUNT_PATH
+
+SCRIPT = Path(__file__).with_name("checkpoint_script.py")
+
+# The home directory, where pip, npm and the installers put things, and
+# dpkg's and apt's own state so installed packages stay installed
+CHECKPOINT_PATHS = (
+    "/home/computeruse",
+    "/root",
+    "/usr",
+    "/opt",
+    "/etc",
+    "/var/lib/dpkg",
+    "/var/lib/apt/lists",
+)
+STORE = (PurePosixPath(MOUNT_PATH) / ".checkpoints").as_posix()
+# Created with the sandbox; what changed after it is what a checkpoint holds
+EPOCH = "/var/tmp/.sandbox-epoch"
+KEEP = 3
+
+
+def save_command(paths: tuple[str, ...] = CHECKPOINT_PATHS) -> tuple[str, ...]:
+    return (
+        "python3",
+        "-c",
+        SCRIPT.read_text(),
+        "save",
+        STORE,
+        EPOCH,
+        uuid7().hex,
+        str(KEEP),
+        *paths,
+    )
+
+
+def restore_command(name: str | None = None) -> tuple[str, ...]:
+    return (
+        "python3",
+        "-c",
+        SCRIPT.read_text(),
+        "restore",
+        STORE,
+        EPOCH,
+        *([name] if name else []),
+    )
+
+
+def mark_epoch_command() -> tuple[str, ...]:
+    """Prints "fresh" if the sandbox had no epoch yet, i.e. was just created."""
+    return ("sh", "-c", '[ -e "$0" ] || { touch "$0" && echo fresh; }', EPOCH)
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+from pathlib import Path, PurePosixPath
+
+from grpclib import GRPCError
+from modal import NetworkFileSystem
+from modal.volume import FileEntry, FileEntryType
+
+from computer_use_modal.sandbox.slots import Slot
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(kw_only=True, frozen=True)
+class DirNode:
+    mtime: int
+    files: tuple[str, ...]
+    dirs: dict[str, int]
+
+
+@dataclass(kw_only=True)
+class DirectoryIndex:
+    """
+    In-memory index of the NFS mount, used to answer `view` on directories.
+
+    Each directory is listed once and re-listed only when the mtime reported by
+    its parent changes, so repeated views of a large tree cost a single listing
+    of the requested root.
+    """
+
+    MAX_ENTRIES: int = 500
+    HIDDEN: tuple[str, ...] = (".*",)
+    PRUNE: tuple[str, ...] = ("node_modules", "__pycache__", "venv", "*.egg-info")
+
+    nfs: NetworkFileSystem
+    slot: Slot = Slot()
+    _nodes: dict[PurePosixPath, DirNode] = field(default_factory=dict)
+    _lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    def _is_hidden(self, name: str) -> bool:
+        return any(fnmatch(name, pattern) for pattern in self.HIDDEN)
+
+    def _is_pruned(self, name: str) -> bool:
+        return any(fnmatch(name, pattern) for pattern in self.PRUNE)
+
+    async def _listdir(self, path: PurePosixPath) -> list[FileEntry]:
+        try:
+            root = self.slot.path(path)
+            return await self.nfs.listdir.aio("/" if root == "." else root)
+        except (GRPCError, FileNotFoundError):
+            return []
+
+    async def _list(self, path: PurePosixPath, mtime: int) -> DirNode:
+        if (node := self._nodes.get(path)) and node.mtime == mtime:
+            return node
+        files, dirs = [], {}
+        for entry in await self._listdir(path):
+            if self._is_hidden(name := PurePosixPath(entry.path).name):
+                continue
+            if entry.type == FileEntryType.DIRECTORY:
+                dirs[name] = entry.mtime
+            else:
+                files.append(name)
+        self._nodes[path] = node = DirNode(
+            mtime=mtime, files=tuple(sorted(files)), dirs=dict(sorted(dirs.items()))
+        )
+        return node
+
+    async def _walk(self, path: PurePosixPath, mtime: int, depth: int, out: list[str]):
+        node = await self._list(path, mtime)
+        for name, child_mtime in node.dirs.items():
+            if len(out) >= self.MAX_ENTRIES:
+                return
+            out.append(f"{PurePosixPath(self.slot.mount) / path / name}")
+            if depth > 1 and not self._is_pruned(name):
+                await self._walk(path / name, child_mtime, depth - 1, out)
+        for name in node.files:
+            if len(out) >= self.MAX_ENTRIES:
+                return
+            out.append(f"{PurePosixPath(self.slot.mount) / path / name}")
+
+    async def view(self, path: Path, depth: int = 2) -> tuple[list[str], bool]:
+        root = PurePosixPath(path.as_posix())
+        async with self._lock:
+            # The root is always re-listed (its mtime lives in its parent);
+            # everything below it is refreshed only when its mtime moved.
+            self._nodes.pop(root, None)
+            out = [f"{PurePosixPath(self.slot.mount) / root}"]
+            await self._walk(root, -1, depth, out)
+        return out, len(out) >= self.MAX_ENTRIES
@@ -1,3 +1,4 @@
+import json
 import logging
 from collections import defaultdict
 from dataclasses import dataclass, field
@@ -5,9 +6,9 @@ from functools import singledispatchmethod
 from pathlib import Path
 from typing import TYPE_CHECKING, Self
 
-import modal
 from modal.volume import FileEntry, FileEntryType
 
+from computer_use_modal import backend, codec
 from computer_use_modal.app import MOUNT_PATH
 from computer_use_modal.tools.base import ToolError, ToolResult
 from computer_use_modal.tools.edit.types import (
@@ -18,14 +19,29 @@ from computer_use_modal.tools.edit.types import (
     UndoEditRequest,
     ViewRequest,
 )
+from computer_use_modal.tracing import span
 from computer_use_modal.vnd.anthropic.tools.edit import make_output
 
 if TYPE_CHECKING:
     from computer_use_modal.sandbox.sandbox_manager import SandboxManager
 
-SESSIONS = modal.Dict.from_name("edit-sessions", create_if_missing=True)
+SESSIONS = backend.named_dict("edit-sessions")
 
 logger = logging.getLogger(__name__)
+
+
+@dataclass(kw_only=True)
+class TransferStats:
+    round_trips: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+
+    def record(self, sent: int = 0, received: int = 0):
+        self.round_trips += 1
+        self.bytes_sent += sent
+        self.bytes_received += received
+
+
 @dataclass(frozen=True, kw_only=True)
 class EditSession:
     file_versions: dict[Path, list[str]] = field(
@@ -34,7 +50,33 @@ class EditSession:
 
     @classmethod
     async def from_request_id(cls, request_id: str) -> Self:
-        return await SESSIONS.get.aio(request_id, cls())
+        match stored := await SESSIONS.get.aio(request_id):
+            case None:
+                return cls()
+            case bytes():
+                return cls.decode(stored)
+            case legacy:
+                # Pickled before `codec`; rewritten on the next save
+                return legacy
+
+    async def save(self, request_id: str):
+        await SESSIONS.put.aio(request_id, self.encode())
+
+    def encode(self) -> bytes:
+        return codec.encode({"file_versions": self.file_versions})
+
+    @classmethod
+    def decode(cls, data: bytes) -> Self:
+        record = codec.decode(data)
+        return cls(
+            file_versions=defaultdict(
+                list,
+                {
+                    Path(path): versions
+                    for path, versions in record["file_versions"].items()
+                },
+            )
+        )
 
 
 @dataclass(kw_only=True, frozen=True)
@@ -47,28 +89,31 @@ class FileInfo:
         return bool(self.listing)
 
     def is_file(self) -> bool:
-        return len(self.listing) == 1 and self.listing[0].type == FileEntryType.FILE
+        return (
+            len(self.listing) == 1
+            and self.listing[0].type == FileEntryType.FILE
+            and Path(self.listing[0].path).name == self.path.name
+        )
 
     def is_dir(self) -> bool:
-        return self.exists and not self.is_file
+        return self.exists() and not self.is_file()
 
     @property
     def local_path(self) -> Path:
-        return Path(MOUNT_PATH) / self.path
+        return Path(self.manager.mount) / self.path
 
     async def read(self) -> str:
-        return (
-            (await self.manager.sandbox.read_file.remote.aio(self.path))
-            .decode()
-            .expandtabs()
-        )
+        data = await self.manager.sandbox.read_file.remote.aio(self.path)
+        self.manager.stats.record(received=len(data))
+        return data.decode().expandtabs()
 
     async def write(self, content: str):
         if self.exists():
             self.manager.session.file_versions[self.path].append(await self.read())
         await self.manager.sandbox.write_file.remote.aio(
-            self.path, content.expandtabs().encode()
+            self.path, data := content.expandtabs().encode()
         )
+        self.manager.stats.record(sent=len(data))
 
     def __str__(self) -> str:
         return self.path.as_posix()
@@ -77,41 +122,61 @@ class FileInfo:
 @dataclass(kw_only=True, frozen=True)
 class EditSessionManager:
     SNIPPET_LINES: int = 4
+    BACKEND: str = "nfs"
+    KEEPS_HISTORY: bool = True
 
     sandbox: "SandboxManager"
     session: EditSession
+    # The agent's directory inside the sandbox; paths are relative to it
+    mount: str = MOUNT_PATH
+    stats: TransferStats = field(default_factory=TransferStats)
 
-    async def _validate_request(self, request: TRequest):
-        info = FileInfo(
-            path=(
-                request.path.relative_to(MOUNT_PATH)
-                if MOUNT_PATH in request.path.as_posix()
-                else request.path
-            ),
-            listing=[
-                FileEntry(**e)
-                for e in await self.sandbox.stat_file.remote.aio(request.path)
-            ],
-            manager=self,
-        )
-        if request.command != "create" and not info.exists():
+    def _check_request(self, request: TRequest, exists: bool, is_dir: bool):
+        if request.command != "create" and not exists:
             raise ToolError(
                 f"The path {request.path} does not exist. Please provide a valid path."
             )
-        if request.command == "create" and info.exists():
+        if request.command == "create" and exists:
             raise ToolError(
                 f"File already exists at: {request.path}. Cannot overwrite files using command `create`."
             )
-        if request.command != "view" and info.is_dir():
+        if request.command != "view" and is_dir:
             raise ToolError(
                 f"The path {request.path} is a directory and only the `view` command can be used on directories"
             )
-        if request.command == "view" and request.view_range and info.is_dir():
+        if request.command == "view" and request.view_range and is_dir:
             raise ToolError(
                 "The `view_range` parameter is not allowed when `path` points to a directory."
             )
+
+    async def _validate_request(self, request: TRequest):
+        path = (
+            request.path.relative_to(self.mount)
+            if self.mount in request.path.as_posix()
+            else request.path
+        )
+        info = FileInfo(
+            path=path,
+            listing=[
+                FileEntry(**e) for e in await self.sandbox.stat_file.remote.aio(path)
+            ],
+            manager=self,
+        )
+        self.stats.record()
+        self._check_request(request, exists=info.exists(), is_dir=info.is_dir())
         return info
 
+    async def run(self, request: TRequest) -> ToolResult:
+        with span(f"edit.{request.command}", backend=self.BACKEND) as s:
+            result = await self.dispatch(request)
+            s.attributes.update(
+                round_trips=self.stats.round_trips,
+                bytes_sent=self.stats.bytes_sent,
+                bytes_received=self.stats.bytes_received,
+            )
+        logger.info(f"edit_manager[{self.BACKEND}] {request.command}: {self.stats}")
+        return result
+
     def _make_output(self, body: str, fname: str, start: int = 1):
         res = ToolResult(output=make_output(body, fname, start))
         logger.info(f"edit_manager: {res}")
@@ -125,9 +190,8 @@ class EditSessionManager:
     async def view(self, request: ViewRequest):
         f = await self._validate_request(request)
         if f.is_dir():
-            res = await self.sandbox.run_command.local(
-                "find", str(f.local_path), "-maxdepth", "2", "-not", "-path", r"'*/\.*'"
-            )
+            res = await self.sandbox.view_dir.remote.aio(f.path)
+            self.stats.record(received=len(res.output or ""))
             if res.output:
                 return (
                     ToolResult(
@@ -138,11 +202,11 @@ class EditSessionManager:
             else:
                 return res
 
-        lines = (await f.read()).splitlines(keepends=True)
+        lines = (await f.read()).split("\n")
         (start, end) = request.view_range or (1, -1)
         start, end = (
             max(1, start),
-            min(len(lines) + 1, len(lines) + 1 if end == -1 else end),
+            min(len(lines), len(lines) if end == -1 else end),
         )
         return self._make_output(
             body="\n".join(lines[start - 1 : end]),
@@ -222,7 +286,7 @@ class EditSessionManager:
             + request.new_str.splitlines(keepends=True)
             + lines[request.insert_line :]
         )
-        await f.write("\n".join(lines))
+        await f.write("".join(lines))
 
         return (
             ToolResult(output=f"The file {f} has been edited. ")
@@ -243,3 +307,121 @@ class EditSessionManager:
         return ToolResult(
             output=f"Last edit to {f} undone successfully."
         ) + self._make_output(old_content, str(f))
+
+
+@dataclass(kw_only=True, frozen=True)
+class AgentEditSessionManager(EditSessionManager):
+    """
+    Edit backend that forwards each command to the resident file agent inside
+    the sandbox, which works on the local filesystem and only returns snippets.
+    """
+
+    BACKEND: str = "agent"
+    # Undo history lives in the agent process, not in `EditSession`
+    KEEPS_HISTORY: bool = False
+
+    async def _call(self, request: TRequest, **kwargs) -> dict:
+        payload = {
+            "command": request.command,
+            "path": request.path.as_posix(),
+            **kwargs,
+        }
+        res = await self.sandbox.call_file_agent.remote.aio(payload)
+        self.stats.record(sent=len(json.dumps(payload)), received=len(json.dumps(res)))
+        if state := res.get("invalid"):
+            self._check_request(request, **state)
+        return res
+
+    @singledispatchmethod
+    async def dispatch(self, request: TRequest) -> ToolResult:
+        raise ToolError(f"Action {request.command} not supported")
+
+    @dispatch.register
+    async def view(self, request: ViewRequest):
+        res = await self._call(request, view_range=request.view_range)
+        self._check_request(request, exists=True, is_dir=res["is_dir"])
+        if res["is_dir"]:
+            output = "\n".join(res["entries"])
+            if res["truncated"]:
+                output += f"\n<truncated after {len(res['entries'])} entries>"
+            return ToolResult(
+                output=f"Here's the files and directories up to 2 levels deep in {request.path}, excluding hidden items"
+            ) + ToolResult(output=output)
+        return self._make_output(
+            body=res["content"], fname=str(request.path), start=res["start"]
+        )
+
+    @dispatch.register(CreateRequest)
+    async def create(self, request: CreateRequest):
+        await self._call(request, file_text=request.file_text)
+        return ToolResult(output=f"File created successfully at: {request.path}")
+
+    @dispatch.register(StrReplaceRequest)
+    async def str_replace(self, request: StrReplaceRequest):
+        import fuzzysearch
+
+        length = self.SNIPPET_LINES + len(request.new_str.splitlines())
+        res = await self._call(
+            request, old_str=request.old_str, new_str=request.new_str, length=length
+        )
+        if res.get("occurrences") == 0:
+            # Only fall back to shipping the whole file when the exact match fails
+            content = (await self._call(request, command="read"))["content"]
+            if matches := fuzzysearch.find_near_matches(
+                request.old_str, content, max_l_dist=3
+            ):
+                request.old_str = matches[0].matched
+                res = await self._call(
+                    request,
+                    old_str=request.old_str,
+                    new_str=request.new_str,
+                    length=length,
+                )
+
+        if (occurrences := res.get("occurrences")) == 0:
+            raise ToolError(
+                f"No replacement was performed, old_str `{request.old_str}` did not appear verbatim in {request.path}."
+            )
+        elif occurrences:
+            raise ToolError(
+                f"No replacement was performed. Multiple occurrences of old_str `{request.old_str}` in lines {res['lines']}. Please ensure it is unique."
+            )
+
+        return (
+            ToolResult(output=f"The file {request.path} has been edited. ")
+            + self._make_output(
+                res["snippet"], f"a snippet of {request.path}", res["start"]
+            )
+            + ToolResult(
+                output="Review the changes and make sure they are as expected. Edit the file again if necessary."
+            )
+        )
+
+    @dispatch.register(InsertRequest)
+    async def insert(self, request: InsertRequest):
+        res = await self._call(
+            request,
+            insert_line=request.insert_line,
+            new_str=request.new_str,
+            length=self.SNIPPET_LINES + len(request.new_str.splitlines()),
+        )
+        if (line_count := res.get("line_count")) is not None:
+            raise ToolError(
+                f"Invalid `insert_line` parameter: {request.insert_line}. It should be within the range of lines of the file: {[0, line_count]}"
+            )
+        return (
+            ToolResult(output=f"The file {request.path} has been edited. ")
+            + self._make_output(
+                res["snippet"], f"a snippet of {request.path}", res["start"]
+            )
+            + ToolResult(
+                output="Review the changes and make sure they are as expected (correct indentation, no duplicate lines, etc). Edit the file again if necessary."
+            )
+        )
+
+    @dispatch.register(UndoEditRequest)
+    async def undo_edit(self, request: UndoEditRequest):
+        res = await self._call(request)
+        return ToolResult(
+            output=f"Last edit to {request.path} undone successfully."
+        ) + self._make_output(res["content"], str(request.path))
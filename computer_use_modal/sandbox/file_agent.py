@@ -0,0 +1,71 @@
+import asyncio
+import itertools
+import json
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator
+
+from modal import Sandbox
+from modal.container_process import ContainerProcess
+
+from computer_use_modal.sandbox.slots import Slot
+from computer_use_modal.tools.base import ToolError
+
+logger = logging.getLogger(__name__)
+
+SCRIPT = Path(__file__).with_name("file_agent_script.py")
+
+
+@dataclass(kw_only=True)
+class FileAgent:
+    """Client for the resident `file_agent_script` process inside the sandbox."""
+
+    sandbox: Sandbox
+    slot: Slot = Slot()
+    proc: ContainerProcess | None = None
+
+    _stdout: AsyncIterator[str] | None = None
+    _buffer: str = ""
+    _ids: itertools.count = field(default_factory=itertools.count)
+    _lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    async def start(self):
+        logger.info("starting file agent")
+        self.proc = await self.sandbox.exec.aio(
+            *self.slot.command(
+                "python3", "-u", "-c", SCRIPT.read_text(), self.slot.mount
+            )
+        )
+        self._stdout = aiter(self.proc.stdout)
+        self._buffer = ""
+
+    async def _readline(self) -> str:
+        assert self._stdout is not None
+        while "\n" not in self._buffer:
+            self._buffer += await anext(self._stdout)
+        line, self._buffer = self._buffer.split("\n", 1)
+        return line
+
+    async def call(self, request: dict[str, Any]) -> dict[str, Any]:
+        async with self._lock:
+            if self.proc is None:
+                await self.start()
+            assert self.proc is not None
+            self.proc.stdin.write(json.dumps({"id": next(self._ids), **request}) + "\n")
+            await self.proc.stdin.drain.aio()
+            try:
+                response = json.loads(await self._readline())
+            except StopAsyncIteration:
+                self.proc = None
+                raise ToolError("file agent exited unexpectedly, please retry")
+        if error := response.get("error"):
+            raise ToolError(error)
+        return response
+
+    async def kill(self):
+        if self.proc is None:
+            return
+        self.proc.stdin.write_eof()
+        await self.proc.stdin.drain.aio()
+        self.proc = None
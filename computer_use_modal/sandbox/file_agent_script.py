@@ -0,0 +1,116 @@
+"""
+Resident helper that runs inside the sandbox (stdlib only).
+
+Reads one JSON request per line on stdin and writes one JSON response per line
+on stdout. Operates directly on the sandbox filesystem, so it sees writes made
+by bash immediately and can touch paths outside the NFS mount.
+"""
+
+import json
+import os
+import sys
+from collections import defaultdict
+
+ROOT = sys.argv[1] if len(sys.argv) > 1 else "/"
+HISTORY: dict[str, list[str]] = defaultdict(list)
+MAX_ENTRIES = 500
+PRUNE = {"node_modules", "__pycache__", "venv"}
+
+
+def resolve(path):
+    return os.path.normpath(os.path.join(ROOT, path))
+
+
+def read(path):
+    with open(path) as f:
+        return f.read().expandtabs()
+
+
+def write(path, content):
+    if os.path.exists(path):
+        HISTORY[path].append(read(path))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content.expandtabs())
+
+
+def snippet(content, center, length):
+    start = max(0, center - length)
+    return {
+        "snippet": "\n".join(content.split("\n")[start : center + length + 1]),
+        "start": start + 1,
+    }
+
+
+def listing(path, depth=2):
+    out = [path]
+    for dirpath, dirnames, filenames in os.walk(path):
+        level = dirpath[len(path) :].count(os.sep)
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in dirnames + sorted(f for f in filenames if not f.startswith(".")):
+            out.append(os.path.join(dirpath, name))
+            if len(out) >= MAX_ENTRIES:
+                return out, True
+        if level + 1 >= depth:
+            dirnames[:] = []
+        else:
+            dirnames[:] = [d for d in dirnames if d not in PRUNE]
+    return out, False
+
+
+def handle(req):
+    path = resolve(req["path"])
+    exists, is_dir = os.path.exists(path), os.path.isdir(path)
+    command = req["command"]
+    state = {"exists": exists, "is_dir": is_dir}
+    if (command != "create") != exists or (command != "view" and is_dir):
+        return {"invalid": state}
+    if command == "view":
+        if is_dir:
+            entries, truncated = listing(path)
+            return {"entries": entries, "truncated": truncated, **state}
+        lines = read(path).split("\n")
+        start, end = req.get("view_range") or (1, -1)
+        start, end = max(1, start), min(len(lines), len(lines) if end == -1 else end)
+        return {"content": "\n".join(lines[start - 1 : end]), "start": start, **state}
+    if command == "read":
+        return {"content": read(path)}
+    if command == "create":
+        write(path, req["file_text"])
+        return {}
+    if command == "str_replace":
+        content, old = read(path), req["old_str"]
+        if (occurrences := content.count(old)) != 1:
+            lines = [i + 1 for i, line in enumerate(content.split("\n")) if old in line]
+            return {"occurrences": occurrences, "lines": lines}
+        write(path, new := content.replace(old, req["new_str"]))
+        return snippet(new, content.split(old)[0].count("\n"), req["length"])
+    if command == "insert":
+        lines = read(path).splitlines(keepends=True)
+        if not 0 <= (line := req["insert_line"]) <= len(lines):
+            return {"line_count": len(lines)}
+        lines = lines[:line] + req["new_str"].splitlines(keepends=True) + lines[line:]
+        write(path, "".join(lines))
+        return snippet(read(path), line, req["length"])
+    if command == "undo_edit":
+        if not HISTORY[path]:
+            return {"error": f"No edit history found for {req['path']}."}
+        with open(path, "w") as f:
+            f.write(content := HISTORY[path].pop())
+        return {"content": content}
+    return {"error": f"Action {command} not supported"}
+
+
+def main():
+    for line in sys.stdin:
+        req = json.loads(line)
+        try:
+            res = handle(req)
+        except Exception as e:
+            res = {"error": f"{type(e).__name__}: {e}"}
+        sys.stdout.write(json.dumps({"id": req.get("id"), **res}) + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
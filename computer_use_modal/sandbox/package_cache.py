@@ -0,0 +1,116 @@
+"""
+A package download cache shared by every sandbox.
+
+Sandboxes mount the `CACHE_NFS` network file system at `CACHE_PATH`, and run
+`package_proxy_script` on the port in `PACKAGE_PROXY`. The sandbox image
+points apt (`Acquire::http::Proxy`), pip (`index-url`) and npm (`registry`)
+at it, so a .deb, wheel or tarball any sandbox has downloaded before is
+served from the NFS instead of the internet. The cache is bounded by
+`MAX_BYTES` and evicts the least recently used packages.
+
+The manager waits for the proxy before handing out the sandbox, checks on it
+every `CHECK_INTERVAL` seconds and restarts it if it stops answering. If it
+can't be brought up `MAX_RESTARTS` times in a row, apt, pip and npm are
+pointed back at the internet (`bypass_command`), so installs still work.
+
+Each proxy keeps hit and miss counters on the NFS; `cache_report` adds them
+up across every sandbox that has used the cache.
+"""
+
+import json
+from pathlib import Path
+from typing import Any
+
+from grpclib import GRPCError
+
+from computer_use_modal import backend
+from computer_use_modal.app import CACHE_PATH, PACKAGE_PROXY
+
+SCRIPT = Path(__file__).with_name("package_proxy_script.py")
+
+CACHE_NFS = "anthropic-computer-use-package-cache"
+MAX_BYTES = 50 * 1024**3
+# What the image writes to route apt, pip and npm through the proxy
+CONFIG_FILES = (
+    "/etc/apt/apt.conf.d/01package-cache",
+    "/etc/pip.conf",
+    "/usr/etc/npmrc",
+    "/usr/local/etc/npmrc",
+)
+START_TIMEOUT = 10
+CHECK_INTERVAL = 15
+MAX_RESTARTS = 3
+
+
+def proxy_command() -> tuple[str, ...]:
+    """Starts the proxy, unless the sandbox already runs one."""
+    return (
+        "sh",
+        "-c",
+        'curl -sf "$0/_stats" >/dev/null || exec python3 -u -c "$@"',
+        PACKAGE_PROXY,
+        SCRIPT.read_text(),
+        CACHE_PATH,
+        str(MAX_BYTES),
+        PACKAGE_PROXY.rsplit(":", 1)[1],
+    )
+
+
+def stats_command() -> tuple[str, ...]:
+    return ("curl", "-sf", "-m", "5", f"{PACKAGE_PROXY}/_stats")
+
+
+def wait_command(timeout: float = START_TIMEOUT) -> tuple[str, ...]:
+    """Succeeds once the proxy answers, fails after `timeout` seconds."""
+    return (
+        "sh",
+        "-c",
+        'for _ in $(seq "$1"); do curl -sf "$0/_stats" >/dev/null && exit 0; '
+        "sleep 0.1; done; exit 1",
+        PACKAGE_PROXY,
+        str(int(timeout * 10)),
+    )
+
+
+def bypass_command() -> tuple[str, ...]:
+    """Drop the lines that point at the proxy from `CONFIG_FILES`."""
+    return (
+        "sh",
+        "-c",
+        'for f in "$@"; do [ -f "$f" ] && sed -i "\\|$0|d" "$f"; done; true',
+        PACKAGE_PROXY,
+        *CONFIG_FILES,
+    )
+
+
+def summarize(stats: list[dict[str, int]]) -> dict[str, Any]:
+    totals = {
+        key: sum(s.get(key, 0) for s in stats)
+        for key in ("hits", "misses", "hit_bytes", "miss_bytes", "passed")
+    }
+    requests = totals["hits"] + totals["misses"]
+    return {
+        **totals,
+        "hit_ratio": totals["hits"] / requests if requests else 0.0,
+        "bytes_saved": totals["hit_bytes"],
+    }
+
+
+async def cache_report() -> dict[str, Any]:
+    """Hits, misses and bytes saved, over every proxy that has used the cache."""
+
+    nfs = await backend.current().network_file_system(CACHE_NFS)
+    try:
+        entries = await nfs.listdir.aio("stats")
+    except GRPCError:
+        entries = []
+    stats = []
+    for entry in entries:
+        if not entry.path.endswith(".json"):
+            continue
+        try:
+            data = b"".join([chunk async for chunk in nfs.read_file.aio(entry.path)])
+            stats.append(json.loads(data))
+        except (GRPCError, ValueError):
+            continue
+    return {"proxies": len(stats), **summarize(stats)}
@@ -0,0 +1,273 @@
+"""
+Caching proxy for package downloads, run inside the sandbox (stdlib only).
+
+    python3 -c ... <store> <max_bytes> <port>
+
+apt reaches it as its HTTP proxy, pip as its index (`/pypi/`) and npm as its
+registry (`/npm/`); see `package_cache`. Indexes and metadata pass through.
+Package files never change once published, so they are kept in `<store>`,
+which every sandbox shares: `objects/<sha256 of the content>`, and
+`urls/<sha256 of the url>` naming the object for each URL. A URL file's
+mtime is its last use, and once the store is over `max_bytes` the least
+recently used are evicted.
+
+A package that is not cached yet is streamed to the client while it is
+written to the store, so a large download doesn't stall the client until it
+is complete. Counters are served on `/_stats` and written to `<store>/stats/`
+every `FLUSH_EVERY` seconds for `package_cache.cache_report`. Exits quietly if
+the port is taken, i.e. the sandbox already runs a proxy.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STORE, MAX_BYTES, PORT = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+SELF = f"http://127.0.0.1:{PORT}"
+# Path prefix -> upstream, and the upstream URLs to point back at the proxy in
+# what it returns
+UPSTREAMS = {
+    "/pypi/": "https://pypi.org/",
+    "/pyfiles/": "https://files.pythonhosted.org/",
+    "/npm/": "https://registry.npmjs.org/",
+}
+REWRITES = {
+    b"https://files.pythonhosted.org/": f"{SELF}/pyfiles/".encode(),
+    b"https://registry.npmjs.org/": f"{SELF}/npm/".encode(),
+}
+PACKAGES = (".deb", ".udeb", ".whl", ".metadata", ".tar.gz", ".tgz", ".zip")
+HEADERS = ("Accept", "User-Agent", "If-Modified-Since", "If-None-Match", "Range")
+CHUNK = 1 << 20
+EVICT_EVERY = 60
+FLUSH_EVERY = 10
+
+STATS = {"hits": 0, "misses": 0, "hit_bytes": 0, "miss_bytes": 0, "passed": 0}
+STATS_PATH = os.path.join(STORE, "stats", f"{uuid.uuid4().hex}.json")
+LOCK = threading.Lock()
+last_evicted = 0.0
+
+
+def count(**deltas):
+    with LOCK:
+        for key, delta in deltas.items():
+            STATS[key] += delta
+
+
+def flush():
+    with LOCK:
+        stats = dict(STATS)
+    with open(f"{STATS_PATH}.tmp", "w") as f:
+        json.dump(stats, f)
+    os.replace(f"{STATS_PATH}.tmp", STATS_PATH)
+
+
+def flush_every(interval):
+    flushed = None
+    while True:
+        time.sleep(interval)
+        if STATS != flushed:
+            try:
+                flush()
+                flushed = dict(STATS)
+            except OSError:
+                pass
+
+
+def sha256(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def object_path(digest):
+    return os.path.join(STORE, "objects", digest[:2], digest)
+
+
+def url_path(url):
+    return os.path.join(STORE, "urls", sha256(url))
+
+
+def evict():
+    """Drop the least recently used URLs, and objects no URL names, until under `MAX_BYTES`."""
+
+    urls = []
+    for name in os.listdir(os.path.join(STORE, "urls")):
+        path = os.path.join(STORE, "urls", name)
+        try:
+            with open(path) as f:
+                urls.append((os.stat(path).st_mtime, path, json.load(f)))
+        except (OSError, ValueError):
+            continue
+    sizes = {entry["sha256"]: entry["size"] for _, _, entry in urls}
+    total = sum(sizes.values())
+    refs = {}
+    for _, _, entry in urls:
+        refs[entry["sha256"]] = refs.get(entry["sha256"], 0) + 1
+    for _, path, entry in sorted(urls, key=lambda u: u[0]):
+        if total <= MAX_BYTES:
+            break
+        os.remove(path)
+        refs[digest := entry["sha256"]] -= 1
+        if not refs[digest]:
+            total -= sizes[digest]
+            try:
+                os.remove(object_path(digest))
+            except FileNotFoundError:
+                pass
+
+
+def maybe_evict():
+    global last_evicted
+    with LOCK:
+        if time.time() - last_evicted < EVICT_EVERY:
+            return
+        last_evicted = time.time()
+    threading.Thread(target=evict, daemon=True).start()
+
+
+def upstream(path):
+    if path.startswith("http://"):
+        # apt, through `Acquire::http::Proxy`
+        return path
+    for prefix, base in UPSTREAMS.items():
+        if path.startswith(prefix):
+            return base + path[len(prefix) :]
+    return None
+
+
+def cacheable(path, url):
+    return url.split("?")[0].endswith(PACKAGES) and not path.startswith("/pypi/")
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, headers, body=None, length=None):
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body) if length is None else length))
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+        if isinstance(body, bytes):
+            self.wfile.write(body)
+        elif body is not None:
+            shutil.copyfileobj(body, self.wfile, CHUNK)
+
+    def fetch(self, url):
+        headers = {k: v for k in HEADERS if (v := self.headers.get(k))}
+        request = urllib.request.Request(url, headers=headers, method=self.command)
+        try:
+            return urllib.request.urlopen(request, timeout=60)
+        except urllib.error.HTTPError as e:
+            return e
+
+    def do_GET(self):
+        if self.path == "/_stats":
+            return self.reply(200, {}, json.dumps(STATS).encode())
+        if (url := upstream(self.path)) is None:
+            return self.reply(404, {}, b"")
+        try:
+            if self.command == "GET" and cacheable(self.path, url):
+                return self.package(url)
+            return self.forward(url)
+        except (OSError, urllib.error.URLError) as e:
+            return self.reply(502, {}, str(e).encode())
+
+    do_HEAD = do_GET
+
+    def forward(self, url):
+        with self.fetch(url) as response:
+            body = response.read()
+            headers = {
+                k: v
+                for k in ("Content-Type", "Last-Modified", "ETag", "Content-Range")
+                if (v := response.headers.get(k))
+            }
+            status = response.status
+        if not self.path.startswith("http://"):
+            for old, new in REWRITES.items():
+                body = body.replace(old, new)
+        count(passed=1)
+        self.reply(status, headers, body)
+
+    def package(self, url):
+        try:
+            with open(url_path(url)) as f:
+                entry = json.load(f)
+            cached = open(object_path(entry["sha256"]), "rb")
+        except (OSError, ValueError):
+            cached = None
+        if cached is not None:
+            os.utime(url_path(url))
+            count(hits=1, hit_bytes=entry["size"])
+            with cached:
+                return self.reply(200, {}, cached, length=entry["size"])
+
+        with self.fetch(url) as response:
+            if response.status != 200:
+                return self.reply(response.status, {}, response.read())
+            length = response.headers.get("Content-Length")
+            self.send_response(200)
+            if length is not None:
+                self.send_header("Content-Length", length)
+            else:
+                # The end of the body is the end of the connection
+                self.send_header("Connection", "close")
+                self.close_connection = True
+            self.end_headers()
+            tmp = os.path.join(STORE, "tmp", uuid.uuid4().hex)
+            digest, size, client = hashlib.sha256(), 0, True
+            try:
+                with open(tmp, "wb") as f:
+                    while chunk := response.read1(CHUNK):
+                        digest.update(chunk)
+                        f.write(chunk)
+                        size += len(chunk)
+                        if client:
+                            # Keep caching if the client goes away
+                            try:
+                                self.wfile.write(chunk)
+                            except OSError:
+                                client = False
+            except (OSError, urllib.error.URLError):
+                # Too late for an error response: cut the client off instead
+                self.close_connection = True
+                size = -1
+            if size < 0 or (length is not None and size != int(length)):
+                self.close_connection = True
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                return
+        os.makedirs(
+            os.path.dirname(target := object_path(digest.hexdigest())), exist_ok=True
+        )
+        os.replace(tmp, target)
+        entry = {"url": url, "sha256": digest.hexdigest(), "size": size}
+        with open(tmp, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, url_path(url))
+        count(misses=1, miss_bytes=size)
+        maybe_evict()
+
+
+if __name__ == "__main__":
+    for name in ("objects", "urls", "stats", "tmp"):
+        os.makedirs(os.path.join(STORE, name), exist_ok=True)
+    try:
+        server = ThreadingHTTPServer(("127.0.0.1", PORT), Handler)
+    except OSError:
+        sys.exit(0)
+    flush()
+    threading.Thread(target=flush_every, args=(FLUSH_EVERY,), daemon=True).start()
+    server.serve_forever()
@@ -0,0 +1,247 @@
+"""
+Packing several agents into one sandbox.
+
+A sandbox is sized for the busiest moments of one agent (8 CPUs, 8GiB and a
+T4), but spends most of a session idle while the model thinks. A
+`SandboxManager` with `slots > 1` asks `Placement` for a slot on a shared
+sandbox instead of creating its own. Each slot has its own X display, its own
+unprivileged user and home directory, and a directory of the sandbox's NFS
+that only that user can read (see `slots.Slot`).
+
+Placement is sticky: a request_id keeps its slot until its manager exits, and
+goes back to the same sandbox afterwards, since its NFS holds the agent's
+files; only a full or overloaded sandbox sends it elsewhere, to start over
+with an empty directory. Managers report screenshot latency and CPU steal for
+their sandbox, and one over `max_screenshot_p95` or `max_steal` takes no new
+agents until it drains.
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Any
+
+import modal
+from modal import NetworkFileSystem, Sandbox
+
+from computer_use_modal import backend
+from computer_use_modal.app import CACHE_PATH, MOUNT_PATH, app, image, sandbox_image
+from computer_use_modal.sandbox.package_cache import CACHE_NFS
+from computer_use_modal.sandbox.profiles import (
+    DEFAULT_PROFILE,
+    PROFILES,
+    ResourceProfile,
+)
+from computer_use_modal.server.model_client import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+PLACEMENTS = backend.named_dict("sandbox-placements")
+
+
+async def open_sandbox(
+    name: str,
+    profile: ResourceProfile = PROFILES[DEFAULT_PROFILE],
+    headless: bool = False,
+) -> tuple[NetworkFileSystem, Sandbox]:
+    """The sandbox called `name` and its NFS, created if they do not exist yet."""
+
+    nfs = await backend.current().network_file_system(f"anthropic-computer-use-{name}")
+    cache = await backend.current().network_file_system(CACHE_NFS)
+    sandbox = await backend.current().sandbox(
+        name,
+        headless=headless,
+        image=sandbox_image,
+        **profile.options(),
+        network_file_systems={MOUNT_PATH: nfs, CACHE_PATH: cache},
+        timeout=60 * 60,
+        encrypted_ports=[8501, 6080],
+    )
+    return nfs, sandbox
+
+
+@dataclass(kw_only=True)
+class Host:
+    name: str
+    # Slot index -> request_id
+    agents: dict[int, str] = field(default_factory=dict)
+    screenshots: LatencyHistogram = field(default_factory=LatencyHistogram)
+    steal: float = 0.0
+
+
+@dataclass(kw_only=True)
+class PlacementScheduler:
+    slots: int
+    profile: str = DEFAULT_PROFILE
+    max_screenshot_p95: float = 2.0
+    max_steal: float = 0.1
+
+    hosts: dict[str, Host] = field(default_factory=dict)
+    # request_id -> the sandbox holding its files
+    homes: dict[str, str] = field(default_factory=dict)
+    peak_agents: int = 0
+
+    def overloaded(self, host: Host) -> bool:
+        p95 = host.screenshots.quantile(0.95) or 0.0
+        return p95 > self.max_screenshot_p95 or host.steal > self.max_steal
+
+    def _new_host(self, preferred: str | None) -> Host:
+        if preferred is None or preferred in self.hosts:
+            preferred = next(
+                name
+                for n in count()
+                if (name := f"{self.profile}-x{self.slots}-{n}") not in self.hosts
+            )
+        self.hosts[preferred] = host = Host(name=preferred)
+        return host
+
+    def place(self, request_id: str) -> tuple[str, int]:
+        for host in self.hosts.values():
+            for index, placed in host.agents.items():
+                if placed == request_id:
+                    return host.name, index
+
+        home = self.homes.get(request_id)
+        open_hosts = [
+            h
+            for h in self.hosts.values()
+            if len(h.agents) < self.slots and not self.overloaded(h)
+        ]
+        if home is not None and home not in self.hosts:
+            # Its files are on that sandbox's NFS, so bring it back
+            host = self._new_host(home)
+        elif home in self.hosts and self.hosts[home] in open_hosts:
+            host = self.hosts[home]
+        elif open_hosts:
+            # Fill the fullest sandbox first, so the others can drain and stop
+            host = max(open_hosts, key=lambda h: len(h.agents))
+        else:
+            host = self._new_host(home)
+
+        index = next(i for i in range(self.slots) if i not in host.agents)
+        host.agents[index] = request_id
+        self.homes[request_id] = host.name
+        self.peak_agents = max(self.peak_agents, self.agents)
+        return host.name, index
+
+    def release(self, request_id: str) -> str | None:
+        """Free `request_id`'s slot; returns its sandbox if that is now empty."""
+
+        for host in list(self.hosts.values()):
+            for index, placed in list(host.agents.items()):
+                if placed != request_id:
+                    continue
+                del host.agents[index]
+                if not host.agents:
+                    del self.hosts[host.name]
+                    return host.name
+                return None
+        return None
+
+    def observe(self, name: str, screenshot: float, steal: float | None = None):
+        if (host := self.hosts.get(name)) is None:
+            return
+        host.screenshots.observe(screenshot)
+        if steal is not None:
+            host.steal = steal
+
+    @property
+    def agents(self) -> int:
+        return sum(len(h.agents) for h in self.hosts.values())
+
+    def report(self) -> dict:
+        return {
+            "sandboxes": len(self.hosts),
+            "agents": self.agents,
+            "density": self.agents / len(self.hosts) if self.hosts else 0.0,
+            "peak_agents": self.peak_agents,
+            "hosts": {
+                h.name: {
+                    "agents": len(h.agents),
+                    "screenshot": h.screenshots.summary(),
+                    "steal": round(h.steal, 4),
+                    "overloaded": self.overloaded(h),
+                }
+                for h in self.hosts.values()
+            },
+        }
+
+    def state(self) -> dict[str, Any]:
+        return {
+            "hosts": {h.name: h.agents for h in self.hosts.values()},
+            "homes": self.homes,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any], **kwargs) -> "PlacementScheduler":
+        return cls(
+            hosts={
+                name: Host(name=name, agents=agents)
+                for name, agents in state.get("hosts", {}).items()
+            },
+            homes=state.get("homes", {}),
+            **kwargs,
+        )
+
+
+@app.cls(
+    image=image,
+    concurrency_limit=1,
+    allow_concurrent_inputs=1000,
+    timeout=60 * 60,
+    container_idle_timeout=60 * 20,
+)
+class Placement:
+    """The one placement table shared by every `SandboxManager` with the same `slots` and `profile`."""
+
+    slots: int = modal.parameter(default=4)
+    profile: str = modal.parameter(default=DEFAULT_PROFILE)
+
+    @modal.enter()
+    async def init(self):
+        logging.basicConfig(level=logging.INFO)
+
+        self.scheduler = PlacementScheduler.from_state(
+            await PLACEMENTS.get.aio((self.slots, self.profile), {}),
+            slots=self.slots,
+            profile=self.profile,
+        )
+        # Sandboxes are created and terminated under their lock, so managers
+        # racing for a new one share it and a name is never reused while live
+        self.locks: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def _save(self):
+        await PLACEMENTS.put.aio((self.slots, self.profile), self.scheduler.state())
+
+    @modal.method()
+    async def place(self, request_id: str) -> tuple[str, int]:
+        host, index = self.scheduler.place(request_id)
+        await self._save()
+        async with self.locks[host]:
+            # Slots bring up desktops of their own, the image's is not needed
+            await open_sandbox(host, PROFILES[self.profile], headless=True)
+        logger.info(f"Placed {request_id} in slot {index} of {host}")
+        return host, index
+
+    @modal.method()
+    async def release(self, request_id: str):
+        host = self.scheduler.release(request_id)
+        await self._save()
+        if host is None:
+            return
+        async with self.locks[host]:
+            if host in self.scheduler.hosts:
+                return
+            _, sandbox = await open_sandbox(host, PROFILES[self.profile], headless=True)
+            await sandbox.terminate.aio()
+        logger.info(f"Terminated {host}, its last agent left")
+
+    @modal.method()
+    async def observe(self, host: str, screenshot: float, steal: float | None = None):
+        self.scheduler.observe(host, screenshot, steal)
+
+    @modal.method()
+    async def report(self) -> dict:
+        return self.scheduler.report()
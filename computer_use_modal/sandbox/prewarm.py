@@ -0,0 +1,98 @@
+"""
+Applications started on the sandbox's desktop before the agent needs them.
+
+A request passes `prewarm=` to `messages_create`: the name of one of
+`PREWARM_PROFILES`, or a dict such as
+
+    {
+        "apps": [
+            {
+                "name": "gedit",
+                "command": ["gedit"],
+                "ready": "xdotool search --onlyvisible --class gedit",
+            }
+        ],
+        "urls": ["https://example.com"],
+    }
+
+The server asks the manager to warm up as soon as it has one, so this runs
+while the sandbox and its desktop are still coming up and the model works on
+its first response. `urls` open in Firefox, which is added to `apps` if it is
+not there. The first computer action waits for the apps to be ready, so the
+first screenshot shows them.
+"""
+
+import shlex
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass(kw_only=True, frozen=True)
+class WarmApp:
+    name: str
+    command: tuple[str, ...]
+    # A shell check that succeeds once the app is usable
+    ready: str
+    timeout: float = 30
+    # Append the profile's URLs to `command`
+    takes_urls: bool = False
+
+    def launch(self, urls: tuple[str, ...] = (), debug_port: int = 0) -> str:
+        """`{debug_port}` in `command` becomes the slot's browser debugging port."""
+        argv = (*self.command, *urls) if self.takes_urls else self.command
+        argv = tuple(arg.replace("{debug_port}", str(debug_port)) for arg in argv)
+        return f"{shlex.join(argv)} >/dev/null 2>&1 &"
+
+    def wait(self, interval: float = 0.2) -> str:
+        """Polls `ready` inside the sandbox; prints "ready" once it succeeds."""
+        tries = max(1, int(self.timeout / interval))
+        return (
+            f"for _ in $(seq {tries}); do "
+            f"({self.ready}) >/dev/null 2>&1 && echo ready && exit 0; "
+            f"sleep {interval}; done; exit 1"
+        )
+
+
+FIREFOX = WarmApp(
+    name="firefox",
+    command=("firefox-esr", "--remote-debugging-port", "{debug_port}", "-new-window"),
+    ready="xdotool search --onlyvisible --class firefox",
+    takes_urls=True,
+)
+
+
+@dataclass(kw_only=True, frozen=True)
+class PrewarmProfile:
+    apps: tuple[WarmApp, ...] = ()
+    urls: tuple[str, ...] = ()
+
+    @property
+    def launches(self) -> tuple[WarmApp, ...]:
+        if self.urls and not any(app.takes_urls for app in self.apps):
+            return (*self.apps, FIREFOX)
+        return self.apps
+
+    @classmethod
+    def parse(cls, value: "str | dict[str, Any] | PrewarmProfile") -> "PrewarmProfile":
+        if isinstance(value, PrewarmProfile):
+            return value
+        if isinstance(value, str):
+            try:
+                return PREWARM_PROFILES[value]
+            except KeyError:
+                raise ValueError(
+                    f"Unknown prewarm profile {value!r}, expected one of "
+                    f"{', '.join(PREWARM_PROFILES)}"
+                )
+        return cls(
+            apps=tuple(
+                WarmApp(**{**app, "command": tuple(app["command"])})
+                for app in value.get("apps", ())
+            ),
+            urls=tuple(value.get("urls", ())),
+        )
+
+
+PREWARM_PROFILES = {
+    "browser": PrewarmProfile(apps=(FIREFOX,)),
+}
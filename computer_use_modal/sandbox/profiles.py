@@ -0,0 +1,240 @@
+"""
+Named sandbox sizes, what a session actually used, and which size to pick.
+
+A `SandboxManager` samples CPU, memory and GPU utilization inside its sandbox
+every `SAMPLE_INTERVAL` seconds, alongside the latency of its screenshots and
+commands. The server adds each turn's summary to the history of its
+`workload` (a label chosen by the caller, e.g. "browse" or "code"), and
+`recommend` reads that history back: the smallest profile whose recent turns
+met `LatencyTargets` without saturating it, or failing that, the smallest
+untried one that the peak usage seen so far would fit with headroom.
+
+Requests pass `profile="auto"` to use the recommendation. It is resolved once
+per request_id and then pinned, since a sandbox keeps the size it was created
+with.
+"""
+
+import logging
+import math
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any
+
+from computer_use_modal import backend
+from computer_use_modal.server.model_client import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+RESOURCE_HISTORY = backend.named_dict("resource-history")
+PROFILE_CHOICES = backend.named_dict("resource-profile-choices")
+
+SAMPLE_INTERVAL = 2
+# Turns kept per workload
+HISTORY_RUNS = 50
+# Recent turns a measured profile is judged on
+RECENT_RUNS = 3
+
+# One line of each: /proc/stat's cpu totals, MemTotal and MemAvailable, the
+# CPU count, and (when there is a GPU) its utilization and memory.
+SAMPLE = """
+head -n 1 /proc/stat
+grep -E '^(MemTotal|MemAvailable):' /proc/meminfo
+nproc
+nvidia-smi --query-gpu=utilization.gpu,memory.used --format=csv,noheader,nounits 2>/dev/null
+"""
+
+
+@dataclass(kw_only=True, frozen=True)
+class ResourceProfile:
+    name: str
+    cpu: float
+    # MiB
+    memory: int
+    gpu: str | None = None
+
+    def options(self) -> dict[str, Any]:
+        return {"cpu": self.cpu, "memory": self.memory, "gpu": self.gpu}
+
+
+# Smallest first
+PROFILES = {
+    p.name: p
+    for p in (
+        ResourceProfile(name="small", cpu=2, memory=2048),
+        ResourceProfile(name="medium", cpu=4, memory=4096),
+        ResourceProfile(name="large", cpu=8, memory=8192, gpu="T4"),
+        ResourceProfile(name="xlarge", cpu=16, memory=16384, gpu="T4"),
+    )
+}
+DEFAULT_PROFILE = "large"
+
+
+def get_profile(name: str) -> ResourceProfile:
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown resource profile {name!r}, expected one of {', '.join(PROFILES)}"
+        )
+
+
+def _mean(values: list[float]) -> float:
+    return sum(values) / len(values) if values else 0.0
+
+
+def _p95(values: list[float]) -> float:
+    if not values:
+        return 0.0
+    return sorted(values)[max(0, math.ceil(0.95 * len(values)) - 1)]
+
+
+@dataclass(kw_only=True)
+class ResourceMonitor:
+    """Utilization and latency samples for one sandbox, since the last `reset`."""
+
+    cpu: list[float] = field(default_factory=list)
+    memory: list[float] = field(default_factory=list)
+    gpu: list[float] = field(default_factory=list)
+    screenshots: LatencyHistogram = field(default_factory=LatencyHistogram)
+    commands: LatencyHistogram = field(default_factory=LatencyHistogram)
+    # CPU and memory over intervals with no command, screenshot or bash activity
+    idle_cpu: list[float] = field(default_factory=list)
+    idle_memory: list[float] = field(default_factory=list)
+    # Share of CPU time stolen by the host over the last interval
+    steal: float = 0.0
+    active_at: float = 0.0
+    _previous: tuple[int, int, int] | None = None
+    _sampled_at: float = 0.0
+
+    def touch(self):
+        self.active_at = time.monotonic()
+
+    def add(self, output: str):
+        """Add one run of `SAMPLE`."""
+
+        lines = output.splitlines()
+        if len(lines) < 4:
+            return
+        # cpu user nice system idle iowait irq softirq steal ...
+        ticks = [int(t) for t in lines[0].split()[1:9]]
+        mem = {line.split(":")[0]: int(line.split()[1]) for line in lines[1:3]}
+        cpus = int(lines[3])
+
+        now, was_idle = time.monotonic(), self.active_at < self._sampled_at
+        total, idle, stolen = sum(ticks), ticks[3] + ticks[4], ticks[7]
+        if self._previous and total > self._previous[0]:
+            elapsed = total - self._previous[0]
+            busy = elapsed - (idle - self._previous[1]) - (stolen - self._previous[2])
+            self.cpu.append(busy / elapsed * cpus)
+            self.steal = (stolen - self._previous[2]) / elapsed
+            if was_idle:
+                self.idle_cpu.append(self.cpu[-1])
+        self._previous, self._sampled_at = (total, idle, stolen), now
+        self.memory.append((mem["MemTotal"] - mem["MemAvailable"]) / 1024)
+        if was_idle:
+            self.idle_memory.append(self.memory[-1])
+        if len(lines) > 4 and lines[4].strip():
+            self.gpu.append(float(lines[4].split(",")[0]))
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "samples": len(self.memory),
+            "cpu_mean": _mean(self.cpu),
+            "cpu_p95": _p95(self.cpu),
+            "memory_peak": max(self.memory, default=0.0),
+            "gpu_peak": max(self.gpu, default=0.0),
+            "screenshot_p95": self.screenshots.quantile(0.95) or 0.0,
+            "command_p95": self.commands.quantile(0.95) or 0.0,
+            "idle_cpu_mean": _mean(self.idle_cpu),
+            "idle_memory_mean": _mean(self.idle_memory),
+        }
+
+    def reset(self):
+        self.cpu, self.memory, self.gpu = [], [], []
+        self.idle_cpu, self.idle_memory = [], []
+        self.screenshots, self.commands = LatencyHistogram(), LatencyHistogram()
+
+
+@dataclass(kw_only=True, frozen=True)
+class LatencyTargets:
+    screenshot_p95: float = 1.5
+    command_p95: float = 1.0
+    # Utilization above this share of a profile counts as thrashing
+    saturation: float = 0.9
+    # Peak usage must fit in this share of an untried profile
+    headroom: float = 0.7
+
+    def met(self, run: dict[str, Any]) -> bool:
+        profile = PROFILES[run["profile"]]
+        return (
+            run["screenshot_p95"] <= self.screenshot_p95
+            and run["command_p95"] <= self.command_p95
+            and run["cpu_p95"] <= profile.cpu * self.saturation
+            and run["memory_peak"] <= profile.memory * self.saturation
+        )
+
+    def fits(self, profile: ResourceProfile, runs: list[dict[str, Any]]) -> bool:
+        return (
+            max(r["cpu_p95"] for r in runs) <= profile.cpu * self.headroom
+            and max(r["memory_peak"] for r in runs) <= profile.memory * self.headroom
+            and (profile.gpu is not None or max(r["gpu_peak"] for r in runs) < 5)
+        )
+
+
+@dataclass(kw_only=True, frozen=True)
+class Recommendation:
+    profile: str
+    reason: str
+
+
+def recommend(
+    runs: list[dict[str, Any]], targets: LatencyTargets = LatencyTargets()
+) -> Recommendation:
+    runs = [r for r in runs if r["profile"] in PROFILES and r["samples"]]
+    if not runs:
+        return Recommendation(profile=DEFAULT_PROFILE, reason="no history")
+    by_profile: defaultdict[str, list[dict[str, Any]]] = defaultdict(list)
+    for run in runs:
+        by_profile[run["profile"]].append(run)
+
+    for profile in PROFILES.values():
+        if recent := by_profile[profile.name][-RECENT_RUNS:]:
+            if all(targets.met(r) for r in recent):
+                return Recommendation(
+                    profile=profile.name,
+                    reason=f"met latency targets in its last {len(recent)} turns",
+                )
+        elif targets.fits(profile, runs):
+            return Recommendation(
+                profile=profile.name,
+                reason=f"untried, peak usage over {len(runs)} turns fits with headroom",
+            )
+    return Recommendation(
+        profile=DEFAULT_PROFILE, reason="no profile met the latency targets"
+    )
+
+
+async def recommend_profile(workload: str) -> Recommendation:
+    return recommend(await RESOURCE_HISTORY.get.aio(workload, []))
+
+
+async def resolve_profile(request_id: str, profile: str, workload: str) -> str:
+    """`profile`, or for "auto" the recommendation, fixed on first use."""
+
+    if profile != "auto":
+        return get_profile(profile).name
+    if chosen := await PROFILE_CHOICES.get.aio(request_id):
+        return chosen
+    recommendation = await recommend_profile(workload)
+    logger.info(
+        f"Profile {recommendation.profile} for {request_id} ({workload}): "
+        f"{recommendation.reason}"
+    )
+    await PROFILE_CHOICES.put.aio(request_id, recommendation.profile)
+    return recommendation.profile
+
+
+async def record_run(workload: str, run: dict[str, Any]):
+    runs = await RESOURCE_HISTORY.get.aio(workload, [])
+    await RESOURCE_HISTORY.put.aio(workload, [*runs, run][-HISTORY_RUNS:])
@@ -1,21 +1,78 @@
 import asyncio
+import json
 import logging
+import time
 from io import BytesIO
 from pathlib import Path
-from typing import cast
+from typing import AsyncGenerator, cast
 
 import backoff
 import modal
 from grpclib import GRPCError
-from modal import NetworkFileSystem, Sandbox
 from modal.container_process import ContainerProcess
 
-from computer_use_modal.app import MOUNT_PATH, app, image, sandbox_image
+from computer_use_modal import backend, tracing
+from computer_use_modal.app import app, image
+from computer_use_modal.sandbox.accessibility import MAX_NODES, tree_command
 from computer_use_modal.sandbox.bash_manager import BashSession, BashSessionManager
+from computer_use_modal.sandbox.browser import browse_command
+from computer_use_modal.sandbox.checkpoints import (
+    CHECKPOINT_PATHS,
+    mark_epoch_command,
+    restore_command,
+    save_command,
+)
+from computer_use_modal.sandbox.dir_index import DirectoryIndex
+from computer_use_modal.sandbox.file_agent import FileAgent
+from computer_use_modal.sandbox.package_cache import (
+    CHECK_INTERVAL,
+    MAX_RESTARTS,
+    START_TIMEOUT,
+    bypass_command,
+    proxy_command,
+    stats_command,
+    summarize,
+    wait_command,
+)
+from computer_use_modal.sandbox.placement import Placement, open_sandbox
+from computer_use_modal.sandbox.prewarm import PrewarmProfile, WarmApp
+from computer_use_modal.sandbox.profiles import (
+    DEFAULT_PROFILE,
+    SAMPLE,
+    SAMPLE_INTERVAL,
+    ResourceMonitor,
+    get_profile,
+)
+from computer_use_modal.sandbox.slots import Slot
+from computer_use_modal.sandbox.streaming import CHUNK_SIZE, rechunk, slice_stream
+from computer_use_modal.sandbox.sync import (
+    Manifest,
+    PackedDir,
+    SyncFilter,
+    SyncPlan,
+    archive_path,
+)
 from computer_use_modal.tools.base import ToolResult
 
 logger = logging.getLogger(__name__)
 
+
+def manager_for(
+    request_id: str,
+    slots: int = 1,
+    profile: str = DEFAULT_PROFILE,
+    headless: bool = False,
+) -> "SandboxManager":
+    # Defaults are left out, so managers keep the parameters they have always
+    # been looked up with
+    params: dict = {"slots": slots} if slots > 1 else {}
+    if profile != DEFAULT_PROFILE:
+        params["profile"] = profile
+    if headless:
+        params["headless"] = 1
+    return backend.instance(SandboxManager, request_id=request_id, **params)
+
+
 @app.cls(
     image=image,
     concurrency_limit=1,
@@ -26,43 +83,244 @@ logger = logging.getLogger(__name__)
 class SandboxManager:
     request_id: str = modal.parameter()
     auto_cleanup: int = modal.parameter(default=1)
+    # Agents per sandbox; above 1, `Placement` picks a slot on a shared one
+    slots: int = modal.parameter(default=1)
+    # A name from `profiles.PROFILES`; for packed slots, the shared sandbox's
+    profile: str = modal.parameter(default=DEFAULT_PROFILE)
+    # Start with a shell only and bring the desktop up on first use.
+    # Packed slots always start this way.
+    headless: int = modal.parameter(default=0)
+    # Seconds between checkpoints of a sandbox of its own; 0 for none
+    checkpoint_interval: int = modal.parameter(default=0)
 
     @modal.enter()
     async def create_sandbox(self):
         logging.basicConfig(level=logging.INFO)
 
         self.bash_sessions: dict[BashSession, BashSessionManager] = {}
-        self.nfs = await NetworkFileSystem.lookup.aio(
-            f"anthropic-computer-use-{self.request_id}", create_if_missing=True
-        )
-        if sandbox := await anext(
-            Sandbox.list.aio(tags={"request_id": self.request_id}), None
-        ):
-            self.sandbox = sandbox
-        else:
-            self.sandbox = await Sandbox.create.aio(
-                image=sandbox_image,
-                cpu=8,
-                memory=1024 * 8,
-                gpu="T4",
-                network_file_systems={MOUNT_PATH: self.nfs},
-                timeout=60 * 60,
-                encrypted_ports=[8501, 6080],
+        if self.slots > 1:
+            self.placement = backend.instance(
+                Placement, slots=self.slots, profile=self.profile
             )
-            logger.info("Waiting for sandbox to start...")
-            await asyncio.sleep(30)
-            logger.info("Sandbox started")
+            self.host, index = await self.placement.place.remote.aio(self.request_id)
+            self.slot = Slot.packed(index, self.request_id)
+        else:
+            self.host, self.slot = self.request_id, Slot()
+        self._checkpoint_lock = asyncio.Lock()
+        await self._open()
+        self.monitor = ResourceMonitor()
+        self._sampler = asyncio.create_task(self._sample())
+        self._checkpointer = (
+            asyncio.create_task(self._checkpoint_every(self.checkpoint_interval))
+            if self.checkpoint_interval and not self.slot.user
+            else None
+        )
+
+    async def _open(self, restore: bool = False):
+        """Open the sandbox, and restore the latest checkpoint into a new one."""
+
+        self._created = time.monotonic()
+        self.nfs, self.sandbox = await open_sandbox(
+            self.host,
+            get_profile(self.profile),
+            headless=bool(self.headless or self.slot.user),
+        )
+        self.startup: dict[str, float | str] = {
+            "mode": "headless" if self.headless or self.slot.user else "desktop",
+            "shell_ready": time.monotonic() - self._created,
+        }
+        if proxy := getattr(self, "_proxy", None):
+            proxy.cancel()
+        self._proxy_ready = asyncio.Event()
+        self._proxy = asyncio.create_task(self._supervise_proxy())
+        self._desktop: asyncio.Future | None = None
+        self._prewarm: asyncio.Task | None = None
+        if self.startup["mode"] == "desktop":
+            # The image's entrypoint started it with the sandbox
+            self._desktop = asyncio.get_running_loop().create_future()
+            self._desktop.set_result(None)
+        if self.slot.user:
+            if (res := await self._exec(*self.slot.setup())).error:
+                logger.warning(f"Slot setup: {res.error}")
+        self.dir_index = DirectoryIndex(nfs=self.nfs, slot=self.slot)
+        self.file_agent = FileAgent(sandbox=self.sandbox, slot=self.slot)
+        if self.slot.user:
+            return
+        fresh = (await self._exec(*mark_epoch_command())).output
+        if fresh or restore:
+            restored = await self._restore()
+            if restored["name"]:
+                self.startup.update(
+                    restored=restored["seconds"],
+                    restored_files=restored["restored"],
+                    checkpoint_age=restored["age"],
+                )
 
     @modal.exit()
     async def cleanup_sandbox(self):
+        self._sampler.cancel()
+        self._proxy.cancel()
+        if self._checkpointer:
+            self._checkpointer.cancel()
         if not self.auto_cleanup:
+            await tracing.flush()
             return
         for manager in self.bash_sessions.values():
             await manager.kill()
-        await self.sandbox.terminate.aio()
+        await self.file_agent.kill()
+        if self.slot.user:
+            await self._exec(*self.slot.teardown())
+            await self.placement.release.remote.aio(self.request_id)
+        else:
+            if self.checkpoint_interval:
+                try:
+                    await self._checkpoint()
+                except OSError as e:
+                    logger.warning(f"Final checkpoint: {e}")
+            await self.sandbox.terminate.aio()
+        await tracing.flush()
+
+    async def _exec(self, *command: str) -> ToolResult:
+        proc: ContainerProcess = await self.sandbox.exec.aio(*map(str, command))
+        await proc.wait.aio()
+        return ToolResult(
+            output=await proc.stdout.read.aio(),
+            error=await proc.stderr.read.aio(),
+        )
+
+    async def _supervise_proxy(self):
+        """Keep the package proxy up, or route around it; see `package_cache`."""
+
+        failures = 0
+        while failures < MAX_RESTARTS:
+            started = time.monotonic()
+            with tracing.span("package_proxy.start", attempt=failures):
+                # Returns at once; the proxy keeps running in the sandbox
+                await self.sandbox.exec.aio(*proxy_command())
+                res = await self._exec(*wait_command())
+            if res.error is not None and res.error.strip():
+                logger.warning(f"Package proxy: {res.error}")
+            if await self._proxy_up():
+                if not self._proxy_ready.is_set():
+                    self.startup["package_cache"] = time.monotonic() - started
+                    self._proxy_ready.set()
+                failures = 0
+                while await self._proxy_up():
+                    await asyncio.sleep(CHECK_INTERVAL)
+                logger.warning("Package proxy stopped answering, restarting it")
+            else:
+                failures += 1
+        error = f"proxy did not start after {MAX_RESTARTS} attempts"
+        logger.error(f"Package cache bypassed: {error}")
+        await self._exec(*bypass_command())
+        self.startup["package_cache"] = f"bypassed: {error}"
+        self._proxy_ready.set()
+
+    async def _proxy_up(self) -> bool:
+        return bool((await self._exec(*stats_command())).output)
+
+    async def _start_desktop(self):
+        started = time.monotonic()
+        with tracing.span("desktop.start", display=self.slot.display):
+            res = await self._exec(*self.slot.start_desktop())
+        if res.error:
+            logger.warning(f"Desktop startup: {res.error}")
+        self.startup["desktop_ready"] = time.monotonic() - self._created
+        logger.info(f"Desktop started in {time.monotonic() - started:.1f}s")
+
+    def _desktop_task(self) -> asyncio.Future:
+        if self._desktop is None:
+            self._desktop = asyncio.create_task(self._start_desktop())
+        return self._desktop
+
+    async def _warm(self, app: WarmApp, urls: tuple[str, ...]) -> float | None:
+        started = time.monotonic()
+        env = ("env", f"DISPLAY=:{self.slot.display}")
+        launch = app.launch(urls, self.slot.debug_port)
+        await self._exec(*self.slot.command(*env, "sh", "-c", launch))
+        res = await self._exec(*self.slot.command(*env, "sh", "-c", app.wait()))
+        if res.output is None or "ready" not in res.output:
+            logger.warning(f"{app.name} was not ready after {app.timeout}s")
+            return None
+        return time.monotonic() - started
+
+    async def _run_prewarm(self, profile: PrewarmProfile) -> dict[str, float | None]:
+        await self._desktop_task()
+        with tracing.span("prewarm", apps=len(profile.launches)):
+            ready = await asyncio.gather(
+                *(self._warm(app, profile.urls) for app in profile.launches)
+            )
+        self.startup["prewarm"] = dict(
+            zip((app.name for app in profile.launches), ready)
+        )
+        logger.info(f"Prewarmed {self.startup['prewarm']}")
+        return self.startup["prewarm"]
+
+    async def _run_checkpoint_script(self, *command: str) -> dict:
+        res = await self._exec(*command)
+        try:
+            return json.loads(res.output or "")
+        except json.JSONDecodeError:
+            raise OSError(f"Checkpoint script failed: {res.error}")
+
+    async def _checkpoint(self, paths: tuple[str, ...] = CHECKPOINT_PATHS) -> dict:
+        if self.slot.user:
+            raise ValueError("Checkpoints need a sandbox of its own, not a slot")
+        async with self._checkpoint_lock:
+            with tracing.span("checkpoint.save", paths=len(paths)):
+                result = await self._run_checkpoint_script(*save_command(paths))
+        logger.info(
+            f"Checkpoint {result['name']}: {result['files']} files, "
+            f"{result['stored_bytes']} new bytes in {result['seconds']:.1f}s"
+        )
+        return result
+
+    async def _restore(self, name: str | None = None) -> dict:
+        async with self._checkpoint_lock:
+            with tracing.span("checkpoint.restore"):
+                result = await self._run_checkpoint_script(*restore_command(name))
+        if result["name"]:
+            logger.info(
+                f"Restored {result['name']}: {result['restored']} files in "
+                f"{result['seconds']:.1f}s, {result['age']:.0f}s of setup"
+            )
+        return result
+
+    async def _checkpoint_every(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._checkpoint()
+            except OSError as e:
+                logger.warning(f"Scheduled checkpoint: {e}")
+
+    async def _sample(self):
+        while True:
+            try:
+                self.monitor.add((await self._exec("sh", "-c", SAMPLE)).output or "")
+            except Exception as e:
+                logger.warning(f"Resource sample failed: {e}")
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+    @modal.method()
+    @tracing.traced()
+    async def resource_usage(self, reset: bool = False) -> dict:
+        """Utilization and latency since the last reset; see `profiles.ResourceMonitor`."""
+
+        usage = {
+            "profile": self.profile,
+            "startup": dict(self.startup),
+            **self.monitor.summary(),
+        }
+        if reset:
+            self.monitor.reset()
+        return usage
 
     @modal.method()
+    @tracing.traced()
     async def debug_urls(self):
+        # Brought up in the background; the tunnels answer once it is
+        self._desktop_task()
         tunnels = await self.sandbox.tunnels.aio()
         return {
             "vnc": tunnels[6080].url,
@@ -70,83 +328,371 @@ class SandboxManager:
         }
 
     @modal.method()
+    @tracing.traced()
+    async def get_slot(self) -> Slot:
+        # apt, pip and npm go through the package proxy, so it must be up first
+        try:
+            await asyncio.wait_for(
+                self._proxy_ready.wait(), START_TIMEOUT * (MAX_RESTARTS + 1)
+            )
+        except asyncio.TimeoutError:
+            logger.error("Package proxy is still not up, handing out the sandbox")
+        return self.slot
+
+    @modal.method()
+    @tracing.traced()
+    async def start_desktop(self):
+        """Bring up the display stack, and any prewarmed apps, and wait for them."""
+
+        await asyncio.shield(self._desktop_task())
+        if self._prewarm is None or "first_action_wait" in self.startup:
+            return
+        started = time.monotonic()
+        ready = await asyncio.shield(self._prewarm)
+        self.startup["first_action_wait"] = waited = time.monotonic() - started
+        # What the first action would have spent on cold starts, less what it
+        # still waited for
+        self.startup["prewarm_saved"] = max(
+            0.0, max((r for r in ready.values() if r is not None), default=0.0) - waited
+        )
+
+    @modal.method()
+    @tracing.traced()
+    async def prewarm(self, profile: PrewarmProfile) -> dict[str, float | None]:
+        """Start `profile`'s apps; returns the seconds each took to be ready."""
+
+        if self._prewarm is None:
+            self._prewarm = asyncio.create_task(self._run_prewarm(profile))
+        return await asyncio.shield(self._prewarm)
+
+    @modal.method()
+    @tracing.traced()
+    async def package_cache_stats(self) -> dict:
+        """This sandbox's package cache hits and misses; see `package_cache`."""
+        if isinstance(state := self.startup.get("package_cache"), str):
+            raise OSError(f"Package cache is {state}")
+        res = await self._exec(*stats_command())
+        try:
+            return summarize([json.loads(res.output or "")])
+        except json.JSONDecodeError as e:
+            raise OSError(f"Package proxy is not running: {res.error}") from e
+
+    @modal.method()
+    @tracing.traced()
+    async def checkpoint(self, paths: list[str] | None = None) -> dict:
+        """Checkpoint `paths` (by default `CHECKPOINT_PATHS`) onto the NFS now."""
+        return await self._checkpoint(tuple(paths or CHECKPOINT_PATHS))
+
+    @modal.method()
+    @tracing.traced()
+    async def restore_checkpoint(self, name: str | None = None) -> dict:
+        """Restore checkpoint `name`, by default the latest, into this sandbox."""
+        return await self._restore(name)
+
+    @modal.method()
+    @tracing.traced()
+    async def restart_sandbox(self) -> dict:
+        """Replace the sandbox with a new one restored from the latest checkpoint."""
+
+        if self.slot.user:
+            raise ValueError("Only a sandbox of its own can be restarted, not a slot")
+        for manager in self.bash_sessions.values():
+            await manager.kill()
+        self.bash_sessions.clear()
+        await self.file_agent.kill()
+        await self.sandbox.terminate.aio()
+        await self._open(restore=True)
+        return dict(self.startup)
+
+    @modal.method()
+    @tracing.traced()
     async def run_command(self, *command: str) -> ToolResult:
         logger.info(f"Running command: {command}")
-        proc: ContainerProcess = await self.sandbox.exec.aio(*map(str, command))
-        await proc.wait.aio()
-        res = ToolResult(
-            output=await proc.stdout.read.aio(),
-            error=await proc.stderr.read.aio(),
-        )
+        self.monitor.touch()
+        started = time.monotonic()
+        res = await self._exec(*self.slot.command(*map(str, command)))
+        self.monitor.commands.observe(time.monotonic() - started)
         logger.info(f"Command returned: {res}")
         return res
 
     @modal.method()
+    @tracing.traced()
     @backoff.on_exception(backoff.expo, FileNotFoundError, max_tries=3)
     async def read_file(self, path: Path) -> bytes:
-        buff = BytesIO()
         try:
-            async for chunk in self.nfs.read_file.aio(path.as_posix()):
-                buff.write(chunk)
+            return b"".join(
+                [chunk async for chunk in self.nfs.read_file.aio(self.slot.path(path))]
+            )
+        except GRPCError:
+            raise FileNotFoundError(f"File not found: {path}")
+
+    @modal.method(is_generator=True)
+    @tracing.traced()
+    async def read_file_chunks(
+        self,
+        path: Path,
+        offset: int = 0,
+        length: int | None = None,
+        chunk_size: int = CHUNK_SIZE,
+    ) -> AsyncGenerator[bytes, None]:
+        try:
+            async for chunk in rechunk(
+                slice_stream(
+                    self.nfs.read_file.aio(self.slot.path(path)), offset, length
+                ),
+                chunk_size,
+            ):
+                yield chunk
         except GRPCError:
             raise FileNotFoundError(f"File not found: {path}")
-        buff.seek(0)
-        return buff.getvalue()
 
     @modal.method()
+    @tracing.traced()
     async def write_file(self, path: Path, content: bytes):
-        await self.nfs.write_file.aio(path.as_posix(), BytesIO(content))
+        await self.nfs.write_file.aio(self.slot.path(path), BytesIO(content))
+
+    @modal.method()
+    @tracing.traced()
+    async def write_file_part(self, parts: Path, index: int, content: bytes):
+        await self.nfs.write_file.aio(
+            self.slot.path(parts / f"{index:08d}"), BytesIO(content)
+        )
+
+    @modal.method()
+    @tracing.traced()
+    async def commit_file_parts(
+        self,
+        parts: Path,
+        path: Path,
+        count: int,
+        offset: int | None = None,
+        size: int | None = None,
+    ):
+        """
+        Concatenate parts `00000000` to `count - 1` into `path`. Fails, and
+        writes nothing, unless exactly those parts (and `size` bytes, if given)
+        are there.
+        """
+
+        sink = (
+            'cat > "$1.tmp" && mv "$1.tmp" "$1"'
+            if offset is None
+            else f'dd of="$1" bs=1M seek={offset} oflag=seek_bytes conv=notrunc status=none'
+        )
+        size_check = (
+            f'[ "$(cat $expected | wc -c)" -eq {size} ]' if size is not None else "true"
+        )
+        wanted = f"{count} parts" + (f" of {size} bytes" if size is not None else "")
+        # Parts written through the NFS API can take a moment to show up in the
+        # mount, names first
+        script = f"""
+            expected=$(printf '%08d\\n' $(seq 0 {count - 1}))
+            complete() {{ [ "$(ls "$0" 2>/dev/null)" = "$expected" ] && (cd "$0" && {size_check}); }}
+            for _ in $(seq 20); do complete && break; sleep 0.5; done
+            if ! complete; then
+                found="$(ls "$0" 2>/dev/null | wc -l) parts of $(cat "$0"/* 2>/dev/null | wc -c) bytes"
+                echo "Expected {wanted} in $0, found $found" >&2
+                exit 1
+            fi
+            mkdir -p "$(dirname "$1")" && (cd "$0" && cat $expected) | {sink} && rm -rf "$0"
+        """
+        res = await self.run_command.local(
+            "sh",
+            "-c",
+            script,
+            Path(self.slot.mount) / parts,
+            Path(self.slot.mount) / path,
+        )
+        if res.error:
+            raise OSError(f"Failed to write {path}: {res.error}")
 
     @modal.method()
+    @tracing.traced()
+    async def remove_file(self, path: Path):
+        await self.nfs.remove_file.aio(self.slot.path(path))
+
+    @modal.method()
+    @tracing.traced()
+    async def pack_dir(
+        self, path: Path, filter: SyncFilter, previous: Manifest
+    ) -> PackedDir:
+        res = await self.run_command.local(
+            "find", path, "-type", "f", "-printf", r"%P\t%s\t%T@\n"
+        )
+        manifest: Manifest = {}
+        for line in (res.output or "").splitlines():
+            name, size, mtime = line.rsplit("\t", 2)
+            manifest[name] = (int(size), float(mtime))
+        plan = SyncPlan.diff(filter.apply(manifest), previous)
+        if not plan.changed:
+            return PackedDir(plan=plan)
+
+        archive = archive_path()
+        proc: ContainerProcess = await self.sandbox.exec.aio(
+            *self.slot.command(
+                "sh",
+                "-c",
+                'tar -czf "$0" -C "$1" --verbatim-files-from -T - && sync',
+                (Path(self.slot.mount) / archive).as_posix(),
+                path.as_posix(),
+            )
+        )
+        proc.stdin.write("\n".join(plan.changed) + "\n")
+        proc.stdin.write_eof()
+        await proc.stdin.drain.aio()
+        if await proc.wait.aio():
+            raise OSError(f"Failed to pack {path}: {await proc.stderr.read.aio()}")
+        return PackedDir(plan=plan, archive=archive)
+
+    @modal.method()
+    @tracing.traced()
+    async def unpack_archive(
+        self, archive: Path | None, path: Path, deleted: list[str] | None = None
+    ):
+        if deleted:
+            await self.run_command.local("rm", "-rf", *(path / d for d in deleted))
+        if not archive:
+            return
+        res = await self.run_command.local(
+            "sh",
+            "-c",
+            'mkdir -p "$1" && tar -xzf "$0" -C "$1" && rm -f "$0"',
+            Path(self.slot.mount) / archive,
+            path,
+        )
+        if res.error:
+            raise OSError(f"Failed to unpack into {path}: {res.error}")
+
+    @modal.method()
+    @tracing.traced()
     async def stat_file(self, path: Path) -> list[dict]:
         try:
-            return [e.__dict__ for e in await self.nfs.listdir.aio(path.as_posix())]
+            return [
+                e.__dict__ for e in await self.nfs.listdir.aio(self.slot.path(path))
+            ]
         except GRPCError:
             return []
 
     @modal.method()
-    async def take_screenshot(self, display: int, size: tuple[int, int]) -> ToolResult:
+    @tracing.traced()
+    async def view_dir(self, path: Path, depth: int = 2) -> ToolResult:
+        entries, truncated = await self.dir_index.view(path, depth)
+        output = "\n".join(entries)
+        if truncated:
+            output += f"\n<truncated after {len(entries)} entries>"
+        return ToolResult(output=output)
+
+    @modal.method()
+    @tracing.traced()
+    async def call_file_agent(self, request: dict) -> dict:
+        self.monitor.touch()
+        return await self.file_agent.call(request)
+
+    @modal.method()
+    @tracing.traced()
+    async def accessibility_tree(self, display: int, limit: int = MAX_NODES) -> dict:
+        await asyncio.shield(self._desktop_task())
+        self.monitor.touch()
+        res = await self._exec(*self.slot.command(*tree_command(display, limit)))
+        try:
+            return json.loads(res.output or "")
+        except ValueError:
+            logger.warning(f"Accessibility tree: {res.error}")
+            return {"window": None, "nodes": []}
+
+    @modal.method()
+    @tracing.traced()
+    async def browse(self, request: dict) -> dict:
+        await asyncio.shield(self._desktop_task())
+        self.monitor.touch()
+        res = await self._exec(
+            *self.slot.command(
+                *browse_command(self.slot.display, self.slot.debug_port, request)
+            )
+        )
+        try:
+            return json.loads(res.output or "")
+        except ValueError:
+            return {"error": res.error or "The browser returned nothing"}
+
+    @modal.method()
+    @tracing.traced()
+    async def take_screenshot(
+        self,
+        display: int,
+        size: tuple[int, int],
+        region: tuple[int, int, int, int] | None = None,
+    ) -> ToolResult:
+        """The display resized to `size`, or only `region` (x0, y0, x1, y1) of it."""
         from base64 import b64encode
 
         from uuid6 import uuid7
         from wand.image import Image
 
-        path = Path(MOUNT_PATH) / f"{uuid7().hex}.png"
-        await self.run_command.local(
-            "env",
-            f"DISPLAY=:{display}",
-            "scrot",
-            "-p",
-            path.as_posix(),
+        await asyncio.shield(self._desktop_task())
+        self.monitor.touch()
+        started = time.monotonic()
+        path = Path(self.slot.mount) / f"{uuid7().hex}.png"
+        with tracing.span("scrot"):
+            await self.run_command.local(
+                "env",
+                f"DISPLAY=:{display}",
+                "scrot",
+                "-p",
+                path.as_posix(),
+            )
+        blob = await tracing.propagate(self).read_file.remote.aio(
+            path.relative_to(self.slot.mount)
         )
-        with Image(
-            blob=await self.read_file.remote.aio(path.relative_to(MOUNT_PATH))
-        ) as img:
+        with (
+            tracing.span("wand.resize", width=size[0], height=size[1]),
+            Image(blob=blob) as img,
+        ):
+            if region:
+                img.crop(
+                    left=region[0], top=region[1], right=region[2], bottom=region[3]
+                )
             img.resize(width=size[0], height=size[1])
-            return ToolResult(
+            result = ToolResult(
                 base64_image=b64encode(cast(bytes, img.make_blob())).decode()
             )
+        self.monitor.screenshots.observe(elapsed := time.monotonic() - started)
+        if self.slot.user:
+            await self.placement.observe.spawn.aio(
+                self.host, elapsed, self.monitor.steal
+            )
+        return result
 
     @modal.method()
+    @tracing.traced()
     async def start_bash_session(self) -> BashSession:
-        manager = BashSessionManager(sandbox=self.sandbox)
+        manager = BashSessionManager(sandbox=self.sandbox, slot=self.slot)
         session = await manager.start()
         self.bash_sessions[session] = manager
         return session
 
     @modal.method()
+    @tracing.traced()
     async def execute_bash_command(self, session: BashSession, cmd: str) -> ToolResult:
+        self.monitor.touch()
         try:
             manager = self.bash_sessions[session]
         except KeyError:
-            manager = BashSessionManager(sandbox=self.sandbox, session=session)
+            manager = BashSessionManager(
+                sandbox=self.sandbox, slot=self.slot, session=session
+            )
             self.bash_sessions[session] = manager
-        return await manager.run(cmd)
+        result = await manager.run(cmd)
+        self.startup.setdefault("first_command", time.monotonic() - self._created)
+        return result
 
     @modal.method()
+    @tracing.traced()
     async def end_bash_session(self, session: BashSession):
         try:
             manager = self.bash_sessions.pop(session)
         except KeyError:
-            manager = BashSessionManager(sandbox=self.sandbox, session=session)
+            manager = BashSessionManager(
+                sandbox=self.sandbox, slot=self.slot, session=session
+            )
         await manager.kill()
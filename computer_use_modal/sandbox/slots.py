@@ -0,0 +1,167 @@
+from dataclasses import dataclass
+from pathlib import PurePosixPath
+
+from computer_use_modal.app import BROWSER_DEBUG_PORT, MOUNT_PATH
+
+# The image's `entrypoint.sh` without its final `tail -f`: the desktop on `:1`,
+# noVNC on 6080 and the quickstart's Streamlit app on 8501.
+DESKTOP = """
+cd /home/computeruse
+./start_all.sh
+./novnc_startup.sh
+python http_server.py > /tmp/server_logs.txt 2>&1 &
+STREAMLIT_SERVER_PORT=8501 python -m streamlit run computer_use_demo/streamlit.py > /tmp/streamlit_stdout.log 2>&1 &
+"""
+
+# Run as root inside the sandbox: a user and a private directory on the NFS,
+# both owned by the slot's user. Users are reused by index, so any other
+# request's directory the user still owns (its teardown never ran) goes back
+# to root first. Idempotent.
+SETUP = """
+user=$1 home=$2 mount=$3 port=$4
+id -u "$user" >/dev/null 2>&1 || useradd --create-home --shell /bin/bash "$user"
+mkdir -p "$(dirname "$mount")"
+find "$(dirname "$mount")" -mindepth 1 -maxdepth 1 -user "$user" ! -path "$mount" \
+    -exec chown -R root: {} + -exec chmod 700 {} +
+if [ ! -e "$home/.config/tint2" ]; then
+    cp -r /home/computeruse/.config "$home/" 2>/dev/null
+    sed -i -e 's|Exec=sudo |Exec=|' \
+        -e "s|--remote-debugging-port [0-9]*|--remote-debugging-port $port|" \
+        "$home"/.config/tint2/applications/*.desktop 2>/dev/null
+fi
+mkdir -p "$mount" && chown -R "$user:" "$home" "$mount" && chmod 700 "$home" "$mount"
+"""
+
+# Run as root: an X display with a desktop, owned by the slot's user. Idempotent.
+SLOT_DESKTOP = """
+user=$1 display=":$2" home=$3 width=$4 height=$5
+as_user() { sudo -u "$user" -H env DISPLAY="$display" "$@"; }
+if ! as_user xdpyinfo >/dev/null 2>&1; then
+    as_user xauth -q add "$display" . "$(mcookie)"
+    setsid sudo -u "$user" -H Xvfb "$display" -screen 0 "${width}x${height}x24" \\
+        -auth "$home/.Xauthority" -nolisten tcp >/dev/null 2>&1 &
+    for _ in $(seq 50); do as_user xdpyinfo >/dev/null 2>&1 && break; sleep 0.1; done
+    setsid sudo -u "$user" -H env DISPLAY="$display" mutter --replace --sm-disable >/dev/null 2>&1 &
+    setsid sudo -u "$user" -H env DISPLAY="$display" tint2 >/dev/null 2>&1 &
+fi
+"""
+
+# Stop everything the slot's user runs, wipe its home and temporary files, and
+# hand its directory on the NFS to root: the next agent in this slot runs as
+# the same user. `SETUP` gives the directory back if the request returns.
+TEARDOWN = """
+id -u "$1" >/dev/null 2>&1 || exit 0
+pkill -KILL -u "$1"
+find "$2" -mindepth 1 -delete
+find /tmp /var/tmp /dev/shm -xdev -mindepth 1 -user "$1" -delete 2>/dev/null
+[ -d "$3" ] && chown -R root: "$3" && chmod 700 "$3"
+exit 0
+"""
+
+
+@dataclass(kw_only=True, frozen=True)
+class Slot:
+    """
+    Where one agent lives inside its sandbox.
+
+    The default is the whole sandbox: the image's own desktop on `:1`, its
+    default user, and the root of the NFS. Packed slots (see `placement`) each
+    get a display, an unprivileged user and a directory of their own.
+    """
+
+    display: int = 1
+    user: str | None = None
+    home: str = "/home/computeruse"
+    # The agent's directory, relative to the root of the NFS
+    root: str = "."
+
+    @classmethod
+    def packed(cls, index: int, request_id: str) -> "Slot":
+        return cls(
+            display=index + 2,
+            user=f"agent{index}",
+            home=f"/home/agent{index}",
+            root=f"agents/{request_id}",
+        )
+
+    @property
+    def debug_port(self) -> int:
+        """Where the slot's Firefox listens for the browser tool."""
+        return BROWSER_DEBUG_PORT + self.display - 1
+
+    @property
+    def mount(self) -> str:
+        """The agent's directory, as seen from inside the sandbox."""
+        return (PurePosixPath(MOUNT_PATH) / self.root).as_posix()
+
+    def path(self, path: PurePosixPath) -> str:
+        """A path relative to the agent's directory, relative to the NFS root."""
+        path = PurePosixPath(path)
+        if self.user is not None and (path.is_absolute() or ".." in path.parts):
+            raise PermissionError(f"{path} is outside of {self.mount}")
+        return (PurePosixPath(self.root) / path).as_posix()
+
+    def command(self, *argv: str) -> tuple[str, ...]:
+        """`argv` as the slot's user, on the slot's display."""
+        if self.user is None:
+            return argv
+        return (
+            "sudo",
+            "-n",
+            "-u",
+            self.user,
+            "-H",
+            "--",
+            "env",
+            f"DISPLAY=:{self.display}",
+            *argv,
+        )
+
+    def setup(self) -> tuple[str, ...]:
+        assert self.user is not None
+        return (
+            "sudo",
+            "-n",
+            "--",
+            "sh",
+            "-c",
+            SETUP,
+            "slot-setup",
+            self.user,
+            self.home,
+            self.mount,
+            str(self.debug_port),
+        )
+
+    def start_desktop(self, width: int = 1024, height: int = 768) -> tuple[str, ...]:
+        if self.user is None:
+            return ("sh", "-c", DESKTOP)
+        return (
+            "sudo",
+            "-n",
+            "--",
+            "sh",
+            "-c",
+            SLOT_DESKTOP,
+            "slot-desktop",
+            self.user,
+            str(self.display),
+            self.home,
+            str(width),
+            str(height),
+        )
+
+    def teardown(self) -> tuple[str, ...]:
+        assert self.user is not None
+        return (
+            "sudo",
+            "-n",
+            "--",
+            "sh",
+            "-c",
+            TEARDOWN,
+            "slot-teardown",
+            self.user,
+            self.home,
+            self.mount,
+        )
@@ -0,0 +1,94 @@
+from pathlib import Path
+from typing import TYPE_CHECKING, AsyncIterable, AsyncIterator, Iterable
+
+from uuid6 import uuid7
+
+if TYPE_CHECKING:
+    from computer_use_modal.sandbox.sandbox_manager import SandboxManager
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+async def rechunk(
+    chunks: AsyncIterable[bytes] | Iterable[bytes], chunk_size: int = CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """Re-slice an arbitrary byte stream into pieces of at most `chunk_size`."""
+
+    buff = bytearray()
+    if isinstance(chunks, AsyncIterable):
+        source = chunks
+    else:
+
+        async def source_gen():
+            for chunk in chunks:
+                yield chunk
+
+        source = source_gen()
+    async for chunk in source:
+        buff += chunk
+        while len(buff) >= chunk_size:
+            yield bytes(buff[:chunk_size])
+            del buff[:chunk_size]
+    if buff:
+        yield bytes(buff)
+
+
+async def slice_stream(
+    chunks: AsyncIterable[bytes], offset: int = 0, length: int | None = None
+) -> AsyncIterator[bytes]:
+    """Yield only the bytes in `[offset, offset + length)` of a stream."""
+
+    pos, end = 0, None if length is None else offset + length
+    async for chunk in chunks:
+        start, stop = pos, pos + len(chunk)
+        pos = stop
+        if stop <= offset:
+            continue
+        if end is not None and start >= end:
+            break
+        yield chunk[max(0, offset - start) : None if end is None else end - start]
+
+
+def upload_dir(path: Path) -> Path:
+    return path.parent / f".upload-{path.name}-{uuid7().hex}"
+
+
+async def upload(
+    manager: "SandboxManager",
+    path: Path,
+    chunks: AsyncIterable[bytes] | Iterable[bytes],
+    *,
+    offset: int | None = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> int:
+    """
+    Stream `chunks` into `path` on the sandbox's NFS, holding at most one chunk
+    in memory. If `offset` is given, the data overwrites the file in place
+    starting at that byte instead of replacing it.
+    """
+
+    parts, size, count = upload_dir(path), 0, 0
+    async for chunk in rechunk(chunks, chunk_size):
+        await manager.write_file_part.remote.aio(parts, count, chunk)
+        size, count = size + len(chunk), count + 1
+    if not count:
+        await manager.write_file_part.remote.aio(parts, count, b"")
+        count += 1
+    await manager.commit_file_parts.remote.aio(parts, path, count, offset, size)
+    return size
+
+
+async def download(
+    manager: "SandboxManager",
+    path: Path,
+    *,
+    offset: int = 0,
+    length: int | None = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> AsyncIterator[bytes]:
+    """Stream `path` from the sandbox's NFS in pieces of at most `chunk_size`."""
+
+    async for chunk in manager.read_file_chunks.remote_gen.aio(
+        path, offset=offset, length=length, chunk_size=chunk_size
+    ):
+        yield chunk
@@ -0,0 +1,163 @@
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING
+
+from uuid6 import uuid7
+
+from computer_use_modal import backend
+from computer_use_modal.sandbox.streaming import CHUNK_SIZE, download, upload
+
+if TYPE_CHECKING:
+    from computer_use_modal.sandbox.sandbox_manager import SandboxManager
+
+SYNC_MANIFESTS = backend.named_dict("sync-manifests")
+
+# relative path -> (size, mtime)
+Manifest = dict[str, tuple[int, float]]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(kw_only=True, frozen=True)
+class SyncFilter:
+    include: tuple[str, ...] = ("*",)
+    exclude: tuple[str, ...] = ()
+
+    def matches(self, path: str) -> bool:
+        parts = PurePosixPath(path).parts
+        if any(fnmatch(p, g) for g in self.exclude for p in (path, *parts)):
+            return False
+        return any(fnmatch(p, g) for g in self.include for p in (path, parts[-1]))
+
+    def apply(self, manifest: Manifest) -> Manifest:
+        return {k: v for k, v in manifest.items() if self.matches(k)}
+
+
+@dataclass(kw_only=True, frozen=True)
+class SyncPlan:
+    manifest: Manifest
+    changed: list[str] = field(default_factory=list)
+    deleted: list[str] = field(default_factory=list)
+
+    @classmethod
+    def diff(cls, manifest: Manifest, previous: Manifest) -> "SyncPlan":
+        return cls(
+            manifest=manifest,
+            changed=sorted(k for k, v in manifest.items() if previous.get(k) != v),
+            deleted=sorted(previous.keys() - manifest.keys()),
+        )
+
+
+@dataclass(kw_only=True, frozen=True)
+class PackedDir:
+    plan: SyncPlan
+    archive: Path | None = None
+
+
+def archive_path() -> Path:
+    return Path(f".sync-{uuid7().hex}.tar.gz")
+
+
+def scan_local(root: Path, filter: SyncFilter) -> Manifest:
+    manifest: Manifest = {}
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            stat = (path := Path(dirpath) / name).stat()
+            manifest[path.relative_to(root).as_posix()] = (
+                stat.st_size,
+                stat.st_mtime,
+            )
+    return filter.apply(manifest)
+
+
+def _manifest_key(request_id: str, direction: str, path: Path) -> str:
+    return f"{request_id}:{direction}:{path.as_posix()}"
+
+
+async def push_dir(
+    manager: "SandboxManager",
+    local_dir: Path,
+    remote_dir: Path,
+    *,
+    filter: SyncFilter = SyncFilter(),
+    incremental: bool = True,
+    chunk_size: int = CHUNK_SIZE,
+) -> SyncPlan:
+    """
+    Send `local_dir` into `remote_dir` in the sandbox as one gzipped tar stream.
+    With `incremental`, only files whose size or mtime changed since the last
+    push are sent, and files deleted locally are removed remotely.
+    """
+
+    key = _manifest_key(manager.request_id, "push", remote_dir)
+    previous = await SYNC_MANIFESTS.get.aio(key, {}) if incremental else {}
+    plan = SyncPlan.diff(scan_local(local_dir, filter), previous)
+    logger.info(
+        f"push {local_dir}: {len(plan.changed)} changed, {len(plan.deleted)} deleted"
+    )
+
+    archive = None
+    if plan.changed:
+        archive = archive_path()
+        with tempfile.TemporaryFile() as fp:
+            with tarfile.open(fileobj=fp, mode="w:gz") as tar:
+                for path in plan.changed:
+                    tar.add(local_dir / path, arcname=path)
+            fp.seek(0)
+            await upload(
+                manager,
+                archive,
+                iter(lambda: fp.read(chunk_size), b""),
+                chunk_size=chunk_size,
+            )
+    if archive or plan.deleted:
+        await manager.unpack_archive.remote.aio(archive, remote_dir, plan.deleted)
+    await SYNC_MANIFESTS.put.aio(key, plan.manifest)
+    return plan
+
+
+async def pull_dir(
+    manager: "SandboxManager",
+    remote_dir: Path,
+    local_dir: Path,
+    *,
+    filter: SyncFilter = SyncFilter(),
+    incremental: bool = True,
+    chunk_size: int = CHUNK_SIZE,
+) -> SyncPlan:
+    """
+    Fetch `remote_dir` from the sandbox into `local_dir` as one gzipped tar
+    stream. With `incremental`, only files whose size or mtime changed since the
+    last pull are sent, and files deleted remotely are removed locally.
+    """
+
+    key = _manifest_key(manager.request_id, "pull", remote_dir)
+    previous = await SYNC_MANIFESTS.get.aio(key, {}) if incremental else {}
+    packed: PackedDir = await manager.pack_dir.remote.aio(remote_dir, filter, previous)
+    plan = packed.plan
+    logger.info(
+        f"pull {remote_dir}: {len(plan.changed)} changed, {len(plan.deleted)} deleted"
+    )
+
+    local_dir.mkdir(parents=True, exist_ok=True)
+    if packed.archive:
+        with tempfile.TemporaryFile() as fp:
+            async for chunk in download(manager, packed.archive, chunk_size=chunk_size):
+                fp.write(chunk)
+            fp.seek(0)
+            with tarfile.open(fileobj=fp, mode="r:gz") as tar:
+                tar.extractall(local_dir, filter="data")
+        await manager.remove_file.remote.aio(packed.archive)
+    for path in plan.deleted:
+        if (target := local_dir / path).is_dir():
+            shutil.rmtree(target)
+        else:
+            target.unlink(missing_ok=True)
+    await SYNC_MANIFESTS.put.aio(key, plan.manifest)
+    return plan
@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Literal
+
+import modal
+
+from computer_use_modal.app import app, image
+from computer_use_modal.server.model_client import LatencyHistogram
+
+Priority = Literal["interactive", "default", "batch"]
+
+# Share of the budget each class gets while others are also waiting
+PRIORITY_WEIGHTS: dict[Priority, float] = {"interactive": 4, "default": 2, "batch": 1}
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(kw_only=True)
+class TokenBucket:
+    capacity: float
+    per_second: float
+    level: float = -1.0
+    updated: float = 0.0
+
+    def __post_init__(self):
+        self.level = self.capacity if self.level < 0 else self.level
+
+    def refill(self, now: float):
+        self.level = min(
+            self.capacity, self.level + (now - self.updated) * self.per_second
+        )
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.per_second)
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def give(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+
+@dataclass(kw_only=True, frozen=True)
+class RateLimits:
+    """Budgets for one API key per `window` seconds, as in the Anthropic console."""
+
+    requests: int = 4_000
+    input_tokens: int = 400_000
+    output_tokens: int = 80_000
+    window: float = 60.0
+
+    def buckets(self, now: float) -> dict[str, TokenBucket]:
+        return {
+            name: TokenBucket(
+                capacity=limit, per_second=limit / self.window, updated=now
+            )
+            for name, limit in (
+                ("requests", self.requests),
+                ("input_tokens", self.input_tokens),
+                ("output_tokens", self.output_tokens),
+            )
+        }
+
+
+@dataclass(kw_only=True)
+class Ticket:
+    request_id: str
+    priority: Priority
+    cost: dict[str, float]
+    enqueued: float
+    admitted: asyncio.Future
+
+
+@dataclass(kw_only=True)
+class AdmissionScheduler:
+    """
+    Admits model calls against shared request and token buckets.
+
+    Waiting calls are ordered by start-time fair queueing over request_ids:
+    each admission advances its request's virtual clock by its token cost
+    divided by its priority weight, and the call with the lowest virtual start
+    goes next. A busy session cannot starve a quiet one, a new session cannot
+    jump ahead of one that has been waiting, and higher classes get a larger
+    share without starving lower ones. The head call waits until the buckets
+    can afford it, so large calls are not starved by small ones either.
+
+    Output tokens are reserved at `max_tokens` and the unused part is
+    returned by `settle`; after a 429, `throttle` holds all calls for the
+    retry-after period.
+    """
+
+    limits: RateLimits = field(default_factory=RateLimits)
+    clock: Callable[[], float] = time.monotonic
+
+    _buckets: dict[str, TokenBucket] = field(default_factory=dict)
+    _queue: list[Ticket] = field(default_factory=list)
+    _virtual: dict[str, float] = field(default_factory=dict)
+    _vclock: float = 0.0
+    _paused_until: float = 0.0
+    _wakeup: asyncio.Event = field(default_factory=asyncio.Event)
+    _dispatcher: asyncio.Task | None = None
+
+    waits: defaultdict[str, LatencyHistogram] = field(
+        default_factory=lambda: defaultdict(LatencyHistogram)
+    )
+    stats: Counter[str] = field(default_factory=Counter)
+
+    def __post_init__(self):
+        self._buckets = self._buckets or self.limits.buckets(self.clock())
+
+    def _refill(self) -> float:
+        now = self.clock()
+        for bucket in self._buckets.values():
+            bucket.refill(now)
+        return now
+
+    def _start(self, ticket: Ticket) -> float:
+        return max(self._virtual.get(ticket.request_id, 0.0), self._vclock)
+
+    def _next(self) -> Ticket:
+        heads: dict[str, Ticket] = {}
+        for ticket in self._queue:
+            heads.setdefault(ticket.request_id, ticket)
+        return min(heads.values(), key=lambda t: (self._start(t), t.enqueued))
+
+    def _admit(self, ticket: Ticket, now: float):
+        for name, amount in ticket.cost.items():
+            self._buckets[name].take(amount)
+        start = self._start(ticket)
+        tokens = ticket.cost["input_tokens"] + ticket.cost["output_tokens"]
+        self._virtual[ticket.request_id] = (
+            start + tokens / PRIORITY_WEIGHTS[ticket.priority]
+        )
+        self._vclock = start
+        self._queue.remove(ticket)
+        wait = now - ticket.enqueued
+        self.waits[ticket.priority].observe(wait)
+        self.stats["admitted"] += 1
+        if not ticket.admitted.done():
+            ticket.admitted.set_result(wait)
+
+    async def _dispatch(self):
+        while self._queue:
+            now = self._refill()
+            ticket = self._next()
+            wait = max(
+                self._paused_until - now,
+                *(self._buckets[n].wait_time(a) for n, a in ticket.cost.items()),
+            )
+            if wait <= 0:
+                self._admit(ticket, now)
+                continue
+            # Sleep until affordable, but re-pick if a new call arrives first
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except TimeoutError:
+                pass
+
+    async def acquire(
+        self,
+        request_id: str,
+        *,
+        input_tokens: int,
+        output_tokens: int,
+        priority: Priority = "default",
+    ) -> float:
+        """Wait until a call may be made; returns the seconds spent queued."""
+
+        ticket = Ticket(
+            request_id=request_id,
+            priority=priority,
+            cost={
+                "requests": 1,
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+            },
+            enqueued=self.clock(),
+            admitted=asyncio.get_running_loop().create_future(),
+        )
+        self._queue.append(ticket)
+        self._wakeup.set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        try:
+            return await ticket.admitted
+        except asyncio.CancelledError:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+            raise
+
+    def settle(
+        self,
+        *,
+        reserved_input: int,
+        reserved_output: int,
+        input_tokens: int,
+        output_tokens: int,
+    ):
+        """Return the unused part of a reservation (or charge an overrun)."""
+
+        self._refill()
+        for name, reserved, used in (
+            ("input_tokens", reserved_input, input_tokens),
+            ("output_tokens", reserved_output, output_tokens),
+        ):
+            if used < reserved:
+                self._buckets[name].give(reserved - used)
+            else:
+                self._buckets[name].take(used - reserved)
+        self._wakeup.set()
+
+    def throttle(self, retry_after: float):
+        """The API answered 429: hold every call for `retry_after` seconds."""
+
+        self.stats["throttled"] += 1
+        self._paused_until = max(self._paused_until, self.clock() + retry_after)
+
+    def report(self) -> dict:
+        depth = Counter(t.priority for t in self._queue)
+        return {
+            "queue_depth": dict(depth),
+            "waiting_requests": len({t.request_id for t in self._queue}),
+            "waits": {p: h.summary() for p, h in self.waits.items()},
+            "buckets": {n: round(b.level) for n, b in self._buckets.items()},
+            **self.stats,
+        }
+
+
+@app.cls(
+    image=image,
+    concurrency_limit=1,
+    allow_concurrent_inputs=1000,
+    timeout=60 * 60,
+    container_idle_timeout=60 * 20,
+)
+class AdmissionController:
+    """The one scheduler shared by every `ComputerUseServer` container."""
+
+    @modal.enter()
+    def init(self):
+        logging.basicConfig(level=logging.INFO)
+
+        self.scheduler = AdmissionScheduler()
+
+    @modal.method()
+    async def acquire(
+        self,
+        request_id: str,
+        input_tokens: int,
+        output_tokens: int,
+        priority: Priority = "default",
+    ) -> float:
+        return await self.scheduler.acquire(
+            request_id,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            priority=priority,
+        )
+
+    @modal.method()
+    async def settle(
+        self,
+        reserved_input: int,
+        reserved_output: int,
+        input_tokens: int,
+        output_tokens: int,
+    ):
+        self.scheduler.settle(
+            reserved_input=reserved_input,
+            reserved_output=reserved_output,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+        )
+
+    @modal.method()
+    async def throttle(self, retry_after: float):
+        self.scheduler.throttle(retry_after)
+
+    @modal.method()
+    async def report(self) -> dict:
+        return self.scheduler.report()
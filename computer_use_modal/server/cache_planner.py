@@ -0,0 +1,83 @@
+import bisect
+import logging
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Sequence
+
+from anthropic.types.beta import BetaUsage
+
+if TYPE_CHECKING:
+    from computer_use_modal.server.messages import BlockRef
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(kw_only=True)
+class CacheStats:
+    requests: int = 0
+    input_tokens: int = 0
+    cache_read_input_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+    last_hit_ratio: float = 0.0
+
+    @staticmethod
+    def hit_ratio(read: int, created: int, uncached: int) -> float:
+        return read / total if (total := read + created + uncached) else 0.0
+
+    @property
+    def total_hit_ratio(self) -> float:
+        return self.hit_ratio(
+            self.cache_read_input_tokens,
+            self.cache_creation_input_tokens,
+            self.input_tokens,
+        )
+
+    def record(self, usage: BetaUsage) -> float:
+        read = usage.cache_read_input_tokens or 0
+        created = usage.cache_creation_input_tokens or 0
+        self.requests += 1
+        self.input_tokens += usage.input_tokens
+        self.cache_read_input_tokens += read
+        self.cache_creation_input_tokens += created
+        self.last_hit_ratio = self.hit_ratio(read, created, usage.input_tokens)
+        return self.last_hit_ratio
+
+
+@dataclass(kw_only=True, frozen=True)
+class CachePlanner:
+    """
+    Decides which images to evict and where to put cache breakpoints so that
+    evictions rewrite the cached prefix as rarely, and as late, as possible.
+
+    Images are only evicted in whole batches of `chunk_size`, once the slack
+    above `keep_n_images` is used up, so the prefix changes once per batch
+    instead of once per turn. Breakpoints go on the most recent tool results,
+    so each turn reads the previous turn's cache entry, plus one anchor just
+    before the oldest live image. Everything up to the anchor survives the
+    next eviction, so the long stable prefix is still a cache hit afterwards.
+    """
+
+    max_breakpoints: int = 4
+    keep_n_images: int = 10
+    chunk_size: int = 10
+
+    def images_to_evict(self, total_images: int) -> int:
+        if total_images <= self.keep_n_images + self.chunk_size:
+            return 0
+        excess = total_images - self.keep_n_images
+        return excess - excess % self.chunk_size
+
+    def breakpoints(
+        self, tool_results: Sequence["BlockRef"], images: Sequence["BlockRef"]
+    ) -> list["BlockRef"]:
+        if not self.max_breakpoints:
+            return []
+        if len(tool_results) <= self.max_breakpoints or self.max_breakpoints < 2:
+            return list(tool_results[-self.max_breakpoints :])
+        recent = list(tool_results[-(self.max_breakpoints - 1) :])
+        if not images:
+            return [tool_results[-self.max_breakpoints], *recent]
+        # Last tool result strictly before the turn holding the oldest live image
+        idx = bisect.bisect_left(tool_results, images[0].turn, key=lambda r: r.turn)
+        if idx == 0 or idx - 1 >= len(tool_results) - len(recent):
+            return [tool_results[-self.max_breakpoints], *recent]
+        return [tool_results[idx - 1], *recent]
@@ -0,0 +1,172 @@
+import asyncio
+import copy
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterator
+
+from anthropic.types.beta import BetaMessageParam
+
+from computer_use_modal.server.image_policy import image_size, image_tokens
+
+# (key, full text) -> reference the model can use to get the text back
+Archiver = Callable[[str, str], Awaitable[str]]
+
+logger = logging.getLogger(__name__)
+
+
+def text_tokens(text: str) -> int:
+    # Rough but stable: ~4 characters per token for English and code
+    return len(text) // 4 + 1
+
+
+def _block_tokens(block: Any) -> int:
+    if isinstance(block, str):
+        return text_tokens(block)
+    if not isinstance(block, dict):
+        block = {"type": block.type, **vars(block)}
+    match block.get("type"):
+        case "text":
+            return text_tokens(block["text"])
+        case "image":
+            source = block["source"]
+            if source.get("type") == "ref":
+                return image_tokens(source["width"], source["height"])
+            return image_tokens(
+                *image_size(source["data"], source.get("media_type", "image/png"))
+            )
+        case "tool_use":
+            return text_tokens(json.dumps(block.get("input", {})))
+        case "tool_result":
+            content = block.get("content") or []
+            return 8 + sum(
+                map(_block_tokens, [content] if isinstance(content, str) else content)
+            )
+    return text_tokens(json.dumps(block, default=str))
+
+
+def estimate_tokens(message: BetaMessageParam) -> int:
+    content = message["content"]
+    return 4 + sum(
+        map(_block_tokens, [content] if isinstance(content, str) else content)
+    )
+
+
+@dataclass(kw_only=True, frozen=True)
+class Compaction:
+    turn: int
+    key: str
+    holder: dict
+    field: str
+    text: str
+    # For tool inputs: the content list and index of the tool_use block, which
+    # is replaced with a copy rather than rewritten in place
+    parent: list | None = None
+    index: int = 0
+
+
+@dataclass(kw_only=True, frozen=True)
+class Compactor:
+    """
+    Collapses bulky old tool traffic (bash output, file views, file contents in
+    tool inputs) into short summaries once the history exceeds `token_budget`.
+
+    The first `keep_head` turns (the task) and the last `keep_recent` turns
+    (the working set) are never touched. Each pass compacts oldest first down
+    to `low_watermark * token_budget`, so the prefix is rewritten rarely and in
+    one go. The full text is handed to `archive`, and the summary says where it
+    went so the model can read it again if it needs to.
+    """
+
+    token_budget: int = 100_000
+    low_watermark: float = 0.6
+    keep_head: int = 1
+    keep_recent: int = 8
+    min_chars: int = 2_000
+    head_chars: int = 600
+    tail_chars: int = 400
+    archive: Archiver | None = None
+
+    def _candidates(self, turn: int, message: BetaMessageParam) -> Iterator[Compaction]:
+        if not isinstance(message["content"], list):
+            return
+        for index, block in enumerate(message["content"]):
+            if not isinstance(block, dict):
+                # Assistant turns hold the SDK's content block models
+                block = {"type": block.type, **vars(block)}
+            if block.get("type") == "tool_use":
+                for name, value in block["input"].items():
+                    if isinstance(value, str) and len(value) >= self.min_chars:
+                        yield Compaction(
+                            turn=turn,
+                            key=f"{block['id']}-{name}",
+                            holder=block["input"],
+                            field=name,
+                            text=value,
+                            parent=message["content"],
+                            index=index,
+                        )
+            elif block.get("type") == "tool_result" and isinstance(
+                items := block.get("content"), list
+            ):
+                for i, item in enumerate(items):
+                    if (
+                        isinstance(item, dict)
+                        and item.get("type") == "text"
+                        and len(item["text"]) >= self.min_chars
+                    ):
+                        yield Compaction(
+                            turn=turn,
+                            key=f"{block['tool_use_id']}-{i}",
+                            holder=item,
+                            field="text",
+                            text=item["text"],
+                        )
+
+    def plan(
+        self, messages: list[BetaMessageParam], tokens: list[int]
+    ) -> list[Compaction]:
+        if (total := sum(tokens)) <= self.token_budget:
+            return []
+        target, plan = self.token_budget * self.low_watermark, []
+        for turn in range(self.keep_head, len(messages) - self.keep_recent):
+            for compaction in self._candidates(turn, messages[turn]):
+                if total <= target:
+                    return plan
+                plan.append(compaction)
+                total -= text_tokens(compaction.text) - text_tokens(
+                    self.summarize(compaction.text, "")
+                )
+        return plan
+
+    def summarize(self, text: str, reference: str) -> str:
+        where = f"full text saved to {reference}" if reference else "full text omitted"
+        return (
+            f"{text[: self.head_chars]}\n"
+            f"[... compacted {text.count(chr(10)) + 1} lines, ~{text_tokens(text)} tokens; {where} ...]\n"
+            f"{text[-self.tail_chars :]}"
+        )
+
+    async def _archive(self, compaction: Compaction) -> str:
+        if not self.archive:
+            return ""
+        return await self.archive(compaction.key, compaction.text)
+
+    async def apply(self, plan: list[Compaction]) -> set[int]:
+        references = await asyncio.gather(*map(self._archive, plan))
+        # Tool inputs are shared with the SDK's block models, and through them
+        # with anything else holding the response, so each is copied once
+        copies: dict[int, dict] = {}
+        for compaction, reference in zip(plan, references):
+            holder = compaction.holder
+            if compaction.parent is not None:
+                if id(holder) not in copies:
+                    block = compaction.parent[compaction.index]
+                    if not isinstance(block, dict):
+                        block = {"type": block.type, **vars(block)}
+                    block = copy.deepcopy(block)
+                    compaction.parent[compaction.index] = block
+                    copies[id(holder)] = block["input"]
+                holder = copies[id(holder)]
+            holder[compaction.field] = self.summarize(compaction.text, reference)
+        return {c.turn for c in plan}
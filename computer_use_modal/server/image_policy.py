@@ -0,0 +1,167 @@
+import base64
+import math
+import struct
+from dataclasses import dataclass
+from typing import Literal, Sequence
+
+Action = Literal["reduce", "drop"]
+
+PLACEHOLDER = "[an older screenshot was removed here to save context]"
+
+# Rough compressed bytes per pixel, for images whose header can't be read
+BYTES_PER_PIXEL = {
+    "image/png": 0.5,
+    "image/jpeg": 0.15,
+    "image/gif": 0.3,
+    "image/webp": 0.1,
+}
+# JPEG start-of-frame markers (baseline, progressive, lossless, ...)
+JPEG_SOF = {
+    0xC0,
+    0xC1,
+    0xC2,
+    0xC3,
+    0xC5,
+    0xC6,
+    0xC7,
+    0xC9,
+    0xCA,
+    0xCB,
+    0xCD,
+    0xCE,
+    0xCF,
+}
+
+
+def png_size(data: str) -> tuple[int, int]:
+    """Read width and height from the IHDR chunk of a base64 PNG."""
+
+    header = base64.b64decode(data[:32])
+    if header[:8] != b"\x89PNG\r\n\x1a\n":
+        raise ValueError("not a PNG")
+    return struct.unpack(">II", header[16:24])
+
+
+def _jpeg_size(blob: bytes) -> tuple[int, int]:
+    i = 2
+    while i + 9 < len(blob):
+        if blob[i] != 0xFF:
+            raise ValueError("bad JPEG marker")
+        marker, (length,) = blob[i + 1], struct.unpack(">H", blob[i + 2 : i + 4])
+        if marker in JPEG_SOF:
+            height, width = struct.unpack(">HH", blob[i + 5 : i + 9])
+            return width, height
+        i += 2 + length
+    raise ValueError("no JPEG frame header")
+
+
+def _webp_size(blob: bytes) -> tuple[int, int]:
+    match blob[12:16]:
+        case b"VP8 ":
+            width, height = struct.unpack("<HH", blob[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        case b"VP8L":
+            bits = int.from_bytes(blob[21:25], "little")
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        case b"VP8X":
+            return (
+                int.from_bytes(blob[24:27], "little") + 1,
+                int.from_bytes(blob[27:30], "little") + 1,
+            )
+    raise ValueError("unknown WebP chunk")
+
+
+def image_size(data: str, media_type: str = "image/png") -> tuple[int, int]:
+    """
+    Width and height of a base64 PNG, JPEG, GIF or WebP, read from its header.
+
+    Never raises: if the header can't be read, the size is estimated from the
+    image's byte size, as a square.
+    """
+
+    try:
+        if data.startswith("iVBORw0KGgo"):
+            return png_size(data)
+        # JPEG frame headers can come after large EXIF blocks
+        blob = base64.b64decode(data if data.startswith("/9j/") else data[:64])
+        if blob[:2] == b"\xff\xd8":
+            return _jpeg_size(blob)
+        if blob[:6] in (b"GIF87a", b"GIF89a"):
+            return struct.unpack("<HH", blob[6:10])
+        if blob[:4] == b"RIFF" and blob[8:12] == b"WEBP":
+            return _webp_size(blob)
+    except (ValueError, struct.error):
+        pass
+    pixels = len(data) * 3 / 4 / BYTES_PER_PIXEL.get(media_type, 0.5)
+    side = max(1, round(math.sqrt(pixels)))
+    return side, side
+
+
+def image_tokens(width: int, height: int) -> int:
+    # https://docs.anthropic.com/en/docs/build-with-claude/vision#calculate-image-costs
+    return math.ceil(width * height / 750)
+
+
+def reencode(data: str, width: int, height: int, grayscale: bool) -> str:
+    """Blocking: resize (and optionally desaturate) a base64 PNG."""
+
+    from wand.image import Image
+
+    with Image(blob=base64.b64decode(data)) as img:
+        img.resize(width=width, height=height)
+        if grayscale:
+            img.type = "grayscale"
+        return base64.b64encode(img.make_blob("png")).decode()
+
+
+@dataclass(kw_only=True, frozen=True)
+class ImagePolicy:
+    """
+    Tiered retention for screenshots, driven by an image token budget.
+
+    The newest `keep_full` frames always stay at full size. Once the images in
+    the history cost more than `token_budget`, older frames are re-encoded at
+    `scale` (and in grayscale), oldest first, and if that is still not enough
+    the oldest frames are replaced with a text placeholder. Each pass goes down
+    to `low_watermark * token_budget`, so tiers change in occasional batches
+    rather than every turn, which keeps the cached prompt prefix stable.
+    """
+
+    token_budget: int = 10_000
+    keep_full: int = 3
+    scale: float = 0.5
+    grayscale: bool = True
+    low_watermark: float = 0.75
+
+    def reduced_size(self, width: int, height: int) -> tuple[int, int]:
+        return max(1, round(width * self.scale)), max(1, round(height * self.scale))
+
+    def plan(self, sizes: Sequence[tuple[int, int]]) -> dict[int, Action]:
+        """Given image sizes oldest first, return the action for each index that changes."""
+
+        if not sizes:
+            return {}
+        tokens = [image_tokens(*size) for size in sizes]
+        if (total := sum(tokens)) <= self.token_budget:
+            return {}
+
+        target, actions = self.token_budget * self.low_watermark, {}
+        full_width = max(width for width, _ in sizes)
+        candidates = range(max(0, len(sizes) - self.keep_full))
+
+        for i in candidates:
+            if total <= target:
+                break
+            if sizes[i][0] <= self.reduced_size(full_width, 1)[0]:
+                continue
+            reduced = image_tokens(*self.reduced_size(*sizes[i]))
+            total -= tokens[i] - reduced
+            tokens[i], actions[i] = reduced, "reduce"
+
+        for i in candidates:
+            if total <= target:
+                break
+            total -= tokens[i]
+            actions[i] = "drop"
+
+        return actions
@@ -0,0 +1,184 @@
+import asyncio
+import base64
+import copy
+import hashlib
+import logging
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterator
+
+from anthropic.types.beta import BetaMessageParam
+
+from computer_use_modal import backend, codec
+from computer_use_modal.server.cache_planner import CacheStats
+from computer_use_modal.server.image_policy import image_size
+
+MESSAGES = backend.named_dict("messages")
+IMAGES = backend.named_dict("message-images")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(kw_only=True, frozen=True)
+class MessageLogHeader:
+    length: int
+    cache_stats: CacheStats | None = None
+    # Bumped on every write, so a cached copy can tell if it is stale
+    version: int = 0
+
+    def encode(self) -> bytes:
+        return codec.encode(
+            {
+                "length": self.length,
+                "cache_stats": self.cache_stats and asdict(self.cache_stats),
+                "version": self.version,
+            }
+        )
+
+    @classmethod
+    def decode(cls, data: bytes) -> "MessageLogHeader":
+        record = codec.decode(data)
+        stats = record.get("cache_stats")
+        return cls(
+            length=record["length"],
+            cache_stats=stats and CacheStats(**stats),
+            version=record.get("version", 0),
+        )
+
+
+def image_sources(message: BetaMessageParam) -> Iterator[dict[str, Any]]:
+    """Yield the `source` of every image in a message, including in tool results."""
+
+    if not isinstance(content := message["content"], list):
+        return
+    for block in content:
+        if not isinstance(block, dict):
+            continue
+        if block.get("type") == "image":
+            yield block["source"]
+        elif block.get("type") == "tool_result" and isinstance(
+            items := block.get("content"), list
+        ):
+            for item in items:
+                if isinstance(item, dict) and item.get("type") == "image":
+                    yield item["source"]
+
+
+@dataclass(kw_only=True)
+class MessageLog:
+    """
+    Append-only persistence for a conversation.
+
+    Every turn is its own `MESSAGES` entry, written once and rewritten only if
+    it is later mutated. Image data lives out of line in `IMAGES` as raw bytes,
+    keyed by the SHA-256 of its base64, so a turn record only carries a
+    reference and evicting an image rewrites that small record, never the blob.
+    Records use the compact `codec` encoding; pickled records from older
+    versions are still read, and are rewritten in the new format on the next
+    write.
+    """
+
+    LOAD_CONCURRENCY: int = 32
+
+    request_id: str
+    version: int = 0
+    _stored: set[str] = field(default_factory=set)
+    _legacy: set[int] = field(default_factory=set)
+
+    def _key(self, index: int) -> str:
+        return f"{self.request_id}:{index}"
+
+    def _encode(self, message: BetaMessageParam) -> tuple[BetaMessageParam, dict]:
+        record, blobs = copy.deepcopy(message), {}
+        for source in image_sources(record):
+            if source.get("type") != "base64":
+                continue
+            data = source.pop("data")
+            digest = hashlib.sha256(data.encode()).hexdigest()
+            if digest not in self._stored:
+                blobs[digest] = data
+            width, height = image_size(data, source.get("media_type", "image/png"))
+            source.update(type="ref", hash=digest, width=width, height=height)
+        return record, blobs
+
+    async def _header(self) -> Any:
+        raw = await MESSAGES.get.aio(self.request_id)
+        return MessageLogHeader.decode(raw) if codec.is_encoded(raw) else raw
+
+    async def stored_version(self) -> int:
+        match header := await self._header():
+            case MessageLogHeader():
+                return header.version
+        return 0
+
+    async def load(self) -> tuple[list[BetaMessageParam], MessageLogHeader | None]:
+        """Return the stored turns (images still as references) and their header."""
+
+        match header := await self._header():
+            case None:
+                return [], None
+            case MessageLogHeader(length=length):
+                self.version = header.version
+                semaphore = asyncio.Semaphore(self.LOAD_CONCURRENCY)
+
+                async def get(index: int):
+                    async with semaphore:
+                        record = await MESSAGES.get.aio(self._key(index))
+                    if not codec.is_encoded(record):
+                        self._legacy.add(index)
+                    return codec.decode(record)
+
+                messages = list(await asyncio.gather(*map(get, range(length))))
+                if self._legacy:
+                    logger.info(
+                        f"Migrating {len(self._legacy)} pickled turns for {self.request_id}"
+                    )
+                return messages, header
+            case legacy:
+                # A whole pickled `Messages` from before the log existed
+                logger.info(f"Migrating legacy messages for {self.request_id}")
+                return legacy._messages, None
+
+    async def write(
+        self,
+        messages: list[BetaMessageParam],
+        indices: set[int],
+        cache_stats: CacheStats | None = None,
+    ):
+        records, blobs = {}, {}
+        self.version += 1
+        for index in indices | self._legacy:
+            record, new_blobs = self._encode(messages[index])
+            records[self._key(index)] = codec.encode(record)
+            blobs.update(new_blobs)
+        # Snapshot the header before yielding, while it matches the records
+        records[self.request_id] = MessageLogHeader(
+            length=len(messages), cache_stats=cache_stats, version=self.version
+        ).encode()
+        if blobs:
+            await IMAGES.update.aio(
+                **{digest: base64.b64decode(data) for digest, data in blobs.items()}
+            )
+            self._stored.update(blobs)
+        await MESSAGES.update.aio(**records)
+        self._legacy.clear()
+
+    async def hydrate(self, messages: list[BetaMessageParam]):
+        """Resolve image references in place, fetching each blob at most once."""
+
+        sources = [
+            source
+            for message in messages
+            for source in image_sources(message)
+            if source.get("type") == "ref"
+        ]
+        digests = list({s["hash"] for s in sources})
+        blobs = dict(
+            zip(digests, await asyncio.gather(*(IMAGES.get.aio(d) for d in digests)))
+        )
+        self._stored.update(digests)
+        for digest, blob in blobs.items():
+            if isinstance(blob, bytes):
+                blobs[digest] = base64.b64encode(blob).decode()
+        for source in sources:
+            del source["width"], source["height"]
+            source.update(type="base64", data=blobs[source.pop("hash")])
@@ -1,21 +1,39 @@
+import asyncio
 import logging
-from dataclasses import dataclass
+from collections import deque
+from dataclasses import dataclass, field
 from typing import Self, cast
 
-import modal
 from anthropic.types.beta import (
     BetaCacheControlEphemeralParam,
     BetaContentBlockParam,
     BetaMessageParam,
     BetaToolResultBlockParam,
     BetaToolUseBlockParam,
+    BetaUsage,
 )
 
-MESSAGES = modal.Dict.from_name("messages", create_if_missing=True)
+from computer_use_modal.server.cache_planner import CachePlanner, CacheStats
+from computer_use_modal.server.compaction import Compactor, estimate_tokens
+from computer_use_modal.server.image_policy import (
+    PLACEHOLDER,
+    ImagePolicy,
+    image_size,
+    reencode,
+)
+from computer_use_modal.server.message_store import MessageLog
+from computer_use_modal.tracing import span
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass(kw_only=True, frozen=True)
+class BlockRef:
+    turn: int
+    block: dict
+    parent: list | None = None
+
+
 @dataclass(kw_only=True)
 class Messages:
     CHUNK_SIZE: int = 10
@@ -24,17 +42,67 @@ class Messages:
     request_id: str
     _messages: list[BetaMessageParam]
     keep_n_images: int = 10
+    image_policy: ImagePolicy = field(default_factory=ImagePolicy)
+    compactor: Compactor = field(default_factory=Compactor)
+
+    _log: MessageLog | None = None
+    _persisted: int = 0
+    _dirty: set[int] = field(default_factory=set)
+    _hydrated: bool = True
+    cache_stats: CacheStats = field(default_factory=CacheStats)
+
+    # Incremental indexes over `_messages`, oldest first
+    _tool_results: list[BlockRef] = field(default_factory=list)
+    _images: deque[BlockRef] = field(default_factory=deque)
+    _cache_control: deque[BlockRef] = field(default_factory=deque)
+    _tokens: list[int] = field(default_factory=list)
+    tokens_saved: int = 0
+
+    def __post_init__(self):
+        self._log = self._log or MessageLog(request_id=self.request_id)
+        for turn in range(len(self._messages)):
+            self._index(turn)
 
     @classmethod
-    async def from_request_id(cls, request_id: str) -> Self:
-        return await MESSAGES.get.aio(
-            request_id, cls(request_id=request_id, _messages=[])
+    async def from_request_id(
+        cls, request_id: str, log: MessageLog | None = None
+    ) -> Self:
+        log = log or MessageLog(request_id=request_id)
+        messages, header = await log.load()
+        return cls(
+            request_id=request_id,
+            _messages=messages,
+            _log=log,
+            _persisted=header.length if header else 0,
+            _hydrated=not messages,
+            cache_stats=(header and header.cache_stats) or CacheStats(),
+        )
+
+    @property
+    def planner(self) -> CachePlanner:
+        return CachePlanner(
+            max_breakpoints=self.MAX_CACHE_CONTROL,
+            keep_n_images=self.keep_n_images,
+            chunk_size=self.CHUNK_SIZE,
         )
 
     async def flush(self):
-        self._filter_cache_control()
-        self._filter_images()
-        await MESSAGES.put.aio(self.request_id, self)
+        assert self._log is not None
+        with span("messages.flush", turns=len(self._messages)):
+            await self._filter_images()
+            await self._compact()
+            self._place_cache_control()
+            if not self._hydrated:
+                # Only images that survived eviction are fetched after a reload
+                await self._log.hydrate(self._messages)
+                self._hydrated = True
+            await self._log.write(
+                self._messages,
+                self._dirty | set(range(self._persisted, len(self._messages))),
+                self.cache_stats,
+            )
+        self._persisted = len(self._messages)
+        self._dirty.clear()
 
     @property
     def messages(self) -> tuple[BetaMessageParam, ...]:
@@ -42,83 +110,142 @@ class Messages:
 
     async def add_assistant_content(self, content: list[BetaContentBlockParam]):
         logger.info(f"AI said: {content}")
-        self._messages.append(
-            msg := {"role": "assistant", "content": content},
-        )
+        self._append(msg := {"role": "assistant", "content": content})
         await self.flush()
         return msg
 
     async def add_user_messages(self, messages: list[BetaMessageParam]):
         logger.info(f"User said: {messages}")
-        self._messages.extend(messages)
+        for message in messages:
+            self._append(message)
         await self.flush()
 
-    async def add_tool_result(self, tool_results: list[BetaToolResultBlockParam]):
-        self._messages.append(
-            msg := {"content": tool_results, "role": "user"},
-        )
-        self.tool_results[-1]["cache_control"] = cast(
-            BetaCacheControlEphemeralParam, {"type": "ephemeral"}
+    def record_usage(self, usage: BetaUsage):
+        ratio = self.cache_stats.record(usage)
+        logger.info(
+            f"Cache hit ratio {ratio:.1%} (session {self.cache_stats.total_hit_ratio:.1%}), "
+            f"~{self.estimated_tokens} tokens after compacting ~{self.tokens_saved}: {usage}"
         )
+
+    async def add_tool_result(self, tool_results: list[BetaToolResultBlockParam]):
+        self._append(msg := {"content": tool_results, "role": "user"})
         await self.flush()
         return msg
 
+    def _append(self, message: BetaMessageParam):
+        self._messages.append(message)
+        try:
+            self._index(len(self._messages) - 1)
+        except Exception:
+            # Leave the session as it was, rather than with an unindexed turn
+            self._messages.pop()
+            raise
+
+    def _index(self, turn: int):
+        self._tokens.append(estimate_tokens(self._messages[turn]))
+        if not isinstance(content := self._messages[turn]["content"], list):
+            return
+        for item in content:
+            if not (isinstance(item, dict) and item.get("type") == "tool_result"):
+                continue
+            self._tool_results.append(ref := BlockRef(turn=turn, block=item))
+            if "cache_control" in item:
+                self._cache_control.append(ref)
+            for block in item.get("content", []):
+                if isinstance(block, dict) and block.get("type") == "image":
+                    self._images.append(
+                        BlockRef(turn=turn, block=block, parent=item["content"])
+                    )
+
     @property
     def tool_results(self) -> list[BetaToolUseBlockParam]:
-        return cast(
-            list[BetaToolUseBlockParam],
-            [
-                item
-                for message in self._messages
-                for item in (
-                    message["content"] if isinstance(message["content"], list) else []
+        return [cast(BetaToolUseBlockParam, ref.block) for ref in self._tool_results]
+
+    def _place_cache_control(self):
+        target = self.planner.breakpoints(self._tool_results, self._images)
+        for ref in self._cache_control:
+            if not any(ref is t for t in target):
+                ref.block.pop("cache_control", None)
+                self._dirty.add(ref.turn)
+        for ref in target:
+            if "cache_control" not in ref.block:
+                ref.block["cache_control"] = cast(
+                    BetaCacheControlEphemeralParam, {"type": "ephemeral"}
                 )
-                if isinstance(item, dict) and item.get("type") == "tool_result"
-            ],
-        )
+                self._dirty.add(ref.turn)
+        self._cache_control = deque(target)
 
-    def _filter_cache_control(self):
-        total_cache_control = sum(
-            1 for tool_result in self.tool_results if "cache_control" in tool_result
-        )
-        if (to_remove := total_cache_control - self.MAX_CACHE_CONTROL) <= 0:
+    async def _compact(self):
+        for turn in self._dirty:
+            self._tokens[turn] = estimate_tokens(self._messages[turn])
+        if not (plan := self.compactor.plan(self._messages, self._tokens)):
             return
-        while to_remove > 0:
-            for tool_result in self.tool_results:
-                if "cache_control" not in tool_result:
-                    continue
-                tool_result.pop("cache_control")
-                to_remove -= 1
-                if to_remove == 0:
-                    return
-
-    def _filter_images(self):
-        total_images = sum(
-            1
-            for tool_result in self.tool_results
-            for content in tool_result.get("content", [])
-            if isinstance(content, dict) and content.get("type") == "image"
+        before = sum(self._tokens)
+        for turn in await self.compactor.apply(plan):
+            self._tokens[turn] = estimate_tokens(self._messages[turn])
+            self._dirty.add(turn)
+        self.tokens_saved += (saved := before - sum(self._tokens))
+        logger.info(
+            f"Compacted {len(plan)} blocks, saved ~{saved} tokens "
+            f"({before} -> {sum(self._tokens)})"
         )
 
-        if total_images <= self.keep_n_images:
-            return
-        if not (
-            images_to_remove := (total_images - self.keep_n_images) % self.CHUNK_SIZE
-        ):
+    @property
+    def estimated_tokens(self) -> int:
+        return sum(self._tokens)
+
+    @staticmethod
+    def _image_size(ref: BlockRef) -> tuple[int, int]:
+        if (source := ref.block["source"]).get("type") == "ref":
+            return source["width"], source["height"]
+        return image_size(source["data"], source.get("media_type", "image/png"))
+
+    async def _reduce_image(self, ref: BlockRef):
+        assert self._log is not None
+        if ref.block["source"].get("type") == "ref":
+            await self._log.hydrate([self._messages[ref.turn]])
+        source = ref.block["source"]
+        width, height = self.image_policy.reduced_size(
+            *image_size(source["data"], source.get("media_type", "image/png"))
+        )
+        with span("wand.reencode", width=width, height=height):
+            source["data"] = await asyncio.to_thread(
+                reencode, source["data"], width, height, self.image_policy.grayscale
+            )
+        # `reencode` always writes a PNG
+        source["media_type"] = "image/png"
+        self._dirty.add(ref.turn)
+
+    def _drop_image(self, ref: BlockRef):
+        assert ref.parent is not None
+        idx = next(i for i, block in enumerate(ref.parent) if block is ref.block)
+        ref.parent[idx] = {"type": "text", "text": PLACEHOLDER}
+        self._dirty.add(ref.turn)
+
+    async def _filter_images(self):
+        live = list(self._images)
+        # Hard cap on the number of frames, in cache-aligned batches
+        evict = self.planner.images_to_evict(len(live))
+        actions = {i: "drop" for i in range(evict)} | {
+            evict + i: action
+            for i, action in self.image_policy.plan(
+                [self._image_size(ref) for ref in live[evict:]]
+            ).items()
+        }
+        if not actions:
             return
 
-        logger.info(f"Removing {images_to_remove} images")
-
-        while images_to_remove > 0:
-            for res in self.tool_results:
-                if not isinstance(contents := res.get("content"), list):
-                    continue
-                for content in contents.copy():
-                    if not (
-                        isinstance(content, dict) and content.get("type") == "image"
-                    ):
-                        continue
-                    contents.remove(content)
-                    images_to_remove -= 1
-                    if images_to_remove == 0:
-                        return
+        logger.info(f"Downscaling or dropping images: {actions}")
+        await asyncio.gather(
+            *(
+                self._reduce_image(live[i])
+                for i, action in actions.items()
+                if action == "reduce"
+            )
+        )
+        for i, action in actions.items():
+            if action == "drop":
+                self._drop_image(live[i])
+        self._images = deque(
+            ref for i, ref in enumerate(live) if actions.get(i) != "drop"
+        )
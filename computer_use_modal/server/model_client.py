@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import math
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+import backoff
+from anthropic import (
+    APIConnectionError,
+    APIStatusError,
+    AsyncAnthropic,
+    ConflictError,
+    InternalServerError,
+    RateLimitError,
+)
+from anthropic.types.beta import BetaMessage
+
+logger = logging.getLogger(__name__)
+
+# Same classes the SDK itself retries; `APITimeoutError` is an `APIConnectionError`
+RETRYABLE = (
+    APIConnectionError,
+    ConflictError,
+    RateLimitError,
+    InternalServerError,
+    TimeoutError,
+)
+
+
+@dataclass(kw_only=True)
+class LatencyHistogram:
+    """Log-bucketed latencies; bucket `i` holds samples up to `BASE * GROWTH**i` seconds."""
+
+    BASE: float = 0.05
+    GROWTH: float = 1.2
+    BUCKETS: int = 64
+
+    counts: list[int] = field(default_factory=list)
+    count: int = 0
+    total: float = 0.0
+
+    def __post_init__(self):
+        self.counts = self.counts or [0] * self.BUCKETS
+
+    def observe(self, seconds: float):
+        idx = (
+            0
+            if seconds <= self.BASE
+            else math.ceil(math.log(seconds / self.BASE, self.GROWTH))
+        )
+        self.counts[min(idx, self.BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q: float) -> float | None:
+        if not self.count:
+            return None
+        rank, seen = max(1, math.ceil(q * self.count)), 0
+        for idx, count in enumerate(self.counts):
+            if (seen := seen + count) >= rank:
+                return self.BASE * self.GROWTH**idx
+        return self.BASE * self.GROWTH ** (self.BUCKETS - 1)
+
+    def summary(self) -> dict[str, float]:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": self.total / self.count,
+            **{f"p{q}": self.quantile(q / 100) or 0.0 for q in (50, 95, 99)},
+        }
+
+
+@dataclass(kw_only=True)
+class ModelClient:
+    """
+    Wraps `messages.create` with the tail-latency controls the agent loop needs.
+
+    Every attempt gets its own deadline. Retryable failures are retried with
+    full-jitter exponential backoff, honouring `retry-after` when the API sends
+    one, until `max_attempts` or the overall `deadline` runs out. With `hedge`,
+    a duplicate request is sent once an attempt has been outstanding longer
+    than the model's observed `hedge_quantile` latency; the first response
+    wins and the other is cancelled.
+    """
+
+    client: AsyncAnthropic
+    attempt_timeout: float = 120.0
+    deadline: float = 600.0
+    max_attempts: int = 4
+    backoff_base: float = 1.0
+    backoff_max: float = 30.0
+    hedge_quantile: float = 0.95
+    hedge_min_samples: int = 20
+    hedge_min_delay: float = 1.0
+    # Told how long to back off whenever the API answers 429
+    on_rate_limit: Callable[[float], Awaitable[None]] | None = None
+
+    latencies: defaultdict[str, LatencyHistogram] = field(
+        default_factory=lambda: defaultdict(LatencyHistogram)
+    )
+    stats: Counter[str] = field(default_factory=Counter)
+
+    def hedge_delay(self, model: str) -> float | None:
+        hist = self.latencies[model]
+        if hist.count < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, hist.quantile(self.hedge_quantile) or 0.0)
+
+    def backoff_delay(self, attempt: int, error: Exception) -> float:
+        if isinstance(error, APIStatusError) and (
+            retry_after := error.response.headers.get("retry-after")
+        ):
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        return backoff.full_jitter(
+            min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        )
+
+    async def _attempt(self, kwargs: dict) -> BetaMessage:
+        self.stats["attempts"] += 1
+        start = time.perf_counter()
+        async with asyncio.timeout(self.attempt_timeout):
+            response = await self.client.beta.messages.create(**kwargs)
+        self.latencies[kwargs["model"]].observe(time.perf_counter() - start)
+        return response
+
+    async def _hedged(self, kwargs: dict, hedge: bool) -> BetaMessage:
+        primary = asyncio.create_task(self._attempt(kwargs))
+        pending, error = {primary}, None
+        try:
+            if hedge and (delay := self.hedge_delay(kwargs["model"])) is not None:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done:
+                    self.stats["hedges"] += 1
+                    pending.add(asyncio.create_task(self._attempt(kwargs)))
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if (error := task.exception()) is None:
+                        if task is not primary:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+            assert error is not None
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def create(self, *, hedge: bool = False, **kwargs) -> BetaMessage:
+        start = time.monotonic()
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return await self._hedged(kwargs, hedge)
+            except RETRYABLE as e:
+                self.stats[type(e).__name__] += 1
+                delay = self.backoff_delay(attempt, e)
+                if (
+                    attempt == self.max_attempts
+                    or time.monotonic() - start + delay > self.deadline
+                ):
+                    raise
+                logger.warning(
+                    f"{kwargs['model']} attempt {attempt} failed with {type(e).__name__}, "
+                    f"retrying in {delay:.1f}s"
+                )
+                self.stats["retries"] += 1
+                if isinstance(e, RateLimitError) and self.on_rate_limit:
+                    await self.on_rate_limit(delay)
+                await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
+
+    def report(self) -> dict[str, dict[str, float]]:
+        return {model: hist.summary() for model, hist in self.latencies.items()}
@@ -0,0 +1,158 @@
+"""
+Recordings of agent sessions, for replaying offline with `benchmarks.replay`.
+
+A recording is every event of a `messages_create_gen` call in order: the
+history it started from, the user's messages, each model request and
+response, and each tool call with its input, result and timing. It is written as one `codec` record next to
+the session's files on the NFS, under `.recordings/`.
+
+Message bodies and screenshots are stored once, as blobs keyed by digest.
+A request only lists the digests of its messages, so each step costs only
+the turns that changed since the previous one.
+"""
+
+import base64
+import copy
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from anthropic.types.beta import BetaMessage, BetaMessageParam
+from pydantic import BaseModel
+
+from computer_use_modal import codec
+from computer_use_modal.server.message_store import image_sources
+from computer_use_modal.tools.base import ToolResult
+
+VERSION = 1
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json", exclude_none=True)
+    raise TypeError(f"cannot serialize {type(obj).__name__}")
+
+
+@dataclass(kw_only=True)
+class Recording:
+    request_id: str
+    started: float = field(default_factory=time.time)
+    events: list[dict[str, Any]] = field(default_factory=list)
+    blobs: dict[str, bytes] = field(default_factory=dict)
+
+    @property
+    def path(self) -> Path:
+        return Path(".recordings") / f"{self.request_id}-{int(self.started * 1000)}.rec"
+
+    def put(self, data: bytes) -> str:
+        self.blobs.setdefault(digest := _digest(data), data)
+        return digest
+
+    def put_message(self, message: BetaMessageParam) -> str:
+        record = copy.deepcopy(message)
+        for source in image_sources(record):
+            if source.get("type") == "base64":
+                image = self.put(base64.b64decode(source.pop("data")))
+                source.update(type="ref", hash=image)
+        return self.put(codec.encode(record, compress=False))
+
+    def get_message(self, digest: str) -> BetaMessageParam:
+        message = codec.decode(self.blobs[digest])
+        for source in image_sources(message):
+            if source.get("type") == "ref":
+                data = base64.b64encode(self.blobs[source.pop("hash")]).decode()
+                source.update(type="base64", data=data)
+        return message
+
+    def encode(self) -> bytes:
+        return codec.encode(
+            {
+                "version": VERSION,
+                "request_id": self.request_id,
+                "started": self.started,
+                "events": self.events,
+                "blobs": self.blobs,
+            }
+        )
+
+    @classmethod
+    def decode(cls, data: bytes) -> "Recording":
+        record = codec.decode(data)
+        if record["version"] > VERSION:
+            raise ValueError(f"recording version {record['version']} is too new")
+        return cls(
+            request_id=record["request_id"],
+            started=record["started"],
+            events=record["events"],
+            blobs=record["blobs"],
+        )
+
+
+@dataclass(kw_only=True)
+class Recorder:
+    recording: Recording
+    _start: float = field(default_factory=time.monotonic)
+
+    def _event(self, kind: str, **data: Any):
+        self.recording.events.append(
+            {"type": kind, "t": time.monotonic() - self._start, **data}
+        )
+
+    def history(self, messages: tuple[BetaMessageParam, ...]):
+        self._event(
+            "history", messages=[self.recording.put_message(m) for m in messages]
+        )
+
+    def user(self, messages: list[BetaMessageParam]):
+        self._event("user", messages=[self.recording.put_message(m) for m in messages])
+
+    def request(self, kwargs: dict[str, Any], estimated_tokens: int):
+        params = {k: v for k, v in kwargs.items() if k != "messages"}
+        self._event(
+            "request",
+            messages=[self.recording.put_message(m) for m in kwargs["messages"]],
+            params=self.recording.put(codec.encode(params, compress=False)),
+            bytes=len(json.dumps(kwargs, default=_json_default)),
+            estimated_tokens=estimated_tokens,
+        )
+
+    def response(self, response: BetaMessage, duration: float):
+        self._event(
+            "response",
+            duration=duration,
+            content=[
+                b.model_dump(mode="json", exclude_none=True) for b in response.content
+            ],
+            stop_reason=response.stop_reason,
+            usage=response.usage.model_dump(mode="json", exclude_none=True),
+        )
+
+    def tool(
+        self,
+        *,
+        name: str,
+        tool_input: dict,
+        tool_use_id: str,
+        result: ToolResult,
+        duration: float,
+    ):
+        self._event(
+            "tool",
+            name=name,
+            input=tool_input,
+            tool_use_id=tool_use_id,
+            duration=duration,
+            output=result.output,
+            error=result.error,
+            system=result.system,
+            is_error=result.is_error,
+            image=result.base64_image
+            and self.recording.put(base64.b64decode(result.base64_image)),
+        )
@@ -1,23 +1,43 @@
 import logging
-from typing import AsyncGenerator, cast
+import time
+from dataclasses import asdict
+from itertools import count
+from pathlib import Path
+from typing import AsyncGenerator, Literal, cast
 
 import modal
-from anthropic import Anthropic
 from anthropic.types.beta import (
     BetaContentBlock,
     BetaContentBlockParam,
     BetaMessageParam,
 )
 
+from computer_use_modal import backend, tracing
 from computer_use_modal.app import app, image, secrets
-from computer_use_modal.sandbox.sandbox_manager import SandboxManager
+from computer_use_modal.sandbox.package_cache import cache_report
+from computer_use_modal.sandbox.prewarm import PrewarmProfile
+from computer_use_modal.sandbox.profiles import (
+    DEFAULT_PROFILE,
+    recommend_profile,
+    record_run,
+    resolve_profile,
+)
+from computer_use_modal.sandbox.sandbox_manager import manager_for
+from computer_use_modal.server.admission import AdmissionController, Priority
+from computer_use_modal.server.compaction import Compactor
 from computer_use_modal.server.messages import Messages
-from computer_use_modal.server.prompts import SYSTEM_PROMPT
+from computer_use_modal.server.model_client import ModelClient
+from computer_use_modal.server.prompts import system_prompt
+from computer_use_modal.server.recording import Recorder, Recording
+from computer_use_modal.server.session_cache import SessionCache
 from computer_use_modal.tools.base import ToolCollection, ToolResult
 from computer_use_modal.tools.bash import BashTool
+from computer_use_modal.tools.browser import BrowserTool
 from computer_use_modal.tools.computer.computer import ComputerTool
 from computer_use_modal.tools.edit.edit import EditTool
 
+logger = logging.getLogger(__name__)
+
 
 @app.cls(image=image, allow_concurrent_inputs=10, secrets=[secrets], timeout=60 * 60)
 class ComputerUseServer:
@@ -25,7 +45,17 @@ class ComputerUseServer:
     def init(self):
         logging.basicConfig(level=logging.INFO)
 
-        self.client = Anthropic()
+        self.client = backend.current().anthropic()
+        self.admission = backend.instance(AdmissionController)
+        self.model_client = ModelClient(
+            client=self.client, on_rate_limit=self.admission.throttle.remote.aio
+        )
+        self.sessions = SessionCache()
+
+    @modal.exit()
+    async def flush_sessions(self):
+        await self.sessions.drain()
+        await tracing.flush()
 
     @modal.method()
     async def messages_create(
@@ -34,6 +64,17 @@ class ComputerUseServer:
         user_messages: list[BetaMessageParam],
         max_tokens: int = 4096,
         model: str = "claude-3-5-sonnet-20241022",
+        edit_backend: Literal["nfs", "agent"] = "nfs",
+        hedge: bool = False,
+        priority: Priority = "default",
+        record: bool = False,
+        slots: int = 1,
+        profile: str = DEFAULT_PROFILE,
+        workload: str = "default",
+        headless: bool = False,
+        prewarm: str | dict | None = None,
+        observation: Literal["screenshot", "accessibility"] = "screenshot",
+        browser: bool = False,
     ):
         messages = [
             msg
@@ -42,6 +83,17 @@ class ComputerUseServer:
                 user_messages=user_messages,
                 max_tokens=max_tokens,
                 model=model,
+                edit_backend=edit_backend,
+                hedge=hedge,
+                priority=priority,
+                record=record,
+                slots=slots,
+                profile=profile,
+                workload=workload,
+                headless=headless,
+                prewarm=prewarm,
+                observation=observation,
+                browser=browser,
             )
         ]
         return messages[-1]
@@ -53,45 +105,188 @@ class ComputerUseServer:
         user_messages: list[BetaMessageParam],
         max_tokens: int = 4096,
         model: str = "claude-3-5-sonnet-20241022",
+        edit_backend: Literal["nfs", "agent"] = "nfs",
+        hedge: bool = False,
+        priority: Priority = "default",
+        record: bool = False,
+        slots: int = 1,
+        profile: str = DEFAULT_PROFILE,
+        workload: str = "default",
+        headless: bool = False,
+        prewarm: str | dict | None = None,
+        observation: Literal["screenshot", "accessibility"] = "screenshot",
+        browser: bool = False,
     ) -> AsyncGenerator[BetaMessageParam | ToolResult, None]:
-        manager = SandboxManager(request_id=request_id)
-        messages = await Messages.from_request_id(request_id)
-        await messages.add_user_messages(user_messages)
-
-        tools = (
-            ComputerTool(manager=manager),
-            EditTool(manager=manager),
-            BashTool(manager=manager),
-        )
+        with tracing.span("agent.request", request_id=request_id, model=model) as root:
+            logger.info(f"Trace {root.trace_id} for {request_id}")
+            # Sandbox calls made on behalf of this request join its trace
+            profile = await resolve_profile(request_id, profile, workload)
+            manager = tracing.propagate(
+                manager_for(request_id, slots, profile, headless)
+            )
+            if prewarm:
+                # Alongside the sandbox coming up and the first model call
+                await manager.prewarm.spawn.aio(PrewarmProfile.parse(prewarm))
+            slot = await manager.get_slot.remote.aio()
+            messages = await self.sessions.messages(request_id)
 
-        while True:
-            tool_runner = ToolCollection(tools=tools)
-            response = self.client.beta.messages.create(
-                max_tokens=max_tokens,
-                messages=messages.messages,
-                model=model,
-                system=SYSTEM_PROMPT,
-                tools=tool_runner.to_params(),
-                betas=["computer-use-2024-10-22", "prompt-caching-2024-07-31"],
+            async def archive(key: str, text: str) -> str:
+                path = Path(".history") / f"{key}.txt"
+                await manager.write_file.remote.aio(path, text.encode())
+                return (Path(slot.mount) / path).as_posix()
+
+            messages.compactor = Compactor(archive=archive)
+            recorder = (
+                Recorder(recording=Recording(request_id=request_id)) if record else None
             )
-            yield await messages.add_assistant_content(
-                cast(list[BetaContentBlockParam], response.content)
+            if recorder:
+                recorder.history(messages.messages)
+                recorder.user(user_messages)
+            await messages.add_user_messages(user_messages)
+
+            tools = (
+                ComputerTool(
+                    manager=manager,
+                    display_num=slot.display,
+                    observation=observation,
+                ),
+                EditTool(
+                    manager=manager,
+                    backend=edit_backend,
+                    sessions=self.sessions,
+                    mount=slot.mount,
+                ),
+                BashTool(manager=manager),
             )
-            for content_block in cast(list[BetaContentBlock], response.content):
-                if content_block.type != "tool_use":
-                    continue
-                yield await tool_runner.run(
-                    name=content_block.name,
-                    tool_input=cast(dict, content_block.input),
-                    tool_use_id=content_block.id,
+            if browser:
+                tools += (BrowserTool(manager=manager),)
+
+            try:
+                async for msg in self._agent_loop(
+                    messages,
+                    tools,
+                    system=system_prompt(slot, browser=browser),
+                    max_tokens=max_tokens,
+                    model=model,
+                    hedge=hedge,
+                    priority=priority,
+                    recorder=recorder,
+                ):
+                    yield msg
+            finally:
+                if recorder:
+                    recording = recorder.recording
+                    await manager.write_file.remote.aio(
+                        recording.path, recording.encode()
+                    )
+                    logger.info(
+                        f"Recorded {len(recording.events)} events to "
+                        f"{Path(slot.mount) / recording.path}"
+                    )
+                usage = await manager.resource_usage.remote.aio(reset=True)
+                # A shared sandbox's usage is not this agent's alone
+                if slots == 1 and usage["samples"]:
+                    await record_run(workload, usage)
+                # The end of the turn: everything written behind the loop must land
+                await self.sessions.drain(request_id)
+                logger.info(
+                    f"Model latencies: {self.model_client.report()} {self.model_client.stats}"
+                )
+
+    async def _agent_loop(
+        self,
+        messages: Messages,
+        tools: tuple,
+        *,
+        system: str,
+        max_tokens: int,
+        model: str,
+        hedge: bool,
+        priority: Priority,
+        recorder: Recorder | None = None,
+    ) -> AsyncGenerator[BetaMessageParam | ToolResult, None]:
+        for step in count():
+            with tracing.span("agent.step", step=step):
+                tool_runner = ToolCollection(tools=tools)
+                reserved = messages.estimated_tokens
+                with tracing.span("admission.wait", priority=priority) as s:
+                    waited = await self.admission.acquire.remote.aio(
+                        messages.request_id, reserved, max_tokens, priority
+                    )
+                    s.attributes["queued"] = waited
+                if waited > 1:
+                    logger.info(f"Waited {waited:.1f}s for rate limit admission")
+                request = dict(
+                    max_tokens=max_tokens,
+                    messages=messages.messages,
+                    model=model,
+                    system=system,
+                    tools=tool_runner.to_params(),
+                    betas=["computer-use-2024-10-22", "prompt-caching-2024-07-31"],
+                )
+                if recorder:
+                    recorder.request(request, estimated_tokens=reserved)
+                with tracing.span("model.call", model=model, hedge=hedge) as s:
+                    response = await self.model_client.create(hedge=hedge, **request)
+                    s.attributes.update(
+                        input_tokens=response.usage.input_tokens,
+                        output_tokens=response.usage.output_tokens,
+                        cache_read_input_tokens=response.usage.cache_read_input_tokens
+                        or 0,
+                    )
+                if recorder:
+                    recorder.response(response, duration=s.duration)
+                messages.record_usage(response.usage)
+                await self.admission.settle.spawn.aio(
+                    reserved,
+                    max_tokens,
+                    response.usage.input_tokens
+                    + (response.usage.cache_read_input_tokens or 0)
+                    + (response.usage.cache_creation_input_tokens or 0),
+                    response.usage.output_tokens,
+                )
+                yield await messages.add_assistant_content(
+                    cast(list[BetaContentBlockParam], response.content)
+                )
+                for content_block in cast(list[BetaContentBlock], response.content):
+                    if content_block.type != "tool_use":
+                        continue
+                    started = time.monotonic()
+                    result = await tool_runner.run(
+                        name=content_block.name,
+                        tool_input=cast(dict, content_block.input),
+                        tool_use_id=content_block.id,
+                    )
+                    if recorder:
+                        recorder.tool(
+                            name=content_block.name,
+                            tool_input=cast(dict, content_block.input),
+                            tool_use_id=content_block.id,
+                            result=result,
+                            duration=time.monotonic() - started,
+                        )
+                    yield result
+                if not tool_runner.results:
+                    return
+                yield await messages.add_tool_result(
+                    [r.to_api() for r in tool_runner.results]
                 )
-            if not tool_runner.results:
-                return
-            yield await messages.add_tool_result(
-                [r.to_api() for r in tool_runner.results]
-            )
 
     @modal.method()
-    async def debug(self, request_id: str):
-        manager = SandboxManager(request_id=request_id)
+    async def debug(
+        self,
+        request_id: str,
+        slots: int = 1,
+        profile: str = DEFAULT_PROFILE,
+        headless: bool = False,
+    ):
+        manager = manager_for(request_id, slots, profile, headless)
         return await manager.debug_urls.remote.aio()
+
+    @modal.method()
+    async def recommend_profile(self, workload: str = "default") -> dict:
+        return asdict(await recommend_profile(workload))
+
+    @modal.method()
+    async def package_cache_report(self) -> dict:
+        return await cache_report()
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Awaitable, Callable
+
+from anthropic.types.beta import BetaMessageParam
+
+from computer_use_modal.server.cache_planner import CacheStats
+from computer_use_modal.server.message_store import MessageLog
+from computer_use_modal.server.messages import Messages
+
+if TYPE_CHECKING:
+    from computer_use_modal.sandbox.edit_manager import EditSession
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(kw_only=True)
+class WriteBehind:
+    """Runs `write` in the background, coalescing calls made while one is in flight."""
+
+    write: Callable[[], Awaitable[None]]
+    _dirty: bool = False
+    _task: asyncio.Task | None = None
+
+    def schedule(self):
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self._dirty:
+            self._dirty = False
+            try:
+                await self.write()
+            except Exception:
+                self._dirty = True
+                raise
+
+    async def drain(self):
+        if self._dirty and (self._task is None or self._task.done()):
+            # Retry whatever a failed write left behind
+            self._task = asyncio.create_task(self._run())
+        if self._task is not None:
+            await self._task
+
+
+@dataclass(kw_only=True)
+class WriteBehindLog(MessageLog):
+    """A `MessageLog` whose writes return immediately and land in the background."""
+
+    _pending: set[int] = field(default_factory=set)
+    _latest: tuple[list[BetaMessageParam], int, CacheStats | None] | None = None
+    _writer: WriteBehind | None = None
+
+    def __post_init__(self):
+        self._writer = WriteBehind(write=self._write_pending)
+
+    async def write(self, messages, indices, cache_stats=None):
+        assert self._writer is not None
+        self._pending |= indices
+        # Turns appended after this call are not covered by `_pending` yet
+        self._latest = (messages, len(messages), cache_stats)
+        self._writer.schedule()
+
+    async def _write_pending(self):
+        assert self._latest is not None
+        (messages, length, cache_stats), indices = self._latest, self._pending
+        self._pending = set()
+        try:
+            await super().write(messages[:length], indices, cache_stats)
+        except Exception:
+            self._pending |= indices
+            self.version -= 1
+            raise
+
+    async def drain(self):
+        assert self._writer is not None
+        await self._writer.drain()
+
+
+@dataclass(kw_only=True)
+class CachedSession:
+    messages: Messages
+    log: WriteBehindLog
+    edit_session: "EditSession | None" = None
+    edit_writer: WriteBehind | None = None
+
+    async def drain(self):
+        await self.log.drain()
+        if self.edit_writer:
+            await self.edit_writer.drain()
+
+
+@dataclass(kw_only=True)
+class SessionCache:
+    """
+    Keeps hot `Messages` and `EditSession`s in memory for the life of the
+    container, so the agent loop does no `modal.Dict` reads after the first
+    request and its writes land behind it.
+
+    Each checkout costs one header read: the header's version is bumped on
+    every write, so if another container has since written to the request,
+    the cached copy is dropped and reloaded.
+    """
+
+    MAX_SESSIONS: int = 32
+
+    _sessions: OrderedDict[str, CachedSession] = field(default_factory=OrderedDict)
+    _locks: defaultdict[str, asyncio.Lock] = field(
+        default_factory=lambda: defaultdict(asyncio.Lock)
+    )
+
+    async def _checkout(self, request_id: str) -> CachedSession:
+        if cached := self._sessions.get(request_id):
+            # Our own writes have to land before the versions can be compared
+            await cached.drain()
+            if await cached.log.stored_version() == cached.log.version:
+                self._sessions.move_to_end(request_id)
+                return cached
+            logger.info(f"Session {request_id} changed elsewhere, reloading")
+            del self._sessions[request_id]
+
+        log = WriteBehindLog(request_id=request_id)
+        messages = await Messages.from_request_id(request_id, log=log)
+        self._sessions[request_id] = cached = CachedSession(messages=messages, log=log)
+        while len(self._sessions) > self.MAX_SESSIONS:
+            _, evicted = self._sessions.popitem(last=False)
+            await evicted.drain()
+        return cached
+
+    async def messages(self, request_id: str) -> Messages:
+        async with self._locks[request_id]:
+            return (await self._checkout(request_id)).messages
+
+    async def edit_session(self, request_id: str) -> "EditSession":
+        # Imported here, as `edit_manager` imports the tools that import this
+        from computer_use_modal.sandbox.edit_manager import EditSession
+
+        cached = self._sessions[request_id]
+        if cached.edit_session is None:
+            cached.edit_session = await EditSession.from_request_id(request_id)
+        return cached.edit_session
+
+    def save_edit_session(self, request_id: str):
+        cached = self._sessions[request_id]
+        if cached.edit_writer is None:
+            session = cached.edit_session
+            assert session is not None
+            cached.edit_writer = WriteBehind(write=lambda: session.save(request_id))
+        cached.edit_writer.schedule()
+
+    async def drain(self, request_id: str | None = None):
+        if request_id is None:
+            sessions = list(self._sessions.values())
+        else:
+            sessions = [s] if (s := self._sessions.get(request_id)) else []
+        await asyncio.gather(*(s.drain() for s in sessions))
@@ -11,6 +11,7 @@ from anthropic.types.beta import (
     BetaToolUnionParam,
 )
 
+from computer_use_modal.tracing import span
 from computer_use_modal.vnd.anthropic.tools.shared import ToolError as _ToolError
 from computer_use_modal.vnd.anthropic.tools.shared import ToolResult as _ToolResult
 
@@ -115,7 +116,8 @@ class ToolCollection:
             return ToolResult(error=f"Tool {name} is invalid", is_error=True)
         try:
             async with asyncio.timeout(self.timeout):
-                return await tool(**tool_input)
+                with span(f"tool.{name}", action=tool_input.get("action", "")):
+                    return await tool(**tool_input)
         except asyncio.TimeoutError:
             return ToolResult(error=f"Tool {name} timed out. Try again.", is_error=True)
         except ToolError as e:
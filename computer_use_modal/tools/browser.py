@@ -0,0 +1,88 @@
+from dataclasses import dataclass
+from typing import Literal
+
+from anthropic.types.beta import BetaToolParam
+
+from computer_use_modal.tools.base import BaseTool, ToolError, ToolResult
+
+MAX_CHARS = 8000
+
+DESCRIPTION = """Reads and drives the tab in the foreground of the desktop's Firefox, without screenshots. Prefer it over the computer tool for getting to a URL and reading what is on the page; use the computer tool to look at or interact with the page.
+* `navigate`: open `url` and wait for it to load (and for `wait_for`, a CSS selector, to match), then return the page's readable text.
+* `text`: the readable text of the page, or of the first element matching `selector`. Long text is returned in parts; pass `offset` to read on.
+* `html`: the markup of the elements matching `selector`.
+* `scroll`: scroll by `pages` screens (negative to go up), or to the element matching `selector`."""
+
+
+@dataclass(kw_only=True)
+class BrowserTool(BaseTool[BetaToolParam]):
+    @property
+    def options(self) -> BetaToolParam:
+        return {
+            "name": "browser",
+            "description": DESCRIPTION,
+            "input_schema": {
+                "type": "object",
+                "properties": {
+                    "action": {
+                        "type": "string",
+                        "enum": ["navigate", "text", "html", "scroll"],
+                    },
+                    "url": {"type": "string"},
+                    "selector": {"type": "string"},
+                    "wait_for": {"type": "string"},
+                    "offset": {"type": "integer", "minimum": 0},
+                    "pages": {"type": "number"},
+                },
+                "required": ["action"],
+            },
+        }
+
+    async def __call__(
+        self,
+        /,
+        action: Literal["navigate", "text", "html", "scroll"],
+        url: str | None = None,
+        selector: str | None = None,
+        wait_for: str | None = None,
+        offset: int = 0,
+        pages: float = 1,
+    ):
+        if action == "navigate" and not url:
+            raise ToolError("url is required for navigate")
+        if action == "html" and not selector:
+            raise ToolError("selector is required for html")
+        request = {
+            "action": action,
+            "url": url,
+            "selector": selector,
+            "wait_for": wait_for,
+            "offset": offset,
+            "pages": pages,
+            "max_chars": MAX_CHARS,
+        }
+        result = await self.manager.browse.remote.aio(
+            {k: v for k, v in request.items() if v is not None}
+        )
+        if "error" in result:
+            raise ToolError(result["error"])
+        return ToolResult(output=self.format(result))
+
+    @staticmethod
+    def format(result: dict) -> str:
+        lines = [f"{result['title']} <{result['url']}>"]
+        if "scroll" in result:
+            y, height, viewport = result["scroll"]
+            lines.append(f"Scrolled to {y}-{y + viewport} of {height}px")
+        if "matches" in result:
+            lines.append(f"{result['matches']} matching elements")
+            lines.extend(result["html"])
+        if "text" in result:
+            lines.append(result["text"])
+            end = result["offset"] + len(result["text"])
+            if end < result["total"]:
+                lines.append(
+                    f"<truncated at {end} of {result['total']} characters, "
+                    f"pass offset={end} to read on>"
+                )
+        return "\n\n".join(lines)
@@ -1,11 +1,15 @@
 import asyncio
 import shlex
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from functools import singledispatchmethod
+from typing import Literal
 
 from anthropic.types.beta import BetaToolComputerUse20241022Param
 from pydantic import ValidationError
 
+from computer_use_modal.sandbox.accessibility import render
+from computer_use_modal.server.compaction import text_tokens
+from computer_use_modal.server.image_policy import image_tokens
 from computer_use_modal.tools.base import BaseTool, ToolError, ToolResult
 from computer_use_modal.tools.computer.types import (
     BaseComputerRequest,
@@ -19,7 +23,9 @@ from computer_use_modal.tools.computer.types import (
     RightClickRequest,
     ScreenshotRequest,
     TypeRequest,
+    ZoomRequest,
 )
+from computer_use_modal.tracing import span
 from computer_use_modal.vnd.anthropic.tools.computer import (
     ComputerToolMixin,
     ScalingSource,
@@ -31,6 +37,14 @@ class ComputerTool(BaseTool[BetaToolComputerUse20241022Param], ComputerToolMixin
     width: int = 1024
     height: int = 768
     display_num: int = 1
+    # What the model sees after an action: a screenshot, or the active
+    # window's accessibility tree as text when that is smaller
+    observation: Literal["screenshot", "accessibility"] = "screenshot"
+
+    # Upscaling past native resolution adds size but no detail
+    MAX_ZOOM = 4
+    # Headless sandboxes bring their display up on the first action
+    _desktop_started: bool = field(default=False, init=False, repr=False)
 
     @property
     def options(self) -> BetaToolComputerUse20241022Param:
@@ -57,6 +71,10 @@ class ComputerTool(BaseTool[BetaToolComputerUse20241022Param], ComputerToolMixin
             request = BaseComputerRequest.parse(data)
         except ValidationError as e:
             raise ToolError(f"Invalid tool parameters:\n{e.json()}") from e
+        if not self._desktop_started:
+            with span("desktop.wait"):
+                await self.manager.start_desktop.remote.aio()
+            self._desktop_started = True
         return await self.dispatch(request)
 
     @singledispatchmethod
@@ -97,9 +115,7 @@ class ComputerTool(BaseTool[BetaToolComputerUse20241022Param], ComputerToolMixin
             for chunk in self.chunks(request.text, self.TYPING_GROUP_SIZE)
         ]
         result = sum(results, ToolResult())
-        return result.replace(
-            base64_image=(await self.screenshot(ScreenshotRequest())).base64_image
-        )
+        return result + await self.observe()
 
     @dispatch.register(LeftClickRequest)
     async def left_click(self, request: LeftClickRequest):
@@ -141,9 +157,53 @@ class ComputerTool(BaseTool[BetaToolComputerUse20241022Param], ComputerToolMixin
             self.scale_coordinates(ScalingSource.COMPUTER, self.width, self.height),
         )
 
+    @dispatch.register(ZoomRequest)
+    async def zoom(self, request: ZoomRequest):
+        x0, y0 = self.scale_coordinates(ScalingSource.API, *request.region[:2])
+        x1, y1 = self.scale_coordinates(ScalingSource.API, *request.region[2:])
+        if x1 <= x0 or y1 <= y0:
+            raise ToolError("region must be [x0, y0, x1, y1] with x0 < x1 and y0 < y1")
+        # Fill at most one frame, so a zoom costs no more than a screenshot
+        width, height = self.scale_coordinates(
+            ScalingSource.COMPUTER, self.width, self.height
+        )
+        scale = min(self.MAX_ZOOM, width / (x1 - x0), height / (y1 - y0))
+        size = (round((x1 - x0) * scale), round((y1 - y0) * scale))
+        result = await self.manager.take_screenshot.remote.aio(
+            self.display_num, size, (x0, y0, x1, y1)
+        )
+        # Image pixels per API coordinate
+        zoom = size[0] / (request.region[2] - request.region[0])
+        left, top = request.region[:2]
+        return result.replace(
+            output=f"Zoomed into {list(request.region)} at {zoom:.3g}x. The point "
+            f"(u, v) in this image is at ({left} + u / {zoom:.3g}, "
+            f"{top} + v / {zoom:.3g}) on the screen."
+        )
+
+    async def observe(self) -> ToolResult:
+        if self.observation == "accessibility":
+            size = self.scale_coordinates(
+                ScalingSource.COMPUTER, self.width, self.height
+            )
+            with span("observe.accessibility") as s:
+                tree = await self.manager.accessibility_tree.remote.aio(
+                    self.display_num
+                )
+                text = render(
+                    tree,
+                    lambda x, y: self.scale_coordinates(ScalingSource.COMPUTER, x, y),
+                )
+                s.attributes.update(nodes=len(tree["nodes"]), tokens=text_tokens(text))
+            # Empty when AT-SPI has nothing to say, e.g. over a bare desktop
+            if tree["nodes"] and text_tokens(text) < image_tokens(*size):
+                return ToolResult(output=text)
+        return await self.screenshot(ScreenshotRequest())
+
     async def execute(self, command: str, *args, take_screenshot: bool = True):
         result = await super().execute(command, *args)
         if not take_screenshot:
             return result
-        await asyncio.sleep(self.SCREENSHOT_DELAY_S)
-        return result + await self.screenshot(ScreenshotRequest())
+        with span("screenshot.delay"):
+            await asyncio.sleep(self.SCREENSHOT_DELAY_S)
+        return result + await self.observe()
@@ -1,6 +1,6 @@
 from typing import Annotated, Literal, Union
 
-from annotated_types import Gt
+from annotated_types import Ge, Gt
 from pydantic import BaseModel, Field, TypeAdapter
 
 from computer_use_modal.vnd.anthropic.tools.computer import Action
@@ -69,6 +69,17 @@ class CursorPositionRequest(BaseComputerRequest):
     action: Literal["cursor_position"] = "cursor_position"
 
 
+class ZoomRequest(BaseComputerRequest):
+    action: Literal["zoom"] = "zoom"  # type: ignore[assignment]
+    # x0, y0, x1, y1 in API coordinates
+    region: tuple[
+        Annotated[int, Ge(0)],
+        Annotated[int, Ge(0)],
+        Annotated[int, Ge(0)],
+        Annotated[int, Ge(0)],
+    ]
+
+
 TRequest = Union[
     MouseMoveRequest,
     LeftClickDragRequest,
@@ -80,4 +91,5 @@ TRequest = Union[
     MiddleClickRequest,
     ScreenshotRequest,
     CursorPositionRequest,
+    ZoomRequest,
 ]
@@ -1,15 +1,28 @@
 from dataclasses import dataclass
+from typing import TYPE_CHECKING, Literal
 
 from anthropic.types.beta import BetaToolTextEditor20241022Param
 from pydantic import ValidationError
 
-from computer_use_modal.sandbox.edit_manager import EditSession, EditSessionManager
+from computer_use_modal.app import MOUNT_PATH
+from computer_use_modal.sandbox.edit_manager import (
+    AgentEditSessionManager,
+    EditSession,
+    EditSessionManager,
+)
 from computer_use_modal.tools.base import BaseTool, ToolError
 from computer_use_modal.tools.edit.types import BaseEditRequest
 
+if TYPE_CHECKING:
+    from computer_use_modal.server.session_cache import SessionCache
+
 
 @dataclass(kw_only=True)
 class EditTool(BaseTool[BetaToolTextEditor20241022Param]):
+    backend: Literal["nfs", "agent"] = "nfs"
+    sessions: "SessionCache | None" = None
+    mount: str = MOUNT_PATH
+
     @property
     def options(self) -> BetaToolTextEditor20241022Param:
         return {"name": "str_replace_editor", "type": "text_editor_20241022"}
@@ -23,10 +36,22 @@ class EditTool(BaseTool[BetaToolTextEditor20241022Param]):
             request = BaseEditRequest.parse(data)
         except ValidationError as e:
             raise ToolError(f"Invalid tool parameters:\n{e.json()}") from e
-        return await (await self.edit_manager()).dispatch(request)
+        manager = await self.edit_manager()
+        result = await manager.run(request)
+        if manager.KEEPS_HISTORY and request.command != "view":
+            await self.save_session(manager.session)
+        return result
 
     async def edit_manager(self) -> EditSessionManager:
-        return EditSessionManager(
-            sandbox=self.manager,
-            session=await EditSession.from_request_id(self.manager.request_id),
-        )
+        cls = AgentEditSessionManager if self.backend == "agent" else EditSessionManager
+        if self.sessions:
+            session = await self.sessions.edit_session(self.manager.request_id)
+        else:
+            session = await EditSession.from_request_id(self.manager.request_id)
+        return cls(sandbox=self.manager, session=session, mount=self.mount)
+
+    async def save_session(self, session: EditSession):
+        if self.sessions:
+            self.sessions.save_edit_session(self.manager.request_id)
+        else:
+            await session.save(self.manager.request_id)
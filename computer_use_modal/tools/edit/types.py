@@ -1,7 +1,7 @@
 from pathlib import Path
 from typing import Annotated, Literal, Union
 
-from annotated_types import Gt, Len
+from annotated_types import Gt
 from pydantic import BaseModel, Field, TypeAdapter, field_validator
 
 from computer_use_modal.vnd.anthropic.tools.edit import Command
@@ -27,7 +27,7 @@ class BaseEditRequest(BaseModel):
 
 class ViewRequest(BaseEditRequest):
     command: Literal["view"] = "view"
-    view_range: Annotated[tuple[int, int], Len(2, 2), Gt(0)] | None = None
+    view_range: tuple[Annotated[int, Gt(0)], int] | None = None
 
 
 class CreateRequest(BaseEditRequest):
@@ -0,0 +1,344 @@
+"""
+Lightweight spans for finding where an agent step spends its time.
+
+Spans nest through a context variable and cross `.remote` calls as a W3C
+`traceparent` argument: wrap a Modal class handle with `propagate` on the
+calling side and its `@traced` methods pick the context up on the other.
+Finished spans are shipped in the background to a `modal.Queue` partition
+per trace, and `python -m computer_use_modal.tracing <trace_id>` collects
+them into JSON or OTLP/JSON files and prints a per-step report.
+"""
+
+import argparse
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import os
+import secrets
+import statistics
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Iterator
+
+import modal
+
+TRACES = modal.Queue.from_name("traces", create_if_missing=True)
+SERVICE = os.environ.get("MODAL_FUNCTION_NAME", "local")
+
+Exporter = Callable[[str, list[dict]], Awaitable[None]]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(kw_only=True)
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None = None
+    service: str = SERVICE
+    start_ns: int = 0
+    end_ns: int = 0
+    status: str = "ok"
+    attributes: dict[str, Any] = field(default_factory=dict)
+    # Set when the parent lives in another container
+    remote_parent: bool = False
+
+    @property
+    def duration(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+
+_current: ContextVar[Span | None] = ContextVar("span", default=None)
+_pending: list[Span] = []
+_flush_task: asyncio.Task | None = None
+
+
+async def queue_exporter(trace_id: str, spans: list[dict]):
+    await TRACES.put_many.aio(spans, partition=trace_id)
+
+
+exporter: Exporter = queue_exporter
+
+
+def set_exporter(new: Exporter):
+    global exporter
+    exporter = new
+
+
+def traceparent() -> str | None:
+    if (current := _current.get()) is None:
+        return None
+    return f"00-{current.trace_id}-{current.span_id}-01"
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    parent = _current.get()
+    current = Span(
+        name=name,
+        trace_id=parent.trace_id if parent else secrets.token_hex(16),
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id if parent else None,
+        start_ns=time.time_ns(),
+        attributes=attributes,
+    )
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.attributes["error"] = repr(e)
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _current.reset(token)
+        _pending.append(current)
+        if parent is None or parent.remote_parent:
+            _schedule_flush()
+
+
+@contextmanager
+def attach(parent: str | None) -> Iterator[None]:
+    """Continue the trace of a `traceparent` received from another container."""
+
+    if not parent:
+        yield
+        return
+    _, trace_id, span_id, _ = parent.split("-")
+    token = _current.set(
+        Span(name="remote", trace_id=trace_id, span_id=span_id, remote_parent=True)
+    )
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def traced(name: str | None = None, **attributes: Any):
+    """Wrap an async function (or generator) in a span, accepting a `traceparent` kwarg."""
+
+    def decorator(fn):
+        label = name or fn.__qualname__
+
+        if inspect.isasyncgenfunction(fn):
+
+            @functools.wraps(fn)
+            async def gen_wrapper(*args, traceparent: str | None = None, **kwargs):
+                with attach(traceparent), span(label, **attributes):
+                    async for item in fn(*args, **kwargs):
+                        yield item
+
+            return gen_wrapper
+
+        @functools.wraps(fn)
+        async def wrapper(*args, traceparent: str | None = None, **kwargs):
+            with attach(traceparent), span(label, **attributes):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _schedule_flush():
+    global _flush_task
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    if _flush_task is None or _flush_task.done():
+        _flush_task = loop.create_task(flush())
+
+
+async def flush():
+    """Ship finished spans; called in the background and on container exit."""
+
+    while _pending:
+        batch = defaultdict(list)
+        for finished in _pending:
+            record = asdict(finished)
+            record.pop("remote_parent")
+            batch[finished.trace_id].append(record)
+        _pending.clear()
+        try:
+            await asyncio.gather(
+                *(exporter(trace_id, spans) for trace_id, spans in batch.items())
+            )
+        except Exception as e:
+            logger.warning(f"Dropped {sum(map(len, batch.values()))} spans: {e}")
+
+
+class _PropagatingMethod:
+    def __init__(self, method):
+        self._method = method
+
+    def __getattr__(self, name: str):
+        return getattr(self._method, name)
+
+    @property
+    def remote(self):
+        return _PropagatingCall(self._method.remote)
+
+    @property
+    def remote_gen(self):
+        return _PropagatingCall(self._method.remote_gen)
+
+    @property
+    def spawn(self):
+        return _PropagatingCall(self._method.spawn)
+
+
+class _PropagatingCall:
+    def __init__(self, call):
+        self._call = call
+
+    def __call__(self, *args, **kwargs):
+        return self._call(*args, traceparent=traceparent(), **kwargs)
+
+    def aio(self, *args, **kwargs):
+        return self._call.aio(*args, traceparent=traceparent(), **kwargs)
+
+
+class propagate:
+    """Proxy a Modal class handle so its `@traced` methods join the current trace."""
+
+    def __init__(self, handle):
+        self._handle = handle
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._handle, name)
+        return _PropagatingMethod(attr) if hasattr(attr, "remote") else attr
+
+
+def to_otlp(spans: list[dict]) -> dict:
+    """Render spans as an OTLP/JSON `ExportTraceServiceRequest`."""
+
+    def value(v: Any) -> dict:
+        match v:
+            case bool():
+                return {"boolValue": v}
+            case int():
+                return {"intValue": str(v)}
+            case float():
+                return {"doubleValue": v}
+        return {"stringValue": str(v)}
+
+    by_service = defaultdict(list)
+    for s in spans:
+        by_service[s["service"]].append(
+            {
+                "traceId": s["trace_id"],
+                "spanId": s["span_id"],
+                **({"parentSpanId": s["parent_id"]} if s["parent_id"] else {}),
+                "name": s["name"],
+                "kind": 1,
+                "startTimeUnixNano": str(s["start_ns"]),
+                "endTimeUnixNano": str(s["end_ns"]),
+                "attributes": [
+                    {"key": k, "value": value(v)} for k, v in s["attributes"].items()
+                ],
+                "status": {"code": 2 if s["status"] == "error" else 1},
+            }
+        )
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": [
+                        {"key": "service.name", "value": {"stringValue": service}}
+                    ]
+                },
+                "scopeSpans": [
+                    {"scope": {"name": "computer_use_modal"}, "spans": service_spans}
+                ],
+            }
+            for service, service_spans in by_service.items()
+        ]
+    }
+
+
+def report(spans: list[dict], step: str = "agent.step") -> str:
+    """A per-step breakdown by self time, then duration percentiles per span name."""
+
+    def duration(s: dict) -> float:
+        return (s["end_ns"] - s["start_ns"]) / 1e9
+
+    children = defaultdict(list)
+    for s in spans:
+        children[s["parent_id"]].append(s)
+
+    def self_times(s: dict, into: dict[str, float]):
+        kids = children[s["span_id"]]
+        into[s["name"]] = into.get(s["name"], 0.0) + max(
+            0.0, duration(s) - sum(map(duration, kids))
+        )
+        for kid in kids:
+            self_times(kid, into)
+
+    lines = []
+    steps = sorted((s for s in spans if s["name"] == step), key=lambda s: s["start_ns"])
+    for i, s in enumerate(steps):
+        breakdown: dict[str, float] = {}
+        self_times(s, breakdown)
+        top = sorted(breakdown.items(), key=lambda kv: -kv[1])[:5]
+        lines.append(
+            f"step {i:3d} {duration(s) * 1e3:9.1f}ms  "
+            + "  ".join(f"{name} {t * 1e3:.0f}ms" for name, t in top)
+        )
+
+    by_name = defaultdict(list)
+    for s in spans:
+        by_name[s["name"]].append(duration(s))
+    lines.append(
+        f"\n{'span':<40} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'total':>9}"
+    )
+    for name, values in sorted(by_name.items(), key=lambda kv: -sum(kv[1])):
+        values.sort()
+        q = (
+            statistics.quantiles(values, n=100, method="inclusive")
+            if len(values) > 1
+            else values * 99
+        )
+        lines.append(
+            f"{name:<40} {len(values):6d} {q[49] * 1e3:8.1f}ms {q[94] * 1e3:8.1f}ms"
+            f" {q[98] * 1e3:8.1f}ms {sum(values):8.2f}s"
+        )
+    return "\n".join(lines)
+
+
+async def collect(trace_id: str) -> list[dict]:
+    spans = []
+    while batch := await TRACES.get_many.aio(1000, block=False, partition=trace_id):
+        spans.extend(batch)
+    return spans
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("trace", help="A trace id, or a JSON file written by --json")
+    parser.add_argument("--json", help="Write the spans to this file")
+    parser.add_argument("--otlp", help="Write the spans as OTLP/JSON to this file")
+    args = parser.parse_args()
+
+    if args.trace.endswith(".json"):
+        with open(args.trace) as f:
+            spans = json.load(f)
+    else:
+        spans = asyncio.run(collect(args.trace))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(spans, f)
+    if args.otlp:
+        with open(args.otlp, "w") as f:
+            json.dump(to_otlp(spans), f)
+    print(report(spans))
+
+
+if __name__ == "__main__":
+    main()